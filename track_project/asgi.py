@@ -3,6 +3,11 @@ ASGI config for track_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with a single-process ASGI server (e.g. ``uvicorn track_project.asgi:application``)
+so live tracking streams wait on the event loop instead of holding a thread each,
+and every write reaches the pages watching it through the in-process hub in
+tracker.live.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.metrics.ViewMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +71,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'track_project.wsgi.application'
+ASGI_APPLICATION = 'track_project.asgi.application'
 
 
 # Database
@@ -131,6 +133,125 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/dashboard/'  # Redirect to your dashboard after login
 LOGOUT_REDIRECT_URL = '/'  # Redirect to home after logout
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Rendered public tracking result pages, see tracker.page_cache. Any Django
+    # backend works here, e.g. FileBasedCache with LOCATION BASE_DIR / 'cache' / 'pages'
+    # to share pages between worker processes on one host.
+    'result_pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'result-pages',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Cache alias for rendered result pages; None disables the page cache
+RESULT_CACHE_ALIAS = 'result_pages'
+
+# SiteSettings.load() is memoized per process for this many seconds. Point the
+# alias at a cache shared by all workers (e.g. Redis) to invalidate them all on save.
+SITE_SETTINGS_CACHE_TIMEOUT = 300
+SITE_SETTINGS_CACHE_ALIAS = None
+
+# Seconds the staff sidebar counters (pending proofs, active stamps, shipments) are cached
+ADMIN_COUNTERS_TIMEOUT = 30
+
+# Seconds the admin dashboard/statistics aggregates are cached
+STATS_CACHE_TIMEOUT = 60
+
+# Page sizes offered on the staff shipment list (the first is the default). Deeper
+# than ADMIN_OFFSET_PAGE_LIMIT only next/previous links are shown, which seek by cursor.
+ADMIN_PAGE_SIZES = (25, 50, 100)
+ADMIN_OFFSET_PAGE_LIMIT = 10
+
+# Public lookups of unknown tracking numbers are answered from a per-process bloom
+# filter without a query. Shipments saved by other processes are caught up on at
+# most this often; misses the database confirmed are remembered for a while.
+TRACKING_FILTER_ENABLED = True
+TRACKING_FILTER_ERROR_RATE = 0.01
+TRACKING_FILTER_SYNC_INTERVAL = 2
+NEGATIVE_LOOKUP_TIMEOUT = 30
+
+# Rows per transaction when importing shipments from CSV/JSON Lines (see tracker.imports)
+IMPORT_BATCH_SIZE = 1000
+
+# Scans per transaction for bulk status/location updates (see tracker.scans)
+SCAN_BATCH_SIZE = 1000
+
+# Tracking history: events shown per result page, and the compact_tracking_events
+# sweep (run it daily) keeps only status changes past COMPACT_DAYS and drops
+# everything but each shipment's latest event past RETENTION_DAYS
+TRACKING_EVENTS_SHOWN = 20
+TRACKING_EVENT_COMPACT_DAYS = 30
+TRACKING_EVENT_RETENTION_DAYS = 365
+
+# Live tracking pages (tracker.live): an ASGI server keeps each Server-Sent Events stream
+# open this long before the browser reconnects. Pages served under WSGI don't stream and
+# revalidate every 30 seconds instead. Only writes made by the same process are pushed.
+LIVE_STREAM_TIMEOUT = 300
+LIVE_KEEPALIVE_INTERVAL = 15
+LIVE_RETRY_MS = 3000
+LIVE_HISTORY_SIZE = 10000  # tracking numbers whose latest update is kept for reconnects
+
+# Broad staff searches rank this many newest matches by relevance; older ones follow, newest first
+SEARCH_RANK_WINDOW = 200
+
+# Per-process latency/query/PDF statistics of tracker views, served at /dashboard/metrics/.
+# The Server-Timing header shows the same numbers for each response in browser dev tools.
+TRACKER_METRICS_ENABLED = True
+SERVER_TIMING_HEADER = True
+
+# Rendered tracking PDFs, keyed on shipment, site settings and stamp versions
+PDF_CACHE_DIR = BASE_DIR / 'cache' / 'pdf'
+PDF_CACHE_MAX_MEMORY = 32 * 1024 * 1024  # bytes held in each worker process
+PDF_CACHE_MAX_DISK = 256 * 1024 * 1024  # bytes shared by all workers
+
+# Report images are shrunk to their draw size at this resolution when uploaded
+PDF_IMAGE_CACHE_DIR = BASE_DIR / 'cache' / 'images'
+PDF_IMAGE_DPI = 150
+PDF_IMAGE_QUALITY = 85
+PDF_IMAGE_LRU_SIZE = 32  # draw-sized image files kept in memory per worker process
+
+# Opt-in background PDF builds: print preview enqueues and polls instead of blocking
+PDF_ASYNC_ENABLED = False
+PDF_QUEUE_BACKEND = 'tracker.pdf_queue.LocalPDFQueue'
+PDF_QUEUE_WORKERS = 2
+PDF_QUEUE_RESULT_TTL = 60  # seconds a finished build's outcome is kept for status polls
+
+# Route the async versions of the home, tracking, print preview and PDF pages. Turn on
+# when serving track_project.asgi; under WSGI the sync views are faster. PDFs are then
+# rendered in PDF_RENDER_THREADS threads, and further downloads wait their turn.
+ASYNC_PUBLIC_VIEWS = False
+PDF_RENDER_THREADS = 4
+
+# Worker processes rendering bulk PDF exports, started on first use and kept for later
+# exports (0 or 1 renders in the request process)
+PDF_EXPORT_WORKERS = 4
+# Most shipments one merged PDF export may hold; it is assembled before anything is sent
+PDF_EXPORT_MERGE_LIMIT = 200
+
+# Payment proofs and parcel images: rejected over these limits, and re-encoded without
+# EXIF/GPS metadata and shrunk to UPLOAD_MAX_DIMENSION pixels when needed
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 40_000_000
+UPLOAD_MAX_DIMENSION = 2560
+UPLOAD_JPEG_QUALITY = 85
+
+# Renditions built after each upload commits: a cropped WebP thumbnail for list pages and
+# a WebP copy for viewing, in UPLOAD_RENDITION_WORKERS threads (0 builds them in the request)
+THUMBNAIL_SIZE = (320, 320)
+WEBP_MAX_DIMENSION = 1600
+WEBP_QUALITY = 80
+UPLOAD_RENDITION_WORKERS = 2
+
+# Image files are stored once per distinct content (tracker.storage) and deleted when the
+# last row using them goes. Files written more recently than this are kept, as a row
+# referring to them may be about to commit; `manage.py collect_media` sweeps them later.
+MEDIA_GC_GRACE_SECONDS = 300
+
 CSRF_TRUSTED_ORIGINS = [
     "https://shiping-wi22.onrender.com",
 ]
@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Shipment, PaymentProof, PDFStamp
+from django.contrib import admin, messages
+from .models import Shipment, PaymentProof, PDFStamp, TrackingEvent
+from .payments import reject_proofs, verify_proofs
+from .pdf_export import export_response
+from .search import search_shipments
 
 @admin.register(Shipment)
 class ShipmentAdmin(admin.ModelAdmin):
@@ -36,9 +39,30 @@ class ShipmentAdmin(admin.ModelAdmin):
         }),
     )
     
+    actions = ['export_pdf_zip', 'export_pdf_merged']
+    
     def save_model(self, request, obj, form, change):
         obj.total_cost = obj.shipment_cost + obj.clearance_cost
         super().save_model(request, obj, form, change)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields only switches the search box on; matching uses the full-text index
+        if not search_term:
+            return queryset, False
+        return search_shipments(queryset, search_term), False
+    
+    def export_pdf_zip(self, request, queryset):
+        return export_response(queryset.order_by('-date_created'), 'zip')
+    
+    export_pdf_zip.short_description = "Export tracking PDFs (ZIP)"
+    
+    def export_pdf_merged(self, request, queryset):
+        try:
+            return export_response(queryset.order_by('-date_created'), 'pdf')
+        except ValueError as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+    
+    export_pdf_merged.short_description = "Export tracking PDFs (single PDF)"
 
 
 @admin.register(PaymentProof)
@@ -48,20 +72,37 @@ class PaymentProofAdmin(admin.ModelAdmin):
     search_fields = ['shipment__tracking_number']
     readonly_fields = ['date_uploaded']
     
-    actions = ['mark_as_verified']
+    actions = ['mark_as_verified', 'reject_selected']
     
     def mark_as_verified(self, request, queryset):
-        for proof in queryset:
-            proof.is_verified = True
-            proof.save()
-            proof.shipment.payment_status = 'paid'
-            proof.shipment.save()
-        self.message_user(request, f"{queryset.count()} payment(s) verified successfully.")
+        verified = verify_proofs(queryset)
+        self.message_user(request, f"{len(verified)} payment(s) verified successfully.")
     
     mark_as_verified.short_description = "Mark selected proofs as verified"
+    
+    def reject_selected(self, request, queryset):
+        rejected = reject_proofs(queryset)
+        self.message_user(request, f"{len(rejected)} payment proof(s) rejected and removed.")
+    
+    reject_selected.short_description = "Reject selected proofs"
 
 
 @admin.register(PDFStamp)
 class PDFStampAdmin(admin.ModelAdmin):
     list_display = ['name', 'is_active']
     list_filter = ['is_active']
+
+
+@admin.register(TrackingEvent)
+class TrackingEventAdmin(admin.ModelAdmin):
+    list_display = ['shipment', 'timestamp', 'status', 'location']
+    list_filter = ['status']
+    list_select_related = ['shipment']
+    search_fields = ['shipment__tracking_number']
+    
+    # The history is append-only; events are written when shipments change
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
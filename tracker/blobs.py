@@ -0,0 +1,177 @@
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MediaBlob, PaymentProof, PDFStamp, Shipment, SiteSettings
+from .storage import BLOB_DIR, blob_digest, media_storage
+
+# Model -> its image fields kept in the content-addressed media storage
+BLOB_FIELDS = {
+    model: tuple(field.name for field in model._meta.fields if getattr(field, 'storage', None) is media_storage)
+    for model in (Shipment, PaymentProof, PDFStamp, SiteSettings)
+}
+
+# Keeps each name__in list under SQLite's bound parameter limit
+NAME_CHUNK_SIZE = 500
+
+
+def blob_names(instance):
+    """{field: stored name, '' if empty} for an instance's image fields; deferred fields are left out"""
+    values = instance.__dict__
+    return {
+        field: getattr(values[field], 'name', values[field]) or ''
+        for field in BLOB_FIELDS[type(instance)] if field in values
+    }
+
+
+def add_refs(names, sign=1):
+    """Count (sign=1) or uncount (sign=-1) a reference to each name; files stored before hashing are ignored.
+
+    Names changing by the same amount are read and updated together, so a
+    whole batch of rows' files takes two queries rather than one per file.
+    """
+    by_count = defaultdict(list)
+    for name, count in Counter(name for name in names if blob_digest(name)).items():
+        by_count[count].append(name)
+    for count, names in by_count.items():
+        change = F('refs') + count * sign
+        for start in range(0, len(names), NAME_CHUNK_SIZE):
+            chunk = names[start:start + NAME_CHUNK_SIZE]
+            counted = set(MediaBlob.objects.filter(name__in=chunk).values_list('name', flat=True))
+            if counted:
+                MediaBlob.objects.filter(name__in=counted).update(refs=change)
+            for name in chunk:
+                if name in counted:
+                    continue
+                try:
+                    with transaction.atomic():
+                        MediaBlob.objects.create(name=name, refs=count * sign)
+                except IntegrityError:
+                    MediaBlob.objects.filter(name=name).update(refs=change)  # Created concurrently
+
+
+def release(names):
+    """Drop a reference to each name and delete the files nothing refers to once the transaction commits"""
+    names = [name for name in names if blob_digest(name)]
+    if names:
+        add_refs(names, -1)
+        transaction.on_commit(lambda: collect_blobs(names))
+
+
+def _stored_blobs():
+    """Names of every file in the blob directory"""
+    try:
+        prefixes = media_storage.listdir(BLOB_DIR)[0]
+    except FileNotFoundError:
+        return []
+    return [
+        name
+        for prefix in prefixes
+        for name in (f'{BLOB_DIR}/{prefix}/{filename}' for filename in media_storage.listdir(f'{BLOB_DIR}/{prefix}')[1])
+        if blob_digest(name)
+    ]
+
+
+def collect_blobs(names=None):
+    """Delete the files among names (or in the whole blob directory) that nothing refers to.
+
+    Files written or uploaded again within MEDIA_GC_GRACE_SECONDS are kept:
+    the row referring to them may not be committed yet. A later run picks
+    them up if they stay unused. Returns (files deleted, bytes freed).
+    """
+    candidates = list(dict.fromkeys(names)) if names is not None else _stored_blobs()
+    referenced = set()
+    for start in range(0, len(candidates), NAME_CHUNK_SIZE):
+        referenced.update(MediaBlob.objects.filter(
+            name__in=candidates[start:start + NAME_CHUNK_SIZE], refs__gt=0,
+        ).values_list('name', flat=True))
+
+    cutoff = time.time() - getattr(settings, 'MEDIA_GC_GRACE_SECONDS', 300)
+    deleted = []
+    freed = 0
+    for name in candidates:
+        if name in referenced:
+            continue
+        try:
+            stat = os.stat(media_storage.path(name))
+        except FileNotFoundError:
+            deleted.append(name)
+            continue
+        if stat.st_mtime > cutoff:
+            continue
+        media_storage.delete(name)
+        deleted.append(name)
+        freed += stat.st_size
+    for start in range(0, len(deleted), NAME_CHUNK_SIZE):
+        MediaBlob.objects.filter(name__in=deleted[start:start + NAME_CHUNK_SIZE], refs__lte=0).delete()
+    return len(deleted), freed
+
+
+def rebuild_blob_refs():
+    """Recount every file's references from the image columns; returns how many files are in use"""
+    counts = Counter()
+    for model, fields in BLOB_FIELDS.items():
+        for row in model.objects.values_list(*fields).iterator():
+            counts.update(name for name in row if blob_digest(name))
+    with transaction.atomic():
+        MediaBlob.objects.all().delete()
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name, refs=refs) for name, refs in counts.items()], batch_size=1000,
+        )
+    return len(counts)
+
+
+def hash_stored_files():
+    """Move files stored under their upload names into the blob directory and point their rows there.
+
+    Rows are changed with queryset updates. Afterwards, files in the upload
+    directories that no row names are removed: the moved originals, and
+    earlier uploads that were replaced without being deleted. Rows whose file
+    is missing are left as they are. Returns (rows updated, old files removed).
+    """
+    moved = {}
+    for model, fields in BLOB_FIELDS.items():
+        for field in fields:
+            names = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            for name in names.values_list(field, flat=True).distinct():
+                if name in moved or blob_digest(name) or not media_storage.exists(name):
+                    continue
+                with media_storage.open(name) as old_file:
+                    moved[name] = media_storage.save(name, old_file)
+
+    rows = 0
+    with transaction.atomic():
+        for model, fields in BLOB_FIELDS.items():
+            for field in fields:
+                for old_name, new_name in moved.items():
+                    rows += model.objects.filter(**{field: old_name}).update(**{field: new_name})
+        rebuild_blob_refs()
+    return rows, _remove_unreferenced_uploads()
+
+
+def _remove_unreferenced_uploads():
+    referenced = set()
+    directories = set()
+    for model, fields in BLOB_FIELDS.items():
+        for field in fields:
+            referenced.update(model.objects.values_list(field, flat=True).distinct())
+            upload_to = model._meta.get_field(field).upload_to
+            if isinstance(upload_to, str):
+                directories.add(upload_to.rstrip('/'))
+    cutoff = time.time() - getattr(settings, 'MEDIA_GC_GRACE_SECONDS', 300)
+    removed = 0
+    for directory in directories:
+        try:
+            filenames = media_storage.listdir(directory)[1]
+        except FileNotFoundError:
+            continue
+        for filename in filenames:
+            name = f'{directory}/{filename}'
+            if name not in referenced and os.stat(media_storage.path(name)).st_mtime <= cutoff:
+                media_storage.delete(name)
+                removed += 1
+    return removed
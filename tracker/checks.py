@@ -0,0 +1,21 @@
+from django.core import checks
+from django.db import connections
+
+from .search import missing_search_triggers
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    """The full-text index triggers must survive migrations that rebuild tracker_shipment"""
+    errors = []
+    for alias in databases or ():
+        missing = missing_search_triggers(connections[alias])
+        if missing:
+            errors.append(checks.Error(
+                f"The shipment search index triggers {', '.join(missing)} are missing from the "
+                f"'{alias}' database, so saved shipments no longer reach the search index.",
+                hint="A migration rebuilt tracker_shipment (SQLite drops its triggers then). "
+                     "Run 'manage.py rebuild_search_index' to restore them, and avoid table rebuilds in migrations.",
+                id='tracker.E001',
+            ))
+    return errors
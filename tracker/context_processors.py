@@ -1,5 +1,4 @@
-from .models import PaymentProof, PDFStamp, Shipment
-
+from .counters import lazy_counters
 from .models import SiteSettings
 
 def site_settings(request):
@@ -9,13 +8,6 @@ def site_settings(request):
 
 def admin_context(request):
     if request.user.is_authenticated and request.user.is_staff:
-        pending_payments_count = PaymentProof.objects.filter(is_verified=False).count()
-        active_stamps_count = PDFStamp.objects.filter(is_active=True).count()
-        total_shipments = Shipment.objects.count()
-        
-        return {
-            'pending_payments_count': pending_payments_count,
-            'active_stamps_count': active_stamps_count,
-            'total_shipments': total_shipments,
-        }
+        # Evaluated only if the template reads them, and cached briefly
+        return lazy_counters()
     return {}
\ No newline at end of file
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, new_method_proxy
+
+from .models import PaymentProof, PDFStamp, Shipment
+
+COUNTERS = {
+    'pending_payments_count': lambda: PaymentProof.objects.filter(is_verified=False).count(),
+    'active_stamps_count': lambda: PDFStamp.objects.filter(is_active=True).count(),
+    'total_shipments': lambda: Shipment.objects.count(),
+}
+
+
+def _cache_key(name):
+    return f'tracker:counter:{name}'
+
+
+def get_counter(name):
+    """Current value of a sidebar counter, cached for ADMIN_COUNTERS_TIMEOUT seconds"""
+    return cache.get_or_set(_cache_key(name), COUNTERS[name], getattr(settings, 'ADMIN_COUNTERS_TIMEOUT', 30))
+
+
+def invalidate_counters(*names):
+    cache.delete_many([_cache_key(name) for name in names or COUNTERS])
+
+
+class LazyCount(SimpleLazyObject):
+    """Integer that only runs its query when a template actually reads it"""
+    
+    __int__ = new_method_proxy(int)
+    __add__ = new_method_proxy(lambda value, other: value + other)
+    __radd__ = new_method_proxy(lambda value, other: other + value)
+
+
+def lazy_counters():
+    return {name: LazyCount(lambda name=name: get_counter(name)) for name in COUNTERS}
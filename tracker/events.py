@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import TrackingEvent
+
+# Shipment fields an event records; a change to the first two writes one
+EVENT_FIELDS = ('status', 'current_location', 'remarks')
+
+
+def event_state(shipment, saved_state=None):
+    """Raw values of EVENT_FIELDS, or None if any of them was deferred.
+
+    Like rollups.rollup_state, deferred fields are taken from saved_state
+    once the row has been saved.
+    """
+    values = shipment.__dict__
+    if saved_state is not None:
+        return tuple(values.get(field, old) for field, old in zip(EVENT_FIELDS, saved_state))
+    if any(field not in values for field in EVENT_FIELDS):
+        return None
+    return tuple(values[field] for field in EVENT_FIELDS)
+
+
+def event_for_change(shipment_id, old_state, new_state, timestamp):
+    """The TrackingEvent for a status/location change, or None if neither changed.
+
+    old_state is None for a new shipment. Remarks are only carried over when
+    they changed along with it, so an unchanged note isn't repeated on every hop.
+    """
+    if new_state is None or (old_state is not None and new_state[:2] == old_state[:2]):
+        return None
+    status, location, remarks = new_state
+    if old_state is not None and remarks == old_state[2]:
+        remarks = ''
+    return TrackingEvent(
+        shipment_id=shipment_id, timestamp=timestamp, status=status, location=location, remarks=remarks or '',
+    )
+
+
+def recent_events(shipment, limit=None):
+    """A shipment's newest events, read backwards along (shipment, timestamp) with one bounded query"""
+    limit = limit or getattr(settings, 'TRACKING_EVENTS_SHOWN', 20)
+    return list(shipment.events.all()[:limit])
+
+
+async def arecent_events(shipment, limit=None):
+    limit = limit or getattr(settings, 'TRACKING_EVENTS_SHOWN', 20)
+    return [event async for event in shipment.events.all()[:limit]]
+
+
+def compact_events(now=None):
+    """Thin out and expire old history; returns (events compacted, events expired).
+
+    Past TRACKING_EVENT_COMPACT_DAYS an event that only moved a shipment to
+    another location under the same status is dropped, so hop-by-hop scans
+    collapse into one entry per status change. Past
+    TRACKING_EVENT_RETENTION_DAYS events are deleted, except each shipment's
+    latest so its page still has something to show.
+    """
+    now = now or timezone.now()
+    compact_before = now - timedelta(days=getattr(settings, 'TRACKING_EVENT_COMPACT_DAYS', 30))
+    expire_before = now - timedelta(days=getattr(settings, 'TRACKING_EVENT_RETENTION_DAYS', 365))
+    earlier = TrackingEvent.objects.filter(
+        shipment_id=OuterRef('shipment_id'), timestamp__lt=OuterRef('timestamp'),
+    ).order_by('-timestamp', '-id')
+    later = TrackingEvent.objects.filter(shipment_id=OuterRef('shipment_id'), timestamp__gt=OuterRef('timestamp'))
+
+    with transaction.atomic():
+        same_status = (
+            TrackingEvent.objects.filter(timestamp__lt=compact_before)
+            .annotate(previous_status=Subquery(earlier.values('status')[:1]))
+            .filter(previous_status=F('status'))
+        )
+        compacted, _ = TrackingEvent.objects.filter(pk__in=same_status.values('pk')).delete()
+        expired_events = TrackingEvent.objects.filter(timestamp__lt=expire_before).filter(Exists(later))
+        expired, _ = TrackingEvent.objects.filter(pk__in=expired_events.values('pk')).delete()
+    return compacted, expired
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.core.validators import FileExtensionValidator
 from .models import Shipment, PDFStamp
+from .uploads import clean_image_upload
 
 class ShipmentForm(forms.ModelForm):
     class Meta:
@@ -28,6 +31,42 @@ class ShipmentForm(forms.ModelForm):
             if Shipment.objects.filter(tracking_number=tracking_number).exists():
                 raise forms.ValidationError('A shipment with this tracking number already exists.')
         return tracking_number
+    
+    def clean_parcel_image(self):
+        image = self.cleaned_data['parcel_image']
+        if isinstance(image, UploadedFile):  # Not the stored image, or False to clear it
+            image = clean_image_upload(image)
+        return image
+
+class ShipmentImportRowForm(ShipmentForm):
+    """ShipmentForm's rules for one imported row.
+    
+    Tracking number uniqueness is checked by the importer for a whole batch
+    at once, so the per-row queries (clean_tracking_number and the model's
+    unique check) are skipped here.
+    """
+    class Meta(ShipmentForm.Meta):
+        fields = [field for field in ShipmentForm.Meta.fields if field != 'parcel_image']
+    
+    def clean_tracking_number(self):
+        return self.cleaned_data['tracking_number']
+    
+    def validate_unique(self):
+        pass
+
+class ShipmentImportForm(forms.Form):
+    file = forms.FileField(
+        validators=[FileExtensionValidator(['csv', 'jsonl', 'ndjson'])],
+        help_text='CSV with a header row, or JSON Lines with one shipment object per line',
+    )
+
+class PaymentProofForm(forms.Form):
+    # A plain FileField: clean_image_upload checks the header itself instead of
+    # ImageField's full verify() pass over the file
+    proof = forms.FileField()
+    
+    def clean_proof(self):
+        return clean_image_upload(self.cleaned_data['proof'])
 
 class PDFStampForm(forms.ModelForm):
     class Meta:
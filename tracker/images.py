@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from PIL import Image as PILImage, ImageOps
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image
+
+from .storage import blob_digest
+
+# Size each kind of image is drawn at in the tracking report, in points
+DRAW_SIZES = {
+    'logo': (2*inch, 1*inch),
+    'parcel': (4*inch, 3*inch),
+    'stamp': (1.5*inch, 1.5*inch),
+    'signature': (2*inch, 0.5*inch),
+}
+
+_image_data = OrderedDict()
+_image_data_lock = threading.Lock()
+
+
+def _blob_name(source_path):
+    """The last three parts of a path, which for a content-addressed file are its stored name"""
+    return '/'.join(os.path.normpath(source_path).split(os.sep)[-3:])
+
+
+def _cache_dir():
+    return str(getattr(settings, 'PDF_IMAGE_CACHE_DIR', settings.BASE_DIR / 'cache' / 'images'))
+
+
+def _target_pixels(kind):
+    dpi = getattr(settings, 'PDF_IMAGE_DPI', 150)
+    width, height = DRAW_SIZES[kind]
+    return round(width / 72 * dpi), round(height / 72 * dpi)
+
+
+def _derived_base(source_path, kind):
+    """Path of the derived copy without extension; changes whenever the source file does.
+    
+    Content-addressed files never change and are keyed on their hash, so
+    duplicates share one copy and no stat() is needed.
+    """
+    width, height = _target_pixels(kind)
+    content = blob_digest(_blob_name(source_path))
+    if content is None:
+        stat = os.stat(source_path)
+        content = f'{source_path}:{stat.st_size}:{stat.st_mtime_ns}'
+    digest = hashlib.sha1(f'{content}:{width}x{height}'.encode()).hexdigest()
+    return os.path.join(_cache_dir(), kind, digest)
+
+
+def _existing_derived(base):
+    for ext in ('.jpg', '.png'):
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def make_derived_image(source_path, kind):
+    """Write a copy of the image resized to its draw size and recompressed, returning its path"""
+    base = _derived_base(source_path, kind)
+    existing = _existing_derived(base)
+    if existing:
+        return existing
+    
+    with PILImage.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        target_width, target_height = _target_pixels(kind)
+        # Only ever shrink; ReportLab stretches to the draw size either way
+        size = (min(target_width, img.width), min(target_height, img.height))
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        if size != img.size:
+            img = img.resize(size, PILImage.LANCZOS)
+        
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        path = base + ('.png' if has_alpha else '.jpg')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        if has_alpha:
+            img.save(tmp_path, 'PNG', optimize=True)
+        else:
+            img.save(tmp_path, 'JPEG', quality=getattr(settings, 'PDF_IMAGE_QUALITY', 85), optimize=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def prepare_pdf_image(field_file, kind):
+    """Generate the derived copy for an uploaded image, ignoring files Pillow cannot read"""
+    if not field_file:
+        return None
+    try:
+        return make_derived_image(field_file.path, kind)
+    except (OSError, ValueError, NotImplementedError):
+        return None
+
+
+def get_image_data(source_path, kind):
+    """Bytes of the draw-sized copy of an image, from a per-process LRU"""
+    try:
+        path = make_derived_image(source_path, kind)
+    except (OSError, ValueError):
+        # Not something Pillow can shrink; let ReportLab try the original
+        path = source_path
+    
+    with _image_data_lock:
+        data = _image_data.get(path)
+        if data is not None:
+            _image_data.move_to_end(path)
+            return data
+    
+    with open(path, 'rb') as image_file:
+        data = image_file.read()
+    with _image_data_lock:
+        _image_data[path] = data
+        while len(_image_data) > getattr(settings, 'PDF_IMAGE_LRU_SIZE', 32):
+            _image_data.popitem(last=False)
+    return data
+
+
+def get_image_reader(source_path, kind):
+    """A new ImageReader over the cached bytes of an image's draw-sized copy.
+    
+    ReportLab seeks and reads the reader's file object while drawing, so
+    readers can't be shared between renders running in parallel threads;
+    only the bytes are.
+    """
+    return ImageReader(io.BytesIO(get_image_data(source_path, kind)))
+
+
+def clear_image_data():
+    with _image_data_lock:
+        _image_data.clear()
+
+
+class ReaderImage(Image):
+    """Platypus Image drawn from an already decoded ImageReader"""
+    
+    def __init__(self, reader, width=None, height=None):
+        self._img = reader
+        super().__init__(reader.fp, width=width, height=height)
+
+
+def pdf_image(source_path, kind):
+    """Flowable drawing an image at its report size from the derived-image cache"""
+    width, height = DRAW_SIZES[kind]
+    return ReaderImage(get_image_reader(source_path, kind), width=width, height=height)
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .counters import invalidate_counters
+from .events import event_for_change, event_state
+from .forms import ShipmentImportRowForm
+from .lookups import forget_unknown, get_known_numbers
+from .models import Shipment, TrackingEvent
+from .rollups import ROLLUP_FIELDS, apply_rollups
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# Model defaults for columns a row leaves out, so e.g. a missing status is 'pending'
+# rather than a form error, and a missing show_payment_info is True rather than False
+ROW_DEFAULTS = {
+    field.name: field.get_default()
+    for field in Shipment._meta.fields
+    if field.name in ShipmentImportRowForm.Meta.fields and field.has_default()
+}
+
+
+class ImportResult:
+    """What an import did: rows read, shipments created, per-row errors and throughput"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []  # (line number, message)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else 0
+
+    def __str__(self):
+        return (
+            f'{self.created} of {self.rows} rows imported, {len(self.errors)} rejected '
+            f'in {self.elapsed:.1f}s ({self.rows_per_second} rows/s)'
+        )
+
+
+def detect_format(filename):
+    return FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def read_rows(binary_file, file_format):
+    """Yield (line number, row dict or error message) from an open binary file, one row at a time"""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames:
+            reader.fieldnames = [name.strip() for name in reader.fieldnames]
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as exc:
+            yield line, f'Invalid JSON: {exc}'
+            continue
+        yield line, row if isinstance(row, dict) else 'Each line must be a JSON object'
+
+
+def _form_errors(form):
+    return '; '.join(
+        f'{field}: {" ".join(messages)}' if field != '__all__' else ' '.join(messages)
+        for field, messages in form.errors.items()
+    )
+
+
+def import_shipments(rows, batch_size=None):
+    """Validate rows with the ShipmentForm rules and insert them with bulk_create.
+
+    rows yields (line number, dict) pairs as read_rows() does. Valid rows are
+    written in batches of IMPORT_BATCH_SIZE, each in its own transaction with
+    one query to find tracking numbers that already exist. Since bulk_create
+    sends no signals, the daily rollups, first tracking events, sidebar
+    counter and tracking number filter are updated here; the search index
+    follows through its triggers. Rows already written stay written if a
+    later batch fails.
+    """
+    batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+    result = ImportResult()
+    seen = set()
+    batch = []
+    for line, row in rows:
+        result.rows += 1
+        if not isinstance(row, dict):
+            result.add_error(line, row)
+            continue
+        form = ShipmentImportRowForm({**ROW_DEFAULTS, **row})
+        if not form.is_valid():
+            result.add_error(line, _form_errors(form))
+            continue
+        shipment = form.instance
+        if shipment.tracking_number in seen:
+            result.add_error(line, f'tracking_number: {shipment.tracking_number} appears earlier in the file.')
+            continue
+        seen.add(shipment.tracking_number)
+        # Shipment.save() isn't called, so do its work here
+        shipment.total_cost = shipment.shipment_cost + shipment.clearance_cost
+        batch.append((line, shipment))
+        if len(batch) >= batch_size:
+            _write_batch(batch, result)
+            batch = []
+    if batch:
+        _write_batch(batch, result)
+
+    if result.created:
+        invalidate_counters('total_shipments')
+    result.errors.sort()  # Batches report already-existing numbers after the rows behind them
+    result.elapsed = time.perf_counter() - result.started
+    return result
+
+
+def _write_batch(batch, result):
+    numbers = [shipment.tracking_number for _, shipment in batch]
+    try:
+        with transaction.atomic():
+            existing = set(Shipment.objects.filter(tracking_number__in=numbers).values_list('tracking_number', flat=True))
+            new = [shipment for _, shipment in batch if shipment.tracking_number not in existing]
+            Shipment.objects.bulk_create(new)
+            TrackingEvent.objects.bulk_create(filter(None, (
+                event_for_change(shipment.pk, None, event_state(shipment), shipment.last_updated)
+                for shipment in new
+            )))
+            apply_rollups(tuple(getattr(shipment, field) for field in ROLLUP_FIELDS) for shipment in new)
+    except IntegrityError as exc:
+        # Another writer took one of the numbers between the check and the insert
+        for line, _ in batch:
+            result.add_error(line, f'Batch not imported: {exc}')
+        return
+
+    for line, shipment in batch:
+        if shipment.tracking_number in existing:
+            result.add_error(line, 'tracking_number: A shipment with this tracking number already exists.')
+    known = get_known_numbers()
+    for shipment in new:
+        known.add(shipment.tracking_number)
+    forget_unknown(*(shipment.tracking_number for shipment in new))
+    result.created += len(new)
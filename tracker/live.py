@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+
+from .tracking import live_payload
+
+
+class Subscriber:
+    """One open stream, woken on its own event loop.
+
+    Only the newest update is kept: a client that falls behind gets the
+    shipment's latest state rather than a backlog of stale ones.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.update = None
+
+    def deliver(self, update):
+        self.update = update
+        self.ready.set()
+
+    async def next_update(self, timeout):
+        """The next (event id, payload), or None if nothing arrived within timeout seconds"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        update, self.update = self.update, None
+        return update
+
+
+class TrackingHub:
+    """In-process fan-out of shipment updates to open live streams.
+
+    publish() is called from whichever thread committed the change and hands
+    the update to each subscriber's loop, so one write wakes every page
+    watching that tracking number without any of them querying. The newest
+    update per tracking number is kept (up to LIVE_HISTORY_SIZE numbers) so a
+    reconnecting stream can catch up on what it missed from its
+    Last-Event-ID. Subscribers only hear about writes made by this process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.subscribers = defaultdict(set)
+            self.latest = OrderedDict()
+            self.published = self.delivered = 0
+
+    def subscribe(self, tracking_number):
+        """Must be called from the event loop that will wait on the subscriber"""
+        subscriber = Subscriber()
+        with self.lock:
+            self.subscribers[tracking_number].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, tracking_number, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(tracking_number)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[tracking_number]
+
+    def publish(self, tracking_number, event_id, payload):
+        update = (event_id, payload)
+        with self.lock:
+            self.latest[tracking_number] = update
+            self.latest.move_to_end(tracking_number)
+            while len(self.latest) > getattr(settings, 'LIVE_HISTORY_SIZE', 10000):
+                self.latest.popitem(last=False)
+            subscribers = list(self.subscribers.get(tracking_number, ()))
+            self.published += 1
+            self.delivered += len(subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, update)
+            except RuntimeError:  # Its loop has shut down; the stream is gone
+                self.unsubscribe(tracking_number, subscriber)
+
+    def missed(self, tracking_number, last_event_id):
+        """The newest update if it is newer than last_event_id, else None"""
+        with self.lock:
+            update = self.latest.get(tracking_number)
+        return update if update is not None and is_newer(update[0], last_event_id) else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'streams': sum(len(subscribers) for subscribers in self.subscribers.values()),
+                'tracking_numbers': len(self.subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+            }
+
+
+hub = TrackingHub()
+
+
+def is_newer(event_id, last_event_id):
+    """Event ids are commit timestamps; anything beats a missing or malformed last id"""
+    try:
+        return float(event_id) > float(last_event_id)
+    except (TypeError, ValueError):
+        return True
+
+
+def event_id(event):
+    return f'{event.timestamp.timestamp():.6f}'
+
+
+def publish_on_commit(changes):
+    """Publish (shipment, TrackingEvent) pairs to live streams once the transaction commits.
+
+    The payloads are built now, from what the caller has in memory, so
+    publishing costs no queries and later edits to the instances don't leak in.
+    """
+    updates = [(shipment.tracking_number, event_id(event), live_payload(shipment, event))
+               for shipment, event in changes]
+    if updates:
+        transaction.on_commit(lambda: [hub.publish(*update) for update in updates])
+
+
+def sse_message(update):
+    event_id, payload = update
+    return f'id: {event_id}\nevent: update\ndata: {json.dumps(payload)}\n\n'
+
+
+def serves_live_stream(request):
+    """Whether pages for this request should open a live stream.
+
+    Only an ASGI server can hold a stream open without tying up a worker
+    thread; pages served under WSGI revalidate with conditional GETs instead.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+async def stream_updates(tracking_number, last_event_id, timeout):
+    """Server-Sent Events for one tracking number until timeout seconds have passed.
+
+    Comments are sent every LIVE_KEEPALIVE_INTERVAL seconds so proxies keep
+    the connection open.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    keepalive = getattr(settings, 'LIVE_KEEPALIVE_INTERVAL', 15)
+    subscriber = hub.subscribe(tracking_number)
+    try:
+        yield f'retry: {getattr(settings, "LIVE_RETRY_MS", 3000)}\n\n'
+        update = hub.missed(tracking_number, last_event_id)
+        while True:
+            # A reconnect can find the same update both missed and delivered
+            if update is not None and is_newer(update[0], last_event_id):
+                yield sse_message(update)
+                last_event_id = update[0]
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            update = await subscriber.next_update(min(keepalive, remaining))
+            if update is None:
+                yield ': keepalive\n\n'
+    finally:
+        hub.unsubscribe(tracking_number, subscriber)
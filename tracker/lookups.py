@@ -0,0 +1,205 @@
+import hashlib
+import math
+import struct
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Shipment
+
+# Rows saved this long before a catch-up are re-read, for transactions that committed late
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Compact set of strings that can give false positives but never false negatives"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        hashes = min(max(round(self.size / self.capacity * math.log(2)), 1), 16)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        # One digest sliced into k 32-bit positions is cheaper than k digests
+        self._unpack = struct.Struct(f'<{hashes}I').unpack
+        self._digest_size = 4 * hashes
+
+    def _positions(self, value):
+        size = self.size
+        return [word % size for word in self._unpack(
+            hashlib.blake2b(value.encode(), digest_size=self._digest_size).digest()
+        )]
+
+    def add(self, value):
+        positions = self._positions(value)
+        if all(self.bits[position >> 3] & (1 << (position & 7)) for position in positions):
+            return  # Already present (or a false positive), so count stays near distinct values
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, values):
+        """Add many values at once; the count assumes they are distinct"""
+        bits, positions = self.bits, self._positions
+        for value in values:
+            for position in positions(value):
+                bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class KnownTrackingNumbers:
+    """Bloom filter of every tracking number, so lookups for unknown ones skip the database.
+
+    Built on first use: inline for small tables, otherwise in a background
+    thread while lookups keep going to the database. Shipments saved in this
+    process are added by signal; ones saved by other processes are picked up
+    by a catch-up query on last_updated at most every
+    TRACKING_FILTER_SYNC_INTERVAL seconds, and only when the filter is about
+    to answer "unknown". Deleted numbers stay in the filter (lookups fall
+    through to the database) until enough deletions or growth force a rebuild.
+    """
+
+    # Above this many shipments the filter is built off the request thread (about 4s per million)
+    INLINE_BUILD_LIMIT = 50000
+
+    def __init__(self, error_rate, sync_interval):
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.filter = None
+        self.building = False
+        self.synced_at = None
+        self.checked_at = 0
+        self.deleted = 0
+        self.added_while_building = []
+
+    def build(self):
+        started = timezone.now()
+        numbers = Shipment.objects.values_list('tracking_number', flat=True)
+        # Headroom so new shipments don't force a rebuild straight away
+        bloom = BloomFilter(max(numbers.count() * 2, 1024), self.error_rate)
+        bloom.update(numbers.iterator(chunk_size=10000))
+        with self.lock:
+            bloom.update(self.added_while_building)
+            self.filter, self.synced_at, self.checked_at = bloom, started, time.monotonic()
+            self.deleted, self.building, self.added_while_building = 0, False, []
+
+    def _build_in_background(self):
+        try:
+            self.build()
+        finally:
+            self.building = False
+            connection.close()
+
+    def start_build(self):
+        """Build inline for small tables, else on a thread; called with the lock held"""
+        if self.building:
+            return
+        self.building = True
+        self.added_while_building = []
+        if Shipment.objects.count() <= self.INLINE_BUILD_LIMIT:
+            self.lock.release()
+            try:
+                self.build()
+            finally:
+                self.lock.acquire()
+                self.building = False
+        else:
+            threading.Thread(target=self._build_in_background, daemon=True).start()
+
+    def catch_up(self):
+        """Add numbers saved elsewhere since the last sync; rebuild if the filter is overfull or stale"""
+        if self.filter.count > self.filter.capacity or self.deleted > self.filter.capacity // 4:
+            self.start_build()
+            return
+        started = timezone.now()
+        recent = Shipment.objects.filter(last_updated__gte=self.synced_at - SYNC_OVERLAP)
+        for number in recent.values_list('tracking_number', flat=True):
+            self.filter.add(number)
+        self.synced_at, self.checked_at = started, time.monotonic()
+
+    def may_exist(self, tracking_number):
+        with self.lock:
+            if self.filter is None:
+                self.start_build()
+                if self.filter is None:
+                    return True  # Still building: let the database answer
+            if tracking_number in self.filter:
+                return True
+            if time.monotonic() - self.checked_at < self.sync_interval:
+                return False
+            self.catch_up()
+            return tracking_number in self.filter
+
+    def add(self, tracking_number):
+        with self.lock:
+            if self.building:
+                self.added_while_building.append(tracking_number)
+            if self.filter is not None:
+                self.filter.add(tracking_number)
+
+    def discard(self, tracking_number):
+        # A bloom filter can't remove entries, so only count towards the next rebuild
+        with self.lock:
+            self.deleted += 1
+
+
+_known_numbers = None
+_known_numbers_lock = threading.Lock()
+
+
+def get_known_numbers():
+    global _known_numbers
+    if _known_numbers is None:
+        with _known_numbers_lock:
+            if _known_numbers is None:
+                _known_numbers = KnownTrackingNumbers(
+                    getattr(settings, 'TRACKING_FILTER_ERROR_RATE', 0.01),
+                    getattr(settings, 'TRACKING_FILTER_SYNC_INTERVAL', 2),
+                )
+    return _known_numbers
+
+
+def reset_known_numbers():
+    global _known_numbers
+    _known_numbers = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('TRACKING_FILTER_'):
+        reset_known_numbers()
+
+
+def _unknown_key(tracking_number):
+    return 'tracker:unknown:' + hashlib.sha1(tracking_number.encode()).hexdigest()
+
+
+def tracking_number_may_exist(tracking_number):
+    """False if the tracking number is certainly unknown, answered without a database query"""
+    if not getattr(settings, 'TRACKING_FILTER_ENABLED', True):
+        return True
+    if not get_known_numbers().may_exist(tracking_number):
+        return False
+    # Bloom false positives and deleted numbers are caught by the negative cache
+    return not cache.get(_unknown_key(tracking_number))
+
+
+def remember_unknown(tracking_number):
+    """Record a lookup the database answered with nothing, for NEGATIVE_LOOKUP_TIMEOUT seconds"""
+    cache.set(_unknown_key(tracking_number), True, getattr(settings, 'NEGATIVE_LOOKUP_TIMEOUT', 30))
+
+
+def forget_unknown(*tracking_numbers):
+    cache.delete_many([_unknown_key(tracking_number) for tracking_number in tracking_numbers])
@@ -0,0 +1,55 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tracker import pdf
+from tracker.models import Shipment, SiteSettings
+from tracker.report import build_report
+
+
+class Command(BaseCommand):
+    help = "Measure per-report CPU time with precompiled styles against rebuilding them per request"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        now = timezone.now()
+        # Unsaved instances keep the benchmark independent of database contents
+        shipment = Shipment(
+            tracking_number='BENCH-0001',
+            sender_name='Alice Sender', sender_address='1 Origin Street',
+            sender_email='alice@example.com', sender_phone='5551234',
+            receiver_name='Bob Receiver', receiver_address='2 Destination Road',
+            receiver_email='bob@example.com', receiver_phone='5555678',
+            origin='London', destination='New York', current_location='Frankfurt',
+            status='on_way', remarks='Handle with care', parcel_description='Documents',
+            parcel_weight=Decimal('2.50'), require_payment=True,
+            shipment_cost=Decimal('120.00'), clearance_cost=Decimal('30.00'), total_cost=Decimal('150.00'),
+            crypto_wallet='bc1qexamplewalletaddress', payment_status='awaiting_payment',
+            date_created=now, last_updated=now,
+        )
+        report = build_report(shipment, SiteSettings(updated_at=now))
+
+        def per_request_styles():
+            # What print_tracking_pdf used to do on every call
+            pdf._build_styles()
+            pdf._build_table_styles()
+
+        cases = [
+            ('styles only, rebuilt per request', per_request_styles),
+            ('story, rebuilt styles', lambda: (per_request_styles(), pdf.build_story(report))),
+            ('story, precompiled styles', lambda: pdf.build_story(report)),
+            ('full PDF, rebuilt styles', lambda: (per_request_styles(), pdf.render_report_pdf(report))),
+            ('full PDF, precompiled styles', lambda: pdf.render_report_pdf(report)),
+        ]
+        for label, func in cases:
+            func()  # warm up
+            start = time.process_time()
+            for _ in range(iterations):
+                func()
+            per_call = (time.process_time() - start) / iterations * 1000
+            self.stdout.write(f"{label:<36} {per_call:8.3f} ms CPU/call")
@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from tracker.models import Shipment
+from tracker.rollups import rebuild_daily_stats
+from tracker.scans import apply_scans
+
+CITIES = ['Lagos', 'Accra', 'Nairobi', 'London', 'Dubai', 'Houston', 'Madrid', 'Frankfurt', 'Toronto', 'Mumbai']
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_scans(scans):
+    """What updating parcels one at a time through admin_edit_shipment costs: a lookup and a full save each"""
+    for _, scan in scans:
+        shipment = Shipment.objects.get(tracking_number=scan['tracking_number'])
+        shipment.status = scan['status']
+        shipment.current_location = scan['current_location']
+        shipment.save()
+
+
+class Command(BaseCommand):
+    help = "Compare per-parcel saves against batched apply_scans for courier scan updates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shipments', type=int, default=50000)
+        parser.add_argument('--scans', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # Everything is generated inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                self.populate(options['shipments'])
+                rng = random.Random(42)
+                numbers = rng.sample(range(options['shipments']), min(2 * options['scans'], options['shipments']))
+                half = len(numbers) // 2
+                self.measure('legacy per-parcel save', legacy_scans, self.scans(rng, numbers[:half]))
+                self.measure('apply_scans', apply_scans, self.scans(rng, numbers[half:]))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, count):
+        self.stdout.write(f"Generating {count} shipments...")
+        batch = []
+        for number in range(count):
+            batch.append(Shipment(
+                tracking_number=f'BENCH-{number:08d}',
+                sender_name='Sender', sender_address='Address', sender_email='s@example.com', sender_phone='1',
+                receiver_name='Receiver', receiver_address='Address', receiver_email='r@example.com', receiver_phone='2',
+                origin='Lagos', destination='London', current_location='Lagos',
+            ))
+            if len(batch) == 5000:
+                Shipment.objects.bulk_create(batch)
+                batch = []
+        Shipment.objects.bulk_create(batch)
+        rebuild_daily_stats()  # bulk_create skips the rollup signals
+
+    def scans(self, rng, numbers):
+        # Parcels are scanned a truck load at a time, so locations come in runs
+        statuses = [choice for choice, _ in Shipment.STATUS_CHOICES if choice != 'pending']
+        scans = []
+        for start in range(0, len(numbers), 50):
+            status, city = rng.choice(statuses), rng.choice(CITIES)
+            scans += [
+                (len(scans) + offset + 1, {'tracking_number': f'BENCH-{number:08d}', 'status': status, 'current_location': city})
+                for offset, number in enumerate(numbers[start:start + 50])
+            ]
+        return scans
+
+    def measure(self, label, func, scans):
+        queries = []
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            start = time.perf_counter()
+            func(scans)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:<24} {len(scans)} scans  {len(queries):6d} queries  "
+            f"{elapsed * 1000:9.1f} ms  {len(scans) / elapsed:8.0f} scans/s"
+        )
@@ -0,0 +1,96 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from tracker.models import Shipment
+from tracker.search import search_shipments
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'to', 'ne', 'sa', 'vi', 'do', 'ber', 'an', 'el', 'fo', 'gu', 'ha', 'ji', 'ku', 'ly', 'mo', 'zen']
+CITIES = ['London', 'Lagos', 'New York', 'Nairobi', 'Berlin', 'Tokyo', 'Lima', 'Dubai', 'Paris', 'Accra']
+
+
+def make_name(rng, syllables):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables)).title()
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_search(query):
+    """The icontains scan admin_shipments used before the full-text index"""
+    return Shipment.objects.filter(
+        Q(tracking_number__icontains=query) |
+        Q(sender_name__icontains=query) |
+        Q(receiver_name__icontains=query)
+    ).order_by('-date_created')
+
+
+class Command(BaseCommand):
+    help = "Time the full-text shipment search against the old icontains scan on generated data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shipments', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Everything is generated inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                queries = self.populate(options['shipments'])
+                for query in queries:
+                    self.measure(f'icontains  {query!r}', lambda: list(legacy_search(query)[:25]), options['repeat'])
+                    self.measure(f'full-text  {query!r}', lambda: list(
+                        search_shipments(Shipment.objects.all(), query)[:25]
+                    ), options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, count):
+        self.stdout.write(f"Generating {count} shipments...")
+        start = time.perf_counter()
+        rng = random.Random(42)
+        batch = []
+        for number in range(count):
+            # A few thousand distinct first and last names, like a real customer base
+            sender = f'{make_name(rng, 2)} {make_name(rng, 3)}'
+            receiver = f'{make_name(rng, 2)} {make_name(rng, 3)}'
+            batch.append(Shipment(
+                tracking_number=f'BENCH-{number:08d}',
+                sender_name=sender, sender_address='Address',
+                sender_email=sender.lower().replace(' ', '.') + '@example.com',
+                sender_phone=f'{rng.randint(200, 999)} {rng.randint(0, 9999):04d}',
+                receiver_name=receiver, receiver_address='Address',
+                receiver_email=receiver.lower().replace(' ', '.') + '@example.org',
+                receiver_phone=f'{rng.randint(200, 999)} {rng.randint(0, 9999):04d}',
+                origin=rng.choice(CITIES), destination=rng.choice(CITIES), current_location=rng.choice(CITIES),
+            ))
+            if len(batch) == 5000:
+                Shipment.objects.bulk_create(batch)
+                batch = []
+        Shipment.objects.bulk_create(batch)
+        self.stdout.write(f"  inserted and indexed in {time.perf_counter() - start:.1f}s")
+        
+        sample = Shipment.objects.get(tracking_number=f'BENCH-{count // 2:08d}')
+        first_name, last_name = sample.sender_name.split()
+        return [
+            sample.tracking_number,                              # exact tracking number
+            sample.tracking_number[:-3],                         # tracking number prefix
+            last_name,                                           # surname
+            f'{first_name[:3]} {last_name[:4]}',                 # name prefixes
+            sample.receiver_email.split('@')[0],                 # email
+            f'{sample.sender_phone} {sample.origin}',            # phone and city
+            sample.origin,                                       # a city, about a quarter of all rows
+        ]
+
+    def measure(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(f"{label:<32} {min(timings) * 1000:9.2f} ms (best of {repeat})")
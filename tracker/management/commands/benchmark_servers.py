@@ -0,0 +1,161 @@
+import asyncio
+import importlib
+import io
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+import tracker.urls
+from tracker.models import Shipment
+
+
+def request_host():
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+def route_public_views(use_async):
+    """Re-read tracker.urls with ASYNC_PUBLIC_VIEWS set as given, and the root URLconf including it"""
+    with override_settings(ASYNC_PUBLIC_VIEWS=use_async):
+        importlib.reload(tracker.urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+def percentile(latencies, fraction):
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the public tracking pages through Django's WSGI handler on a thread pool and "
+        "its ASGI handler on an event loop (with the sync and the async views), in this process "
+        "and against the configured database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads, like gunicorn --threads')
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Sleep added to every query, to stand in for a database across the network')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        numbers = list(Shipment.objects.order_by('?').values_list('tracking_number', flat=True)[:1000])
+        if not numbers:
+            raise CommandError('There are no shipments to track; load some first, e.g. with import_shipments')
+        rng = random.Random(42)
+        # Mostly tracking lookups, as in production, with some landing and preview pages
+        paths = rng.choices([
+            lambda: ('/track/', f'tracking_number={rng.choice(numbers)}'),
+            lambda: ('/', ''),
+            lambda: (f'/print-preview/{rng.choice(numbers)}/', ''),
+        ], weights=[8, 1, 1], k=options['requests'])
+        paths = [make_path() for make_path in paths]
+
+        latency = options['db_latency_ms'] / 1000
+        if latency:
+            def slow_query(execute, sql, params, many, context):
+                time.sleep(latency)
+                return execute(sql, params, many, context)
+
+            def add_latency(connection, **kwargs):
+                # Fired again each time a request reconnects the same wrapper
+                if slow_query not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(slow_query)
+            connection_created.connect(add_latency, weak=False)
+            connections.close_all()  # So every connection used from here on is slowed down
+
+        self.stdout.write(
+            f"{len(paths)} requests, {options['concurrency']} in flight, {options['threads']} WSGI threads, "
+            f"{options['db_latency_ms']} ms added per query"
+        )
+        try:
+            if options['mode'] in ('wsgi', 'both'):
+                route_public_views(False)
+                self.report('WSGI, sync views', *self.run_wsgi(paths, options['threads']))
+            if options['mode'] in ('asgi', 'both'):
+                route_public_views(False)
+                self.report('ASGI, sync views', *asyncio.run(self.run_asgi(paths, options['concurrency'])))
+                route_public_views(True)
+                self.report('ASGI, async views', *asyncio.run(self.run_asgi(paths, options['concurrency'])))
+        finally:
+            route_public_views(getattr(settings, 'ASYNC_PUBLIC_VIEWS', False))
+
+    def run_wsgi(self, paths, threads):
+        handler = WSGIHandler()
+        host = request_host()
+
+        def call(path_and_query):
+            path, query = path_and_query
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': host,
+                'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            }
+            status = []
+            started = time.perf_counter()
+            response = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return time.perf_counter() - started, int(status[0].split()[0])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(call, paths))
+        return results, time.perf_counter() - started
+
+    async def run_asgi(self, paths, concurrency):
+        handler = ASGIHandler()
+        host = request_host().encode()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def call(path_and_query):
+            path, query = path_and_query
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'headers': [(b'host', host)], 'client': ('127.0.0.1', 0), 'server': (host, 80),
+            }
+            sent_body = asyncio.Event()
+            status = []
+
+            async def receive():
+                if not sent_body.is_set():
+                    sent_body.set()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await asyncio.Event().wait()  # The client never disconnects early
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with slots:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call(path) for path in paths))
+        return results, time.perf_counter() - started
+
+    def report(self, label, results, elapsed):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(status >= 500 for _, status in results)
+        self.stdout.write(
+            f"{label:<18} {len(results) / elapsed:8.0f} req/s  p50 {percentile(latencies, 0.5):7.1f} ms  "
+            f"p95 {percentile(latencies, 0.95):7.1f} ms  {errors} errors"
+        )
@@ -0,0 +1,100 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from tracker.models import PaymentProof, Shipment
+from tracker.rollups import rebuild_daily_stats
+from tracker.stats import compute_shipment_stats
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_stats():
+    """The per-figure queries admin_stats and admin_dashboard used to run"""
+    today = timezone.now().date()
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+    paid = Shipment.objects.filter(payment_status='paid')
+    return {
+        'total_shipments': Shipment.objects.count(),
+        'today_shipments': Shipment.objects.filter(date_created__date=today).count(),
+        'weekly_shipments': Shipment.objects.filter(date_created__date__gte=week_ago).count(),
+        'monthly_shipments': Shipment.objects.filter(date_created__date__gte=month_ago).count(),
+        'pending_shipments': Shipment.objects.filter(status='pending').count(),
+        'delivered_shipments': Shipment.objects.filter(status='delivered').count(),
+        'pending_payments': PaymentProof.objects.filter(is_verified=False).count(),
+        'total_revenue': paid.aggregate(total=Sum('total_cost'))['total'] or 0,
+        'weekly_revenue': paid.filter(date_created__date__gte=week_ago).aggregate(total=Sum('total_cost'))['total'] or 0,
+        'monthly_revenue': paid.filter(date_created__date__gte=month_ago).aggregate(total=Sum('total_cost'))['total'] or 0,
+        'status_distribution': list(Shipment.objects.values('status').annotate(count=Count('id')).order_by('status')),
+        'payment_distribution': list(Shipment.objects.values('payment_status').annotate(count=Count('id')).order_by('payment_status')),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare query count and latency of the rollup-based stats against the old per-figure queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shipments', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Everything is generated inside a transaction that is rolled back at the end
+        try:
+            with transaction.atomic():
+                self.populate(options['shipments'])
+                self.measure('rebuild_daily_stats', rebuild_daily_stats, 1)
+                self.measure('legacy per-figure queries', legacy_stats, options['repeat'])
+                self.measure('compute_shipment_stats', compute_shipment_stats, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, count):
+        self.stdout.write(f"Generating {count} shipments...")
+        rng = random.Random(42)
+        now = timezone.now()
+        statuses = [choice for choice, _ in Shipment.STATUS_CHOICES]
+        payment_statuses = [choice for choice, _ in Shipment.PAYMENT_STATUS]
+        batch = []
+        for number in range(count):
+            cost = Decimal(rng.randint(10, 500))
+            batch.append(Shipment(
+                tracking_number=f'BENCH-{number:08d}',
+                sender_name='Sender', sender_address='Address', sender_email='s@example.com', sender_phone='1',
+                receiver_name='Receiver', receiver_address='Address', receiver_email='r@example.com', receiver_phone='2',
+                origin='A', destination='B', current_location='A',
+                status=rng.choice(statuses), payment_status=rng.choice(payment_statuses),
+                shipment_cost=cost, total_cost=cost,
+            ))
+            if len(batch) == 5000:
+                Shipment.objects.bulk_create(batch)
+                batch = []
+        Shipment.objects.bulk_create(batch)
+        # date_created is auto_now_add, so spread it over the last 90 days afterwards;
+        # bulk writes bypass the rollup signals, which rebuild_daily_stats makes up for
+        ids = list(Shipment.objects.filter(tracking_number__startswith='BENCH-').values_list('id', flat=True))
+        for start in range(0, len(ids), 5000):
+            chunk = ids[start:start + 5000]
+            Shipment.objects.filter(id__in=chunk).update(
+                date_created=now - timedelta(days=rng.randint(0, 90), seconds=rng.randint(0, 86400))
+            )
+
+    def measure(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+        best = min(timings) * 1000
+        self.stdout.write(f"{label:<28} {len(queries.captured_queries):3d} queries  {best:9.1f} ms (best of {repeat})")
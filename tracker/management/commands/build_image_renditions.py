@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracker.uploads import build_missing_renditions
+
+
+class Command(BaseCommand):
+    help = "Build thumbnails and WebP renditions for payment proofs and parcel images that have none yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Threads to build in (default UPLOAD_RENDITION_WORKERS)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        images = build_missing_renditions(options['workers'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Processed {images} images in {elapsed:.2f}s"))
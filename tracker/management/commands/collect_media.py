@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracker.blobs import collect_blobs, hash_stored_files, rebuild_blob_refs
+from tracker.page_cache import invalidate_result_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount references to the content-addressed media files and delete the ones nothing uses, "
+        "optionally moving files uploaded before content addressing into it first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hash-existing', action='store_true',
+                            help='Store files saved under their upload names by content hash, merging duplicates')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['hash_existing']:
+            rows, files = hash_stored_files()
+            invalidate_result_page()  # Cached pages link to the old names
+            self.stdout.write(
+                f"Moved {rows} image fields to content-addressed storage and removed {files} old files"
+            )
+        in_use = rebuild_blob_refs()
+        deleted, freed = collect_blobs()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{in_use} files in use; deleted {deleted} unused files ({freed / 1024:.0f} KB) in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracker.events import compact_events
+
+
+class Command(BaseCommand):
+    help = "Collapse old location-only tracking events and expire history past the retention period"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        compacted, expired = compact_events()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {compacted} compacted and {expired} expired tracking events in {elapsed:.2f}s"
+        ))
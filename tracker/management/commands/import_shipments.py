@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.imports import FORMATS, detect_format, import_shipments, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import shipments from a CSV or JSON Lines file, validated like the shipment form"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--batch-size', type=int, help="Rows per INSERT transaction (default: IMPORT_BATCH_SIZE)")
+        parser.add_argument('--max-errors', type=int, default=50, help="Row errors to print (default: 50)")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError("Can't tell the format from the file name; pass --format")
+        try:
+            with open(options['path'], 'rb') as source:
+                result = import_shipments(read_rows(source, file_format), options['batch_size'])
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for line, message in result.errors[:options['max_errors']]:
+            self.stderr.write(f"line {line}: {message}")
+        if len(result.errors) > options['max_errors']:
+            self.stderr.write(f"... and {len(result.errors) - options['max_errors']} more")
+        style = self.style.SUCCESS if not result.errors else self.style.WARNING
+        self.stdout.write(style(str(result)))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracker.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailyShipmentStats rollup table from all shipments"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        days = rebuild_daily_stats()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} daily rows in {elapsed:.2f}s"))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tracker.search import create_search_triggers
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the shipment full-text index from the shipments table and merge it into one segment, "
+        "restoring the triggers that keep it up to date if a migration dropped them"
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The full-text index only exists on SQLite")
+        start = time.perf_counter()
+        restored = create_search_triggers()
+        if restored:
+            self.stdout.write(f"Restored missing triggers: {', '.join(restored)}")
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO tracker_shipment_search(tracker_shipment_search) VALUES ('rebuild')")
+            cursor.execute("INSERT INTO tracker_shipment_search(tracker_shipment_search) VALUES ('optimize')")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index in {elapsed:.2f}s"))
@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from functools import cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Upper bounds (ms) of the latency histogram buckets; slower requests land in '+Inf'
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Timings of the request being handled on this thread/task, None outside requests
+_current = ContextVar('tracker_request_timings', default=None)
+
+
+class RequestTimings:
+    """SQL and PDF time spent by one request"""
+
+    __slots__ = ('queries', 'sql_time', 'pdf_builds', 'pdf_time')
+
+    def __init__(self):
+        self.queries = self.pdf_builds = 0
+        self.sql_time = self.pdf_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper counting every query and its time"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class ViewStats:
+    """Running totals for one URL name; only touched with the registry lock held"""
+
+    def __init__(self):
+        self.requests = self.errors = self.queries = self.pdf_builds = 0
+        self.total_time = self.max_time = self.sql_time = self.pdf_time = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, elapsed, timings, status_code):
+        self.requests += 1
+        self.errors += status_code >= 500
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed * 1000)] += 1
+        self.queries += timings.queries
+        self.sql_time += timings.sql_time
+        self.pdf_builds += timings.pdf_builds
+        self.pdf_time += timings.pdf_time
+
+    def _percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of requests"""
+        target, seen = fraction * self.requests, 0
+        for bound, count in zip(LATENCY_BUCKETS + (None,), self.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def as_dict(self):
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_ms': {
+                'mean': round(self.total_time * 1000 / requests, 2),
+                'max': round(self.max_time * 1000, 2),
+                'p50_le': self._percentile(0.5),
+                'p95_le': self._percentile(0.95),
+                'buckets': {
+                    f'le_{bound}': count for bound, count in zip(LATENCY_BUCKETS, self.buckets)
+                } | {'+Inf': self.buckets[-1]},
+            },
+            'sql': {
+                'queries': self.queries,
+                'queries_per_request': round(self.queries / requests, 2),
+                'time_ms': round(self.sql_time * 1000, 2),
+                'time_ms_per_request': round(self.sql_time * 1000 / requests, 2),
+            },
+            'pdf': {
+                'builds': self.pdf_builds,
+                'time_ms': round(self.pdf_time * 1000, 2),
+            },
+        }
+
+
+class ViewMetrics:
+    """Per-URL-name request statistics for this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.started = time.time()
+
+    def record(self, url_name, elapsed, timings, status_code):
+        with self.lock:
+            stats = self.views.get(url_name)
+            if stats is None:
+                stats = self.views[url_name] = ViewStats()
+            stats.add(elapsed, timings, status_code)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'since': self.started,
+                'views': {name: stats.as_dict() for name, stats in sorted(self.views.items())},
+            }
+
+
+view_metrics = ViewMetrics()
+
+
+@cache
+def tracker_url_names():
+    from . import urls
+    return frozenset(pattern.name for pattern in urls.urlpatterns if pattern.name)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    """Count every connection's queries towards the request they run for.
+
+    Connections belong to threads, and an async view's queries run on a
+    worker thread through sync_to_async, so rather than wrapping the
+    request's connection the wrapper sits on all of them and finds the
+    request's timings in a context variable, which sync_to_async carries over.
+    """
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+def record_pdf_build(elapsed):
+    """Add a PDF render to the current request's timings (ignored outside requests)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.pdf_builds += 1
+        timings.pdf_time += elapsed
+
+
+def server_timing(elapsed, timings):
+    """Server-Timing header value, shown in the browser's network panel"""
+    parts = [
+        f'app;dur={elapsed * 1000:.1f}',
+        f'db;dur={timings.sql_time * 1000:.1f};desc="{timings.queries} queries"',
+    ]
+    if timings.pdf_builds:
+        parts.append(f'pdf;dur={timings.pdf_time * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class ViewMetricsMiddleware:
+    """Record latency, SQL queries/time and PDF build time of every tracker view.
+
+    The cost is a perf_counter pair per query and one locked dict update per
+    request. Requests outside tracker.urls (Django admin, static, 404s) only
+    get the Server-Timing header. Numbers are per process, like the cache
+    counters; see /dashboard/metrics/. It runs natively in both modes so
+    async views under ASGI aren't pushed onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'TRACKER_METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'TRACKER_METRICS_ENABLED', True):
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timings)
+
+    def finish(self, request, response, elapsed, timings):
+        match = request.resolver_match
+        if match is not None and match.url_name in tracker_url_names():
+            view_metrics.record(match.url_name, elapsed, timings, response.status_code)
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = server_timing(elapsed, timings)
+        return response
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:33
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    """Fill the rollup table from the shipments already stored.
+
+    A frozen copy of what tracker.rollups.rebuild_daily_stats did at the
+    time, on the historical models: the live code may come to need fields
+    these tables don't have yet.
+    """
+    Shipment = apps.get_model('tracker', 'Shipment')
+    DailyShipmentStats = apps.get_model('tracker', 'DailyShipmentStats')
+    aggregates = {
+        'shipments': Count('id'),
+        'paid_revenue': Sum('total_cost', filter=Q(payment_status='paid')),
+    }
+    # One column per status and payment status, e.g. status_on_way -> status='on_way'
+    for field in DailyShipmentStats._meta.fields:
+        for prefix, lookup in (('status_', 'status'), ('payment_', 'payment_status')):
+            if field.name.startswith(prefix):
+                aggregates[field.name] = Count('id', filter=Q(**{lookup: field.name[len(prefix):]}))
+
+    rows = (
+        Shipment.objects
+        .annotate(day=TruncDate('date_created', tzinfo=timezone.get_current_timezone()))
+        .values('day')
+        .annotate(**aggregates)
+        .order_by('day')
+    )
+    DailyShipmentStats.objects.bulk_create(
+        [
+            DailyShipmentStats(date=row.pop('day'), **{
+                key: value if value is not None else 0 for key, value in row.items()
+            })
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_sitesettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyShipmentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('shipments', models.PositiveIntegerField(default=0)),
+                ('status_pending', models.PositiveIntegerField(default=0)),
+                ('status_picked', models.PositiveIntegerField(default=0)),
+                ('status_on_hold', models.PositiveIntegerField(default=0)),
+                ('status_on_way', models.PositiveIntegerField(default=0)),
+                ('status_custom_hold', models.PositiveIntegerField(default=0)),
+                ('status_delivered', models.PositiveIntegerField(default=0)),
+                ('payment_not_required', models.PositiveIntegerField(default=0)),
+                ('payment_awaiting_payment', models.PositiveIntegerField(default=0)),
+                ('payment_paid', models.PositiveIntegerField(default=0)),
+                ('paid_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Daily Shipment Stats',
+                'verbose_name_plural': 'Daily Shipment Stats',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
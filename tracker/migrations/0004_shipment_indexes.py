@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_dailyshipmentstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentproof',
+            index=models.Index(condition=models.Q(('is_verified', False)), fields=['date_uploaded'], name='proof_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentproof',
+            index=models.Index(condition=models.Q(('is_verified', True)), fields=['date_uploaded'], name='proof_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['date_created', 'id'], name='shipment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['last_updated'], name='shipment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status', 'date_created'], name='shipment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['payment_status', 'date_created'], name='shipment_payment_created_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:39
+
+import django.db.models.deletion
+import tracker.models
+from django.db import migrations, models
+
+# Columns indexed, in bm25 weight order
+COLUMNS = [
+    ('tracking_number', 10.0),
+    ('sender_name', 4.0),
+    ('receiver_name', 4.0),
+    ('sender_email', 2.0),
+    ('receiver_email', 2.0),
+    ('sender_phone', 2.0),
+    ('receiver_phone', 2.0),
+    ('origin', 1.0),
+    ('destination', 1.0),
+    ('current_location', 1.0),
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; elsewhere tracker.search falls back to LIKE
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    names = ', '.join(name for name, _ in COLUMNS)
+    new = ', '.join(f'new.{name}' for name, _ in COLUMNS)
+    old = ', '.join(f'old.{name}' for name, _ in COLUMNS)
+    weights = ', '.join(str(weight) for _, weight in COLUMNS)
+    statements = [
+        # External content: the index reads documents from tracker_shipment instead of
+        # storing them. '-' is part of a token so tracking numbers like TRK-0042 index
+        # as one term, prefixes up to 6 characters are looked up rather than merged, and
+        # detail=column drops token positions, which search never uses.
+        f"""CREATE VIRTUAL TABLE tracker_shipment_search USING fts5(
+            {names}, content='tracker_shipment', content_rowid='id',
+            tokenize="unicode61 remove_diacritics 2 tokenchars '-'", prefix='2 3 4 5 6', detail=column
+        )""",
+        f"""CREATE TRIGGER tracker_shipment_search_insert AFTER INSERT ON tracker_shipment BEGIN
+            INSERT INTO tracker_shipment_search(rowid, {names}) VALUES (new.id, {new});
+        END""",
+        f"""CREATE TRIGGER tracker_shipment_search_delete AFTER DELETE ON tracker_shipment BEGIN
+            INSERT INTO tracker_shipment_search(tracker_shipment_search, rowid, {names}) VALUES ('delete', old.id, {old});
+        END""",
+        f"""CREATE TRIGGER tracker_shipment_search_update AFTER UPDATE OF {names} ON tracker_shipment BEGIN
+            INSERT INTO tracker_shipment_search(tracker_shipment_search, rowid, {names}) VALUES ('delete', old.id, {old});
+            INSERT INTO tracker_shipment_search(rowid, {names}) VALUES (new.id, {new});
+        END""",
+        f"INSERT INTO tracker_shipment_search(tracker_shipment_search, rank) VALUES ('rank', 'bm25({weights})')",
+        "INSERT INTO tracker_shipment_search(tracker_shipment_search) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS tracker_shipment_search_{trigger}')
+    schema_editor.execute('DROP TABLE IF EXISTS tracker_shipment_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_shipment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShipmentSearch',
+            fields=[
+                ('shipment', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='tracker.shipment')),
+                ('document', tracker.models.SearchDocumentField(db_column='tracker_shipment_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'tracker_shipment_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
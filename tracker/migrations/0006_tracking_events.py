@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_events(apps, schema_editor):
+    """One event per existing shipment with its current status and location, so no history starts empty"""
+    Shipment = apps.get_model('tracker', 'Shipment')
+    TrackingEvent = apps.get_model('tracker', 'TrackingEvent')
+    rows = Shipment.objects.values_list('pk', 'last_updated', 'status', 'current_location', 'remarks')
+    batch = []
+    for pk, last_updated, status, location, remarks in rows.iterator(chunk_size=5000):
+        batch.append(TrackingEvent(shipment_id=pk, timestamp=last_updated, status=status, location=location,
+                                   remarks=remarks or ''))
+        if len(batch) == 5000:
+            TrackingEvent.objects.bulk_create(batch)
+            batch = []
+    TrackingEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_shipment_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('picked', 'Picked by Courier'), ('on_hold', 'On Hold'), ('on_way', 'On the Way'), ('custom_hold', 'Custom Hold'), ('delivered', 'Delivered')], max_length=50)),
+                ('location', models.CharField(max_length=150)),
+                ('remarks', models.TextField(blank=True, default='')),
+                ('shipment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='tracker.shipment')),
+            ],
+            options={
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['shipment', 'timestamp'], name='event_shipment_time_idx'), models.Index(fields=['timestamp'], name='event_time_idx')],
+            },
+        ),
+        migrations.RunPython(seed_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_tracking_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentproof',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentproof',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentproof',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='payment_proofs/thumbs/'),
+        ),
+        migrations.AddField(
+            model_name='paymentproof',
+            name='webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='payment_proofs/webp/'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='parcel_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='parcel_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='parcel_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='parcel_images/thumbs/'),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='parcel_webp',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='parcel_images/webp/'),
+        ),
+    ]
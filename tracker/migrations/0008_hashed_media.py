@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:14
+
+import tracker.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_upload_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refs', models.IntegerField(default=0)),
+            ],
+        ),
+        # Storage lives only in Python; altering the columns would make SQLite rebuild the
+        # tables and drop the search index triggers
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='paymentproof',
+                name='image',
+                field=models.ImageField(storage=tracker.storage.HashedStorage(), upload_to='payment_proofs/'),
+            ),
+            migrations.AlterField(
+                model_name='paymentproof',
+                name='thumbnail',
+                field=models.ImageField(blank=True, editable=False, storage=tracker.storage.HashedStorage(), upload_to='payment_proofs/thumbs/'),
+            ),
+            migrations.AlterField(
+                model_name='paymentproof',
+                name='webp',
+                field=models.ImageField(blank=True, editable=False, storage=tracker.storage.HashedStorage(), upload_to='payment_proofs/webp/'),
+            ),
+            migrations.AlterField(
+                model_name='pdfstamp',
+                name='signature_image',
+                field=models.ImageField(storage=tracker.storage.HashedStorage(), upload_to='pdf_signatures/'),
+            ),
+            migrations.AlterField(
+                model_name='pdfstamp',
+                name='stamp_image',
+                field=models.ImageField(storage=tracker.storage.HashedStorage(), upload_to='pdf_stamps/'),
+            ),
+            migrations.AlterField(
+                model_name='shipment',
+                name='parcel_image',
+                field=models.ImageField(blank=True, null=True, storage=tracker.storage.HashedStorage(), upload_to='parcel_images/'),
+            ),
+            migrations.AlterField(
+                model_name='shipment',
+                name='parcel_thumbnail',
+                field=models.ImageField(blank=True, editable=False, null=True, storage=tracker.storage.HashedStorage(), upload_to='parcel_images/thumbs/'),
+            ),
+            migrations.AlterField(
+                model_name='shipment',
+                name='parcel_webp',
+                field=models.ImageField(blank=True, editable=False, null=True, storage=tracker.storage.HashedStorage(), upload_to='parcel_images/webp/'),
+            ),
+            migrations.AlterField(
+                model_name='sitesettings',
+                name='company_logo',
+                field=models.ImageField(blank=True, null=True, storage=tracker.storage.HashedStorage(), upload_to='site_logos/'),
+            ),
+        ]),
+    ]
@@ -1,4 +1,13 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
 from django.db import models
+from django.utils import timezone
+
+from .storage import media_storage
 
 class Shipment(models.Model):
     STATUS_CHOICES = [
@@ -46,7 +55,13 @@ class Shipment(models.Model):
     # Parcel Information
     parcel_description = models.TextField(blank=True, null=True)
     parcel_weight = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    parcel_image = models.ImageField(upload_to='parcel_images/', blank=True, null=True)
+    parcel_image = models.ImageField(upload_to='parcel_images/', blank=True, null=True, storage=media_storage)
+    # Written by uploads.build_renditions once the image is stored; empty until then. Nullable
+    # so adding them doesn't make SQLite rebuild the table (and drop the search triggers)
+    parcel_thumbnail = models.ImageField(upload_to='parcel_images/thumbs/', blank=True, null=True, editable=False, storage=media_storage)
+    parcel_webp = models.ImageField(upload_to='parcel_images/webp/', blank=True, null=True, editable=False, storage=media_storage)
+    parcel_image_width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    parcel_image_height = models.PositiveIntegerField(blank=True, null=True, editable=False)
     
     # Payment fields
     require_payment = models.BooleanField(default=False)
@@ -63,6 +78,17 @@ class Shipment(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     estimated_delivery = models.DateField(blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            # Staff list order and keyset cursor, also the recent shipments widget
+            models.Index(fields=['date_created', 'id'], name='shipment_created_idx'),
+            # recent_activity on the stats page
+            models.Index(fields=['last_updated'], name='shipment_updated_idx'),
+            # Staff list filters, already in list order
+            models.Index(fields=['status', 'date_created'], name='shipment_status_created_idx'),
+            models.Index(fields=['payment_status', 'date_created'], name='shipment_payment_created_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         self.total_cost = self.shipment_cost + self.clearance_cost
         super().save(*args, **kwargs)
@@ -73,18 +99,38 @@ class Shipment(models.Model):
 
 class PaymentProof(models.Model):
     shipment = models.OneToOneField(Shipment, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='payment_proofs/')
+    image = models.ImageField(upload_to='payment_proofs/', storage=media_storage)
+    # Written by uploads.build_renditions once the image is stored; empty until then
+    thumbnail = models.ImageField(upload_to='payment_proofs/thumbs/', blank=True, editable=False, storage=media_storage)
+    webp = models.ImageField(upload_to='payment_proofs/webp/', blank=True, editable=False, storage=media_storage)
+    image_width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    image_height = models.PositiveIntegerField(blank=True, null=True, editable=False)
     date_uploaded = models.DateTimeField(auto_now_add=True)
     is_verified = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Pending and verified proofs are always listed separately, newest first.
+            # The conditions match Django's boolean SQL (a bare column, which a
+            # composite index can't serve); backends without partial indexes skip them.
+            models.Index(
+                fields=['date_uploaded'], name='proof_pending_idx',
+                condition=models.Q(is_verified=False),
+            ),
+            models.Index(
+                fields=['date_uploaded'], name='proof_verified_idx',
+                condition=models.Q(is_verified=True),
+            ),
+        ]
+    
     def __str__(self):
         return f"Proof for {self.shipment.tracking_number}"
 
 
 class PDFStamp(models.Model):
     name = models.CharField(max_length=100)
-    stamp_image = models.ImageField(upload_to='pdf_stamps/')
-    signature_image = models.ImageField(upload_to='pdf_signatures/')
+    stamp_image = models.ImageField(upload_to='pdf_stamps/', storage=media_storage)
+    signature_image = models.ImageField(upload_to='pdf_signatures/', storage=media_storage)
     is_active = models.BooleanField(default=True)
     
     def __str__(self):
@@ -110,7 +156,7 @@ class SiteSettings(models.Model):
     pdf_footer_text = models.TextField(default="Generated by GlobalTrack Pro - Professional Shipping Solutions")
     
     # Logo
-    company_logo = models.ImageField(upload_to='site_logos/', blank=True, null=True)
+    company_logo = models.ImageField(upload_to='site_logos/', blank=True, null=True, storage=media_storage)
     
     # Timestamp
     updated_at = models.DateTimeField(auto_now=True)
@@ -124,12 +170,143 @@ class SiteSettings(models.Model):
         self.__class__.objects.exclude(id=self.id).delete()
         super().save(*args, **kwargs)
     
+    # Process-local memo of (version, loaded_at, instance), see load()
+    _cached = None
+    _cache_lock = threading.Lock()
+    CACHE_VERSION_KEY = 'tracker:site_settings:version'
+    
+    @classmethod
+    def _shared_cache(cls):
+        alias = getattr(settings, 'SITE_SETTINGS_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+    
     @classmethod
     def load(cls):
-        try:
-            return cls.objects.get()
-        except cls.DoesNotExist:
-            return cls.objects.create()
+        """Return the site settings, memoized per process and invalidated on save/delete.
+        
+        Nothing is written on this read path: before an admin first saves the
+        settings an unsaved instance carrying the defaults is returned.
+        """
+        shared = cls._shared_cache()
+        version = shared.get(cls.CACHE_VERSION_KEY) if shared else None
+        timeout = getattr(settings, 'SITE_SETTINGS_CACHE_TIMEOUT', 300)
+        
+        cached = cls._cached
+        if cached is not None:
+            cached_version, loaded_at, instance = cached
+            if cached_version == version and time.monotonic() - loaded_at < timeout:
+                return instance
+        
+        with cls._cache_lock:
+            instance = cls.objects.order_by('-updated_at').first()
+            if instance is None:
+                instance = cls()
+            cls._cached = (version, time.monotonic(), instance)
+        return instance
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """Drop this process's copy and bump the shared version so other processes reload"""
+        cls._cached = None
+        shared = cls._shared_cache()
+        if shared:
+            shared.set(cls.CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+    
+    def __str__(self):
+        return "Site Configuration"
+
+class DailyShipmentStats(models.Model):
+    """Per-day rollup of shipments by creation date, kept current by tracker.rollups"""
+    date = models.DateField(unique=True)
+    shipments = models.PositiveIntegerField(default=0)
+    
+    # Shipments created that day, by their current status
+    status_pending = models.PositiveIntegerField(default=0)
+    status_picked = models.PositiveIntegerField(default=0)
+    status_on_hold = models.PositiveIntegerField(default=0)
+    status_on_way = models.PositiveIntegerField(default=0)
+    status_custom_hold = models.PositiveIntegerField(default=0)
+    status_delivered = models.PositiveIntegerField(default=0)
+    
+    # ... and by their current payment status
+    payment_not_required = models.PositiveIntegerField(default=0)
+    payment_awaiting_payment = models.PositiveIntegerField(default=0)
+    payment_paid = models.PositiveIntegerField(default=0)
+    
+    paid_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = "Daily Shipment Stats"
+        verbose_name_plural = "Daily Shipment Stats"
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"Stats for {self.date}"
+
+
+class TrackingEvent(models.Model):
+    """One status or location change of a shipment, written by tracker.events and never edited"""
+    # The (shipment, timestamp) index below covers lookups by shipment
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='events', db_index=False)
+    timestamp = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=50, choices=Shipment.STATUS_CHOICES)
+    location = models.CharField(max_length=150)
+    remarks = models.TextField(blank=True, default='')
+    
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            # A shipment's history, newest first (read backwards)
+            models.Index(fields=['shipment', 'timestamp'], name='event_shipment_time_idx'),
+            # Retention and compaction sweeps
+            models.Index(fields=['timestamp'], name='event_time_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Tracking events are append-only")
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.shipment_id} {self.status} at {self.location}"
+
+
+class MediaBlob(models.Model):
+    """How many image fields refer to one content-addressed file, kept by tracker.blobs"""
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.IntegerField(default=0)
     
     def __str__(self):
-        return "Site Configuration"
\ No newline at end of file
+        return f"{self.name} ({self.refs} refs)"
+
+
+class SearchDocumentField(models.TextField):
+    """The FTS5 table's hidden column named after the table, the left side of MATCH"""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class ShipmentSearch(models.Model):
+    """Read-only mapping of the SQLite FTS5 index over shipments, see tracker.search.
+    
+    The table is created and kept in sync by triggers in migration 0005, so it
+    also follows bulk_create() and queryset update()s. It only exists on SQLite.
+    """
+    shipment = models.OneToOneField(
+        Shipment, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+    document = SearchDocumentField(db_column='tracker_shipment_search')
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'tracker_shipment_search'
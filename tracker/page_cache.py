@@ -0,0 +1,157 @@
+import hashlib
+import threading
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .live import serves_live_stream
+from .models import SiteSettings
+from .tracking import tracking_version
+
+# Bump when result.html or its tags change so previously cached pages are not served
+RESULT_PAGE_VERSION = 5
+
+
+class CacheMetrics:
+    """Hit/miss counters for this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = self.misses = self.stale = self.invalidations = 0
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'invalidations': self.invalidations,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+result_page_metrics = CacheMetrics()
+
+
+def get_result_cache():
+    """The cache holding rendered result pages, or None if RESULT_CACHE_ALIAS is unset"""
+    alias = getattr(settings, 'RESULT_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _page_key(tracking_number):
+    return 'tracker:result:' + hashlib.sha1(tracking_number.encode()).hexdigest()
+
+
+def _page_version(request, tracking_number):
+    """Version stamp of everything the page shows, or None for an unknown tracking number.
+
+    The shipment/proof part is the ETag tracking_condition() already looked up
+    for this request, and SiteSettings.load() is memoized, so a hit costs no
+    extra query. Checking it on every hit keeps pages fresh even when the
+    save happened in another process whose signals never reached this cache.
+    Pages that open a live stream are kept apart from ones that poll.
+    """
+    etag = tracking_version(request, tracking_number)[0]
+    if etag is None:
+        return None
+    site_settings = SiteSettings.load()
+    updated_at = site_settings.updated_at.isoformat() if site_settings.updated_at else ''
+    live = 'stream' if serves_live_stream(request) else 'poll'
+    return f'{RESULT_PAGE_VERSION}:{etag}:{site_settings.pk}:{updated_at}:{live}'
+
+
+def _lookup(request, tracking_number):
+    """(cache, key, version, response or None) for a cacheable request, else None"""
+    cache = get_result_cache()
+    if cache is None or not tracking_number or request.method not in ('GET', 'HEAD'):
+        return None
+    version = _page_version(request, tracking_number)
+    if version is None:
+        return None
+
+    key = _page_key(tracking_number)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        result_page_metrics.count('hits')
+        response = HttpResponse(cached[1], content_type=cached[2])
+        response['X-Cache'] = 'HIT'
+        return cache, key, version, response
+
+    result_page_metrics.count('misses')
+    if cached is not None:
+        result_page_metrics.count('stale')
+    return cache, key, version, None
+
+
+def _store(cache, key, version, response):
+    if response.status_code == 200 and not response.streaming:
+        cache.set(key, (version, response.content, response['Content-Type']))
+    response['X-Cache'] = 'MISS'
+
+
+def cache_result_page(get_tracking_number):
+    """Serve a tracking view's successful responses from the result page cache.
+
+    Entries are stored per tracking number with the version they were
+    rendered at; save signals on Shipment, PaymentProof and SiteSettings drop
+    them early (see invalidate_result_page). For async views the lookup and
+    the store each take one trip to a worker thread.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                lookup = await sync_to_async(_lookup)(request, get_tracking_number(request, *args, **kwargs))
+                if lookup is None:
+                    return await view(request, *args, **kwargs)
+                cache, key, version, response = lookup
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    await sync_to_async(_store)(cache, key, version, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            lookup = _lookup(request, get_tracking_number(request, *args, **kwargs))
+            if lookup is None:
+                return view(request, *args, **kwargs)
+            cache, key, version, response = lookup
+            if response is None:
+                response = view(request, *args, **kwargs)
+                _store(cache, key, version, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate_result_page(tracking_number=None):
+    """Drop one tracking number's cached page, or every page when None"""
+    cache = get_result_cache()
+    if cache is None:
+        return
+    if tracking_number is None:
+        cache.clear()
+    else:
+        cache.delete(_page_key(tracking_number))
+    result_page_metrics.count('invalidations')
+
+
+def invalidate_result_pages(tracking_numbers):
+    """invalidate_result_page for many tracking numbers with one cache call"""
+    cache = get_result_cache()
+    if cache is None or not tracking_numbers:
+        return
+    cache.delete_many([_page_key(tracking_number) for tracking_number in tracking_numbers])
+    result_page_metrics.count('invalidations')
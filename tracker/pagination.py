@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(shipment):
+    """Opaque query string value pointing at one row of the (date_created, id) ordering"""
+    micros = (shipment.date_created - EPOCH) // timedelta(microseconds=1)
+    return f'{micros}-{shipment.pk}'
+
+
+def decode_cursor(value):
+    """Return (date_created, id) for a cursor, or None if it is malformed"""
+    try:
+        micros, pk = value.split('-', 1)
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+class KeysetPage(Page):
+    """A page fetched by seeking past a cursor instead of an OFFSET.
+
+    number is carried along in the links so start_index/end_index and the
+    page links still make sense; has_next/has_previous come from the rows.
+    Nothing here counts the queryset: paginator.count stays unevaluated
+    unless something reads it, which the shipment list template doesn't.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, number, paginator, has_next, has_previous):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    def start_index(self):
+        # Page.start_index() would count the whole queryset to spot an empty one
+        return self.paginator.per_page * (self.number - 1) + 1 if len(self) else 0
+
+    def end_index(self):
+        return self.start_index() + len(self) - 1 if len(self) else 0
+
+
+def get_per_page(request):
+    per_page = request.GET.get('per_page', '')
+    choices = settings.ADMIN_PAGE_SIZES
+    return int(per_page) if per_page.isdigit() and int(per_page) in choices else choices[0]
+
+
+def paginate_newest_first(request, queryset, per_page):
+    """Page a queryset newest first on (date_created, id).
+
+    Next/previous links carry an ``after``/``before`` cursor so every step is
+    an index seek, however deep. A bare ``page`` number falls back to OFFSET,
+    which the template only links to for the first few pages; only those
+    pages count the rows (for the page range and the total shown).
+    """
+    queryset = queryset.order_by('-date_created', '-id')
+    paginator = Paginator(queryset, per_page)
+    number = request.GET.get('page', '')
+    number = max(int(number), 1) if number.isdigit() else 1
+
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before'))
+    if after:
+        date_created, pk = after
+        rows = list(queryset.filter(
+            Q(date_created__lt=date_created) | Q(date_created=date_created, id__lt=pk)
+        )[:per_page + 1])
+        page = KeysetPage(rows[:per_page], number, paginator,
+                          has_next=len(rows) > per_page, has_previous=True)
+    elif before:
+        date_created, pk = before
+        rows = list(queryset.order_by('date_created', 'id').filter(
+            Q(date_created__gt=date_created) | Q(date_created=date_created, id__gt=pk)
+        )[:per_page + 1])
+        has_previous = len(rows) > per_page
+        page = KeysetPage(rows[:per_page][::-1], number if has_previous else 1, paginator,
+                          has_next=True, has_previous=has_previous)
+    else:
+        page = paginator.page(min(number, paginator.num_pages))
+
+    page.next_cursor = encode_cursor(page[-1]) if len(page) and page.has_next() else None
+    page.previous_cursor = encode_cursor(page[0]) if len(page) and page.has_previous() else None
+    page.offset_pages = _offset_pages(page)
+    return page
+
+
+def paginate_by_offset(request, queryset, per_page):
+    """Plain numbered pages in the queryset's own order, e.g. ranked search results"""
+    page = Paginator(queryset, per_page).get_page(request.GET.get('page'))
+    page.next_cursor = page.previous_cursor = None
+    page.offset_pages = _offset_pages(page)
+    return page
+
+
+def _offset_pages(page):
+    """Numbered links shown around the current page"""
+    if isinstance(page, KeysetPage):
+        # Without a count only the pages up to the next one are known to exist
+        last = page.number + 1 if page.has_next() else page.number
+        numbers = range(max(page.number - 2, 1), last + 1)
+    else:
+        numbers = page.paginator.page_range
+    return [
+        num for num in numbers
+        if num <= settings.ADMIN_OFFSET_PAGE_LIMIT and abs(num - page.number) < 3
+    ]
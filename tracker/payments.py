@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .blobs import BLOB_FIELDS, release
+from .counters import invalidate_counters
+from .models import PaymentProof, Shipment
+from .page_cache import invalidate_result_pages
+from .rollups import ROLLUP_FIELDS, apply_rollups
+
+PAYMENT_STATUS_INDEX = ROLLUP_FIELDS.index('payment_status')
+
+
+def verify_proofs(proofs):
+    """Verify a PaymentProof queryset and mark its shipments paid.
+
+    One SELECT reads what the rollups need, then one UPDATE flags the proofs
+    and one marks the shipments that weren't paid yet (with last_updated,
+    which queryset updates don't touch). Returns the selected proofs'
+    tracking numbers, empty if none matched.
+    """
+    with transaction.atomic():
+        rows = list(proofs.values_list(
+            'pk', 'shipment_id', 'shipment__tracking_number', *(f'shipment__{field}' for field in ROLLUP_FIELDS)
+        ))
+        if not rows:
+            return []
+        PaymentProof.objects.filter(pk__in=[row[0] for row in rows], is_verified=False).update(is_verified=True)
+
+        unpaid = {row[1]: row[3:] for row in rows if row[3 + PAYMENT_STATUS_INDEX] != 'paid'}
+        if unpaid:
+            Shipment.objects.filter(pk__in=unpaid).update(payment_status='paid', last_updated=timezone.now())
+            apply_rollups(unpaid.values(), -1)
+            apply_rollups((state[:PAYMENT_STATUS_INDEX] + ('paid',) + state[PAYMENT_STATUS_INDEX + 1:]
+                           for state in unpaid.values()), 1)
+
+    tracking_numbers = [row[2] for row in rows]
+    invalidate_counters('pending_payments_count')
+    invalidate_result_pages(tracking_numbers)
+    return tracking_numbers
+
+
+class RejectedProofs(QuerySet):
+    """Proofs being deleted by reject_proofs.
+
+    Its delete() still sends pre_delete/post_delete for every proof, with this
+    queryset as origin; the PaymentProof receivers skip those rows because
+    reject_proofs does their work once for the whole batch.
+    """
+
+
+def reject_proofs(proofs):
+    """Delete a PaymentProof queryset so customers can upload again; returns their tracking numbers.
+
+    One SELECT reads each proof's tracking number and image names. After the
+    delete, the image references are released, the pending counter dropped
+    and each result page invalidated once for all of them, rather than by the
+    per-row receivers. Images no other row uses are deleted with the proofs.
+    """
+    with transaction.atomic():
+        rows = list(proofs.values_list('pk', 'shipment__tracking_number', *BLOB_FIELDS[PaymentProof]))
+        if not rows:
+            return []
+        RejectedProofs(PaymentProof).filter(pk__in=[row[0] for row in rows]).delete()
+        release(name for row in rows for name in row[2:])
+
+    tracking_numbers = [row[1] for row in rows]
+    invalidate_counters('pending_payments_count')
+    invalidate_result_pages(tracking_numbers)
+    return tracking_numbers
@@ -0,0 +1,268 @@
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from .images import pdf_image
+from .report import build_report
+
+
+def _build_styles():
+    """Paragraph styles used by the tracking report, keyed by role"""
+    styles = getSampleStyleSheet()
+    
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=1,  # Center aligned
+            textColor=colors.HexColor('#1E40AF')
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=12,
+            spaceAfter=12,
+            textColor=colors.HexColor('#1E40AF')
+        ),
+        'normal': ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6
+        ),
+        'bold': ParagraphStyle(
+            'CustomBold',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6,
+            fontName='Helvetica-Bold'
+        ),
+        'header': ParagraphStyle(
+            'Header',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=colors.HexColor('#2563EB'),
+            alignment=1,
+            spaceAfter=10
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.gray,
+            alignment=1
+        ),
+        'company_info': ParagraphStyle(
+            'CompanyInfo',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=colors.black,
+            alignment=1,
+            spaceAfter=3
+        ),
+    }
+
+
+def _build_table_styles():
+    """Table styles used by the tracking report, keyed by table"""
+    grid = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E5E7EB')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ]
+    
+    return {
+        'tracking': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E5E7EB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]),
+        'contacts': TableStyle([
+            ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#1E40AF')),
+            ('TEXTCOLOR', (0, 0), (1, 0), colors.white),
+            ('ALIGN', (0, 0), (1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (1, 0), 11),
+            ('BACKGROUND', (0, 1), (1, -1), colors.white),
+            ('FONTNAME', (0, 1), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (1, -1), 9),
+            ('GRID', (0, 0), (1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (1, -1), 'TOP'),
+        ]),
+        'details': TableStyle(grid),
+        'payment': TableStyle(grid + [
+            ('FONTNAME', (2, 2), (2, 2), 'Helvetica-Bold'),  # Make Total Amount bold
+        ]),
+        'stamp': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 2), (-1, 2), 10),
+            ('VALIGN', (0, 1), (-1, 1), 'MIDDLE'),
+        ]),
+    }
+
+
+# None of these depend on the shipment, so build them once per process
+STYLES = _build_styles()
+TABLE_STYLES = _build_table_styles()
+
+TRACKING_COL_WIDTHS = [2*inch, 2.5*inch, 1.5*inch, 2*inch]
+CONTACT_COL_WIDTHS = [3.5*inch, 3.5*inch]
+DETAIL_COL_WIDTHS = [1.5*inch, 2.5*inch, 1.5*inch, 2*inch]
+PAYMENT_COL_WIDTHS = [1.5*inch, 2*inch, 1.5*inch, 2.5*inch]
+STAMP_COL_WIDTHS = [3*inch, 3*inch]
+
+
+def _grid(rows):
+    """Flatten (label, value) pair rows into four-column table data"""
+    data = []
+    for row in rows:
+        cells = [cell for pair in row for cell in pair]
+        data.append(cells + [''] * (4 - len(cells)))
+    return data
+
+
+def build_story(report):
+    """Build the list of flowables making up the tracking report for one shipment"""
+    story = []
+    
+    # Add Company Logo and Header - NOW USING DYNAMIC SETTINGS
+    try:
+        if report['logo']:
+            logo = pdf_image(report['logo']['path'], 'logo')
+            story.append(logo)
+            story.append(Spacer(1, 10))
+    except:
+        pass
+    
+    # Use dynamic company name instead of hardcoded "GLOBALTRACK PRO"
+    story.append(Paragraph(report['company_name'].upper(), STYLES['header']))
+    story.append(Paragraph(report['tagline'], STYLES['normal']))
+    story.append(Spacer(1, 20))
+    
+    # Title - USING DYNAMIC PDF HEADER TITLE
+    story.append(Paragraph(report['title'], STYLES['title']))
+    story.append(Spacer(1, 20))
+    
+    tracking_table = Table(_grid(report['tracking_rows']), colWidths=TRACKING_COL_WIDTHS)
+    tracking_table.setStyle(TABLE_STYLES['tracking'])
+    story.append(tracking_table)
+    story.append(Spacer(1, 20))
+    
+    # Sender and Receiver Information
+    story.append(Paragraph("SENDER & RECEIVER INFORMATION", STYLES['heading']))
+    
+    contact_data = [['SENDER INFORMATION', 'RECEIVER INFORMATION']]
+    for label, sender_value, receiver_value in report['contacts']:
+        contact_data.append([f"{label}: {sender_value}", f"{label}: {receiver_value}"])
+    
+    contact_table = Table(contact_data, colWidths=CONTACT_COL_WIDTHS)
+    contact_table.setStyle(TABLE_STYLES['contacts'])
+    story.append(contact_table)
+    story.append(Spacer(1, 20))
+    
+    # Shipment Details
+    story.append(Paragraph("SHIPMENT DETAILS", STYLES['heading']))
+    shipment_table = Table(_grid(report['detail_rows']), colWidths=DETAIL_COL_WIDTHS)
+    shipment_table.setStyle(TABLE_STYLES['details'])
+    story.append(shipment_table)
+    story.append(Spacer(1, 15))
+    
+    # Payment Information (if required and shown)
+    if report['payment_rows']:
+        story.append(Paragraph("PAYMENT INFORMATION", STYLES['heading']))
+        payment_table = Table(_grid(report['payment_rows']), colWidths=PAYMENT_COL_WIDTHS)
+        payment_table.setStyle(TABLE_STYLES['payment'])
+        story.append(payment_table)
+        story.append(Spacer(1, 15))
+    
+    if report['remarks']:
+        story.append(Paragraph("REMARKS", STYLES['heading']))
+        story.append(Paragraph(report['remarks'], STYLES['normal']))
+        story.append(Spacer(1, 20))
+    
+    # Add parcel image if exists
+    if report['parcel_image']:
+        story.append(Paragraph("PARCEL IMAGE", STYLES['heading']))
+        try:
+            parcel_img = pdf_image(report['parcel_image']['path'], 'parcel')
+            story.append(parcel_img)
+            story.append(Spacer(1, 15))
+        except:
+            pass
+    
+    # Add stamps and signatures
+    stamp = report['stamp']
+    if stamp:
+        story.append(Spacer(1, 30))
+    
+        stamp_elements = []
+    
+        # Add stamp image if exists
+        if stamp['stamp_image']:
+            try:
+                stamp_img = pdf_image(stamp['stamp_image']['path'], 'stamp')
+                stamp_elements.append(stamp_img)
+            except:
+                stamp_elements.append(Paragraph("OFFICIAL STAMP", STYLES['bold']))
+        else:
+            stamp_elements.append(Paragraph("OFFICIAL STAMP", STYLES['bold']))
+    
+        # Add signature image if exists
+        if stamp['signature_image']:
+            try:
+                signature_img = pdf_image(stamp['signature_image']['path'], 'signature')
+                stamp_elements.append(signature_img)
+            except:
+                stamp_elements.append(Paragraph("AUTHORIZED SIGNATURE", STYLES['bold']))
+        else:
+            stamp_elements.append(Paragraph("AUTHORIZED SIGNATURE", STYLES['bold']))
+    
+        # Create a table for stamps and signatures
+        stamp_data = [
+            ['', ''],
+            stamp_elements,
+            ['Official Stamp', 'Authorized Signature']
+        ]
+    
+        stamp_table = Table(stamp_data, colWidths=STAMP_COL_WIDTHS)
+        stamp_table.setStyle(TABLE_STYLES['stamp'])
+        story.append(stamp_table)
+    
+    # Footer with DYNAMIC company information
+    footer = report['footer']
+    story.append(Spacer(1, 30))
+    story.append(Paragraph(footer['company_name'], STYLES['company_info']))
+    story.append(Paragraph(footer['contact'], STYLES['footer']))
+    story.append(Paragraph(footer['website_url'], STYLES['footer']))
+    story.append(Spacer(1, 10))
+    story.append(Paragraph(footer['text'], STYLES['footer']))
+    story.append(Paragraph("Thank you for using our services!", STYLES['footer']))
+    
+    return story
+
+
+def render_report_pdf(report):
+    """Render report data from tracker.report.build_report and return the PDF bytes"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
+    doc.build(build_story(report))
+    return buffer.getvalue()
+
+
+def render_tracking_pdf(shipment, site_settings, active_stamp=None):
+    """Build the tracking report for a shipment and return the PDF bytes"""
+    return render_report_pdf(build_report(shipment, site_settings, active_stamp))
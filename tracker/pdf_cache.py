@@ -0,0 +1,245 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import record_pdf_build
+from .pdf import render_tracking_pdf
+from .storage import blob_digest
+
+# Bump when the report layout changes so previously cached PDFs are not served
+RENDERER_VERSION = 2
+
+
+def _file_fingerprint(field_file):
+    """Identify an uploaded file by its content hash, or by name, size and modification time"""
+    if not field_file:
+        return ''
+    if blob_digest(field_file.name):
+        return field_file.name  # Content-addressed: the name changes whenever the content does
+    try:
+        stat = os.stat(field_file.path)
+    except (OSError, ValueError, NotImplementedError):
+        return f'{field_file.name}:missing'
+    return f'{field_file.name}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def pdf_cache_key(shipment, site_settings, active_stamp=None):
+    """Content address of the PDF for a shipment, settings and stamp combination"""
+    parts = [
+        RENDERER_VERSION,
+        shipment.pk,
+        shipment.tracking_number,
+        shipment.last_updated.isoformat(),
+        _file_fingerprint(shipment.parcel_image),
+        site_settings.pk,
+        site_settings.updated_at.isoformat() if site_settings.updated_at else '',
+        _file_fingerprint(site_settings.company_logo),
+    ]
+    if active_stamp:
+        parts += [
+            active_stamp.pk,
+            active_stamp.name,
+            _file_fingerprint(active_stamp.stamp_image),
+            _file_fingerprint(active_stamp.signature_image),
+        ]
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class PDFCache:
+    """Two-level LRU cache of rendered PDF bytes, bounded by size in memory and on disk"""
+    
+    def __init__(self, directory=None, max_memory_bytes=0, max_disk_bytes=0):
+        self.directory = str(directory) if directory else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.pdf')
+    
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        
+        if not self.directory or not self.max_disk_bytes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for disk eviction
+        except OSError:
+            return None
+        self._remember(key, data)
+        return data
+    
+    def contains(self, key):
+        """Check for an entry without reading it or changing its recency"""
+        with self._lock:
+            if key in self._memory:
+                return True
+        if not self.directory or not self.max_disk_bytes:
+            return False
+        return os.path.exists(self._path(key))
+    
+    def set(self, key, data):
+        self._remember(key, data)
+        if self.directory and self.max_disk_bytes and len(data) <= self.max_disk_bytes:
+            self._write(key, data)
+    
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for path, _, _ in self._disk_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._disk_bytes = 0
+    
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+    
+    def _write(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+    
+    def _disk_entries(self):
+        """Yield (path, size, mtime) for every cached PDF on disk"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+    
+    def _evict_disk(self):
+        """Remove least recently used files until the disk usage is back under 90% of the limit"""
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
+
+
+_pdf_cache = None
+_pdf_cache_lock = threading.Lock()
+_render_executor = None
+
+
+def get_pdf_cache():
+    """Return the process-wide PDF cache configured from settings"""
+    global _pdf_cache
+    if _pdf_cache is None:
+        with _pdf_cache_lock:
+            if _pdf_cache is None:
+                _pdf_cache = PDFCache(
+                    directory=getattr(settings, 'PDF_CACHE_DIR', None),
+                    max_memory_bytes=getattr(settings, 'PDF_CACHE_MAX_MEMORY', 32 * 1024 * 1024),
+                    max_disk_bytes=getattr(settings, 'PDF_CACHE_MAX_DISK', 256 * 1024 * 1024),
+                )
+    return _pdf_cache
+
+
+def reset_pdf_cache():
+    """Drop the process-wide cache so it is rebuilt from the current settings"""
+    global _pdf_cache
+    with _pdf_cache_lock:
+        _pdf_cache = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _render_executor
+    if setting.startswith('PDF_CACHE_'):
+        reset_pdf_cache()
+    elif setting == 'PDF_RENDER_THREADS' and _render_executor is not None:
+        _render_executor.shutdown(wait=False)
+        _render_executor = None
+
+
+def get_tracking_pdf(shipment, site_settings, active_stamp=None):
+    """Return the tracking PDF for a shipment, rendering it only on a cache miss"""
+    cache = get_pdf_cache()
+    key = pdf_cache_key(shipment, site_settings, active_stamp)
+    pdf = cache.get(key)
+    if pdf is None:
+        started = time.perf_counter()
+        pdf = render_tracking_pdf(shipment, site_settings, active_stamp)
+        record_pdf_build(time.perf_counter() - started)
+        cache.set(key, pdf)
+    return pdf
+
+
+def get_render_executor():
+    """Threads async views render PDFs in; PDF_RENDER_THREADS bounds how many render at once"""
+    global _render_executor
+    if _render_executor is None:
+        with _pdf_cache_lock:
+            if _render_executor is None:
+                _render_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PDF_RENDER_THREADS', 4), thread_name_prefix='pdf-render',
+                )
+    return _render_executor
+
+
+async def aget_tracking_pdf(shipment, site_settings, active_stamp=None):
+    """get_tracking_pdf for async views, run in the render pool so the event loop keeps serving.
+
+    Rendering touches no database, so it doesn't need the request's
+    thread-sensitive worker; a burst of downloads queues for the pool
+    instead of starting a thread each.
+    """
+    return await sync_to_async(get_tracking_pdf, thread_sensitive=False, executor=get_render_executor())(
+        shipment, site_settings, active_stamp,
+    )
@@ -0,0 +1,229 @@
+import multiprocessing
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from pypdf import PdfWriter
+
+from .models import PDFStamp, SiteSettings
+from .pdf import render_report_pdf
+from .pdf_cache import get_pdf_cache, pdf_cache_key
+from .report import build_report
+
+class PDFBatch:
+    """Resources shared by every report in a batch: site settings and the active stamp.
+    
+    Logo, stamp and signature images are decoded once per process by
+    tracker.images; export pool workers outlive each export, so they keep theirs.
+    """
+    
+    def __init__(self, site_settings=None, active_stamp=None):
+        self.site_settings = site_settings or SiteSettings.load()
+        if active_stamp is None:
+            active_stamp = PDFStamp.objects.filter(is_active=True).first()
+        self.active_stamp = active_stamp
+    
+    def report(self, shipment):
+        return build_report(shipment, self.site_settings, self.active_stamp)
+    
+    def cache_key(self, shipment):
+        return pdf_cache_key(shipment, self.site_settings, self.active_stamp)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_export_pool():
+    """Process pool rendering reports for exports, or None to render in the calling process.
+
+    The pool is started once per process and reused by every export. Its
+    workers are spawned rather than forked: forking a threaded server copies
+    whatever locks other threads hold, and the database connections with them.
+    Each worker sets Django up once and only ever receives plain report data.
+    """
+    global _pool
+    workers = getattr(settings, 'PDF_EXPORT_WORKERS', 4)
+    if workers <= 1:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+                )
+    return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died so the next export starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_export_pool():
+    """Stop the export pool's worker processes; the next export starts a new pool"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting == 'PDF_EXPORT_WORKERS':
+        shutdown_export_pool()
+
+
+def iter_shipment_pdfs(shipments, batch=None):
+    """Yield (shipment, pdf_bytes) in order, serving cached PDFs and rendering the rest in a pool.
+    
+    At most a few jobs per worker are in flight, so memory stays flat no matter
+    how many shipments the queryset holds.
+    """
+    batch = batch or PDFBatch()
+    cache = get_pdf_cache()
+    pool = get_export_pool()
+    window = max(getattr(settings, 'PDF_EXPORT_WORKERS', 4), 1) * 4
+    pending = deque()
+    
+    def drain(limit):
+        while len(pending) > limit:
+            shipment, key, result = pending.popleft()
+            if key is not None:
+                pdf = result.result() if pool else render_report_pdf(result)
+                cache.set(key, pdf)
+                result = pdf
+            yield shipment, result
+    
+    try:
+        for shipment in shipments.iterator() if hasattr(shipments, 'iterator') else shipments:
+            key = batch.cache_key(shipment)
+            pdf = cache.get(key)
+            if pdf is not None:
+                pending.append((shipment, None, pdf))
+                yield from drain(window)
+                continue
+            
+            report = batch.report(shipment)
+            if pool:
+                pending.append((shipment, key, pool.submit(render_report_pdf, report)))
+            else:
+                pending.append((shipment, key, report))
+            yield from drain(window)
+        yield from drain(0)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # The pool is shared; only drop this export's jobs, e.g. when the download was aborted
+        if pool:
+            for _, key, result in pending:
+                if key is not None:
+                    result.cancel()
+
+
+class _ZipStream:
+    """Write-only file object collecting what zipfile writes so it can be streamed out"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_pdf_zip(shipments, batch=None):
+    """Yield a ZIP archive of per-shipment PDFs chunk by chunk"""
+    stream = _ZipStream()
+    # PDFs are already compressed; storing them avoids burning CPU for nothing
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for shipment, pdf in iter_shipment_pdfs(shipments, batch):
+            archive.writestr(f'tracking_{shipment.tracking_number}.pdf', pdf)
+            yield stream.pop()
+    yield stream.pop()
+
+
+def merge_limit_exceeded(shipments):
+    """Whether there are more shipments than one merged PDF may hold (PDF_EXPORT_MERGE_LIMIT)"""
+    limit = getattr(settings, 'PDF_EXPORT_MERGE_LIMIT', 200)
+    if hasattr(shipments, 'count'):
+        return shipments[:limit + 1].count() > limit
+    return len(shipments) > limit
+
+
+def render_merged_pdf(shipments, batch=None):
+    """Render every shipment as consecutive pages of one PDF spooled to a temporary file.
+    
+    Reports come from iter_shipment_pdfs, like the ZIP export, so they are
+    served from the PDF cache or rendered in the export pool. Each one is
+    spooled to its own temporary file as it arrives, and the merge reads them
+    from there. Nothing is sent before the merge is done, and the merged
+    document's page tree is held in memory while it is written, so callers
+    cap the shipments per export with merge_limit_exceeded(); the ZIP export
+    streams member by member and has no cap. Images repeated across reports
+    (logo, stamp, signature) are written to the output once.
+    """
+    spooled = []
+    try:
+        for shipment, pdf in iter_shipment_pdfs(shipments, batch):
+            spool = tempfile.TemporaryFile()
+            spool.write(pdf)
+            spooled.append(spool)
+        
+        writer = PdfWriter()
+        for spool in spooled:
+            spool.seek(0)
+            writer.append(spool)
+        writer.compress_identical_objects()
+        output = tempfile.TemporaryFile()
+        writer.write(output)
+    finally:
+        for spool in spooled:
+            spool.close()
+    output.seek(0)
+    return output
+
+
+def export_response(shipments, export_format='zip'):
+    """Download of tracking reports for a queryset of shipments: a streamed ZIP or one merged PDF.
+    
+    Raises ValueError for a merged PDF of more than PDF_EXPORT_MERGE_LIMIT shipments.
+    """
+    stamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    if export_format == 'pdf':
+        if merge_limit_exceeded(shipments):
+            limit = getattr(settings, 'PDF_EXPORT_MERGE_LIMIT', 200)
+            raise ValueError(f'A single PDF holds at most {limit} shipments; export a ZIP or narrow the filter.')
+        return FileResponse(
+            render_merged_pdf(shipments),
+            as_attachment=True,
+            filename=f'tracking_reports_{stamp}.pdf',
+            content_type='application/pdf',
+        )
+    
+    response = StreamingHttpResponse(stream_pdf_zip(shipments), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="tracking_reports_{stamp}.zip"'
+    return response
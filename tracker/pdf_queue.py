@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Shipment, PDFStamp, SiteSettings
+from .pdf_cache import get_tracking_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def build_tracking_pdf(tracking_number):
+    """Render the PDF for a tracking number into the PDF cache outside the request cycle"""
+    shipment = Shipment.objects.get(tracking_number=tracking_number)
+    site_settings = SiteSettings.load()
+    active_stamp = PDFStamp.objects.filter(is_active=True).first()
+    get_tracking_pdf(shipment, site_settings, active_stamp)
+
+
+def _run_in_worker(tracking_number):
+    try:
+        build_tracking_pdf(tracking_number)
+    finally:
+        # Worker threads get their own connection; don't leave it open between jobs
+        connection.close()
+
+
+class LocalPDFQueue:
+    """In-process PDF build queue backed by a thread pool, needing no external broker.
+    
+    Jobs are forgotten once they finish; only their outcome is remembered, for
+    result_ttl seconds (PDF_QUEUE_RESULT_TTL), so status pollers can tell a
+    finished build from one that was never queued. With max_workers=0 jobs run
+    synchronously in the caller, which is handy for development and tests.
+    """
+    
+    def __init__(self, max_workers=2, result_ttl=None):
+        self.max_workers = max_workers
+        self.result_ttl = getattr(settings, 'PDF_QUEUE_RESULT_TTL', 60) if result_ttl is None else result_ttl
+        self._executor = None
+        if max_workers:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-build')
+        self._jobs = {}  # Tracking number -> Future still queued or running
+        self._finished = OrderedDict()  # Tracking number -> (status, when it finished), oldest first
+        self._lock = threading.Lock()
+    
+    def enqueue(self, tracking_number):
+        """Schedule a build unless one is already waiting or running for this tracking number"""
+        with self._lock:
+            job = self._jobs.get(tracking_number)
+            if job is not None:
+                return job
+            self._finished.pop(tracking_number, None)
+            if self._executor is not None:
+                job = self._executor.submit(_run_in_worker, tracking_number)
+            else:
+                job = Future()
+            self._jobs[tracking_number] = job
+        # Outside the lock: a job that already finished runs the callback right here
+        job.add_done_callback(lambda job: self._finish(tracking_number, job))
+        
+        if self._executor is None:
+            try:
+                build_tracking_pdf(tracking_number)
+            except Exception as exc:
+                job.set_exception(exc)
+            else:
+                job.set_result(None)
+        return job
+    
+    def _finish(self, tracking_number, job):
+        exc = job.exception()
+        if exc is not None:
+            # The status only says 'failed'; the traceback goes to the log
+            logger.error('Background PDF build for %s failed', tracking_number, exc_info=exc)
+        with self._lock:
+            if self._jobs.get(tracking_number) is job:
+                del self._jobs[tracking_number]
+            self._finished[tracking_number] = ('failed' if exc is not None else 'done', time.monotonic())
+            self._finished.move_to_end(tracking_number)
+            self._expire()
+    
+    def _expire(self):
+        cutoff = time.monotonic() - self.result_ttl
+        while self._finished and next(iter(self._finished.values()))[1] <= cutoff:
+            self._finished.popitem(last=False)
+    
+    def status(self, tracking_number):
+        """Return 'queued', 'running', 'done', 'failed' or None when nothing was enqueued lately"""
+        with self._lock:
+            job = self._jobs.get(tracking_number)
+            if job is None:
+                self._expire()
+                finished = self._finished.get(tracking_number)
+                return finished[0] if finished else None
+        if not job.done():
+            return 'running' if job.running() else 'queued'
+        return 'failed' if job.exception() is not None else 'done'
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+_pdf_queue = None
+_pdf_queue_lock = threading.Lock()
+
+
+def get_pdf_queue():
+    """Return the process-wide PDF queue for the configured backend"""
+    global _pdf_queue
+    if _pdf_queue is None:
+        with _pdf_queue_lock:
+            if _pdf_queue is None:
+                backend = import_string(getattr(settings, 'PDF_QUEUE_BACKEND', 'tracker.pdf_queue.LocalPDFQueue'))
+                _pdf_queue = backend(max_workers=getattr(settings, 'PDF_QUEUE_WORKERS', 2))
+    return _pdf_queue
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _pdf_queue
+    if setting.startswith('PDF_QUEUE_'):
+        with _pdf_queue_lock:
+            if _pdf_queue is not None:
+                _pdf_queue.shutdown()
+            _pdf_queue = None
@@ -0,0 +1,79 @@
+def _image(field_file):
+    """Path for ReportLab and URL for the browser of an uploaded image, if any"""
+    if not field_file:
+        return None
+    try:
+        path = field_file.path
+    except (NotImplementedError, ValueError):
+        path = None
+    return {'path': path, 'url': field_file.url, 'name': field_file.name}
+
+
+def build_report(shipment, site_settings, active_stamp=None):
+    """Collect everything the tracking report shows as plain, picklable data.
+    
+    Both the PDF renderer in tracker.pdf and the print preview template lay out
+    this structure, so the two cannot drift apart. Table rows are lists of
+    (label, value) pairs; a row with a single pair spans the full width.
+    """
+    tracking_rows = [
+        [('Tracking Number:', shipment.tracking_number), ('Status:', shipment.get_status_display())],
+        [('Date Created:', shipment.date_created.strftime('%Y-%m-%d %H:%M')), ('Last Updated:', shipment.last_updated.strftime('%Y-%m-%d %H:%M'))],
+    ]
+    if shipment.estimated_delivery:
+        tracking_rows.append([('Estimated Delivery:', shipment.estimated_delivery.strftime('%Y-%m-%d'))])
+    
+    contacts = [
+        ('Name', shipment.sender_name, shipment.receiver_name),
+        ('Address', shipment.sender_address, shipment.receiver_address),
+        ('Email', shipment.sender_email, shipment.receiver_email),
+        ('Phone', shipment.sender_phone, shipment.receiver_phone),
+    ]
+    
+    detail_rows = [
+        [('Origin:', shipment.origin), ('Destination:', shipment.destination)],
+        [('Current Location:', shipment.current_location), ('Parcel Weight:', f"{shipment.parcel_weight} kg")],
+    ]
+    if shipment.parcel_description:
+        detail_rows.append([('Description:', shipment.parcel_description)])
+    
+    payment_rows = None
+    if shipment.require_payment and shipment.show_payment_info:
+        payment_rows = [
+            [('Payment Method:', shipment.get_payment_method_display().upper()), ('Payment Status:', shipment.get_payment_status_display())],
+            [('Shipment Cost:', f"${shipment.shipment_cost}"), ('Clearance Cost:', f"${shipment.clearance_cost}")],
+            [('Total Amount:', f"${shipment.total_cost}"), ('Wallet Address:', shipment.crypto_wallet or '')],
+        ]
+    
+    remarks = None
+    if shipment.remarks:
+        # Clean the remarks text by removing any HTML tags
+        remarks = shipment.remarks.replace('<b>', '').replace('</b>', '')
+    
+    stamp = None
+    if active_stamp:
+        stamp = {
+            'stamp_image': _image(active_stamp.stamp_image),
+            'signature_image': _image(active_stamp.signature_image),
+        }
+    
+    return {
+        'tracking_number': shipment.tracking_number,
+        'company_name': site_settings.company_name,
+        'tagline': "Professional Shipping & Logistics",
+        'title': site_settings.pdf_header_title,
+        'logo': _image(site_settings.company_logo),
+        'tracking_rows': tracking_rows,
+        'contacts': contacts,
+        'detail_rows': detail_rows,
+        'payment_rows': payment_rows,
+        'remarks': remarks,
+        'parcel_image': _image(shipment.parcel_image),
+        'stamp': stamp,
+        'footer': {
+            'company_name': site_settings.company_name,
+            'contact': f"Email: {site_settings.contact_email} | Phone: {site_settings.contact_phone}",
+            'website_url': site_settings.website_url,
+            'text': site_settings.pdf_footer_text,
+        },
+    }
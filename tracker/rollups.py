@@ -0,0 +1,113 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyShipmentStats, Shipment
+
+# Shipment fields whose values decide what a shipment contributes to its day
+ROLLUP_FIELDS = ('date_created', 'status', 'payment_status', 'total_cost')
+
+
+def rollup_state(shipment, saved_state=None):
+    """Raw values of the rollup fields, or None if any of them was deferred.
+    
+    Deferred fields aren't written by save(), so once the row is saved they can
+    be taken from the state the row had before (saved_state).
+    """
+    if shipment.pk is None:
+        return None
+    values = shipment.__dict__
+    if saved_state is not None:
+        return tuple(values.get(field, old) for field, old in zip(ROLLUP_FIELDS, saved_state))
+    if any(field not in values for field in ROLLUP_FIELDS):
+        return None
+    return tuple(values[field] for field in ROLLUP_FIELDS)
+
+
+def _contribution(state):
+    """The day one shipment counts towards and what it adds to each column there"""
+    date_created, status, payment_status, total_cost = state
+    counts = {'shipments': 1}
+    status_field = f'status_{status}'
+    if any(field.name == status_field for field in DailyShipmentStats._meta.fields):
+        counts[status_field] = 1
+    payment_field = f'payment_{payment_status}'
+    if any(field.name == payment_field for field in DailyShipmentStats._meta.fields):
+        counts[payment_field] = 1
+    if payment_status == 'paid' and total_cost:
+        counts['paid_revenue'] = Decimal(total_cost)
+    return timezone.localdate(date_created), counts
+
+
+def _add_to_day(day, counts, sign):
+    changes = {field: F(field) + value * sign for field, value in counts.items()}
+    if DailyShipmentStats.objects.filter(date=day).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyShipmentStats.objects.create(date=day)
+    except IntegrityError:
+        pass  # Created concurrently by another request
+    DailyShipmentStats.objects.filter(date=day).update(**changes)
+
+
+def apply_rollup(state, sign):
+    """Add (sign=1) or remove (sign=-1) one shipment's contribution to its day"""
+    if state is None or state[0] is None:
+        return
+    _add_to_day(*_contribution(state), sign)
+
+
+def apply_rollups(states, sign=1):
+    """apply_rollup for many shipments at once, with one UPDATE per day touched"""
+    days = defaultdict(Counter)
+    for state in states:
+        if state is not None and state[0] is not None:
+            day, counts = _contribution(state)
+            days[day].update(counts)
+    for day, counts in days.items():
+        _add_to_day(day, counts, sign)
+
+
+def move_rollup(old_state, new_state):
+    if old_state == new_state:
+        return
+    apply_rollup(old_state, -1)
+    apply_rollup(new_state, 1)
+
+
+def rebuild_daily_stats():
+    """Recompute every rollup row from the shipments table"""
+    aggregates = {
+        'shipments': Count('id'),
+        'paid_revenue': Sum('total_cost', filter=Q(payment_status='paid')),
+    }
+    for status, _ in Shipment.STATUS_CHOICES:
+        aggregates[f'status_{status}'] = Count('id', filter=Q(status=status))
+    for payment_status, _ in Shipment.PAYMENT_STATUS:
+        aggregates[f'payment_{payment_status}'] = Count('id', filter=Q(payment_status=payment_status))
+    
+    rows = (
+        Shipment.objects
+        .annotate(day=TruncDate('date_created', tzinfo=timezone.get_current_timezone()))
+        .values('day')
+        .annotate(**aggregates)
+        .order_by('day')
+    )
+    with transaction.atomic():
+        DailyShipmentStats.objects.all().delete()
+        DailyShipmentStats.objects.bulk_create(
+            [
+                DailyShipmentStats(date=row.pop('day'), **{
+                    key: value if value is not None else 0
+                    for key, value in row.items()
+                })
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+    return DailyShipmentStats.objects.count()
@@ -0,0 +1,170 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .events import event_for_change, event_state
+from .live import publish_on_commit
+from .models import Shipment, TrackingEvent
+from .page_cache import invalidate_result_pages
+from .rollups import ROLLUP_FIELDS, apply_rollups, rollup_state
+
+# Columns a scan may change; a missing or empty value leaves the column as it is
+SCAN_FIELDS = ('status', 'current_location', 'remarks')
+STATUSES = {choice for choice, _ in Shipment.STATUS_CHOICES}
+LOCATION_MAX_LENGTH = Shipment._meta.get_field('current_location').max_length
+
+# Keeps each UPDATE's id list under SQLite's bound parameter limit
+UPDATE_CHUNK_SIZE = 500
+
+# What a batch loads per shipment: the scan columns and what the rollups need
+LOADED_FIELDS = tuple(dict.fromkeys(('id', 'tracking_number') + SCAN_FIELDS + ROLLUP_FIELDS))
+
+
+class ScanResult:
+    """What a batch of scans did: shipments changed, scans that changed nothing, per-scan errors"""
+
+    def __init__(self):
+        self.scans = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []  # (line or position, message)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def scans_per_second(self):
+        return round(self.scans / self.elapsed) if self.elapsed else 0
+
+    def as_dict(self):
+        return {
+            'scans': self.scans,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+        }
+
+    def __str__(self):
+        return (
+            f'{self.updated} of {self.scans} scans applied, {self.unchanged} unchanged, '
+            f'{len(self.errors)} rejected in {self.elapsed:.1f}s ({self.scans_per_second} scans/s)'
+        )
+
+
+def clean_scan(scan):
+    """(tracking number, {column: new value}) for one scan, or ValueError saying what is wrong"""
+    tracking_number = str(scan.get('tracking_number') or '').strip()
+    if not tracking_number:
+        raise ValueError('tracking_number is required')
+    changes = {}
+    for field in SCAN_FIELDS:
+        value = scan.get(field)
+        if value is not None and str(value).strip():
+            changes[field] = str(value).strip()
+    if 'status' in changes and changes['status'] not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(sorted(STATUSES))}")
+    if len(changes.get('current_location', '')) > LOCATION_MAX_LENGTH:
+        raise ValueError(f'current_location is longer than {LOCATION_MAX_LENGTH} characters')
+    if not changes:
+        raise ValueError('nothing to update: give a status, current_location or remarks')
+    return tracking_number, changes
+
+
+def apply_scans(scans, batch_size=None):
+    """Apply (line, scan dict) pairs, e.g. from imports.read_rows(), in batches.
+
+    Each batch loads its shipments with one query and writes only the
+    columns that changed, with one UPDATE per distinct set of new values, so
+    untouched columns (and their search index entries) are left alone.
+    Status and location changes are added to the tracking history and pushed
+    to live tracking pages, and last_updated is set explicitly since queryset
+    updates skip auto_now, and the daily rollups and result pages are kept in
+    step because no save signals are sent. When a batch has several scans for
+    one parcel, the last one wins.
+    """
+    batch_size = batch_size or getattr(settings, 'SCAN_BATCH_SIZE', 1000)
+    result = ScanResult()
+    batch = []
+    for line, scan in scans:
+        result.scans += 1
+        if not isinstance(scan, dict):
+            result.add_error(line, scan if isinstance(scan, str) else 'Each scan must be an object')
+            continue
+        try:
+            tracking_number, changes = clean_scan(scan)
+        except ValueError as exc:
+            result.add_error(line, str(exc))
+            continue
+        batch.append((line, tracking_number, changes))
+        if len(batch) >= batch_size:
+            _apply_batch(batch, result)
+            batch = []
+    if batch:
+        _apply_batch(batch, result)
+    result.errors.sort()  # Unknown tracking numbers are found after the scans behind them were checked
+    result.elapsed = time.perf_counter() - result.started
+    return result
+
+
+def _apply_batch(batch, result):
+    with transaction.atomic():
+        shipments = {
+            shipment.tracking_number: shipment
+            for shipment in Shipment.objects.filter(
+                tracking_number__in={tracking_number for _, tracking_number, _ in batch}
+            ).only(*LOADED_FIELDS)
+        }
+        old_states = {}
+        old_event_states = {}
+        changed = defaultdict(set)
+        for line, tracking_number, changes in batch:
+            shipment = shipments.get(tracking_number)
+            if shipment is None:
+                result.add_error(line, f'No shipment with tracking number {tracking_number}')
+                continue
+            old_states.setdefault(tracking_number, rollup_state(shipment))
+            old_event_states.setdefault(tracking_number, event_state(shipment))
+            fields = {field for field, value in changes.items() if getattr(shipment, field) != value}
+            if not fields:
+                result.unchanged += 1
+                continue
+            for field in fields:
+                setattr(shipment, field, changes[field])
+            changed[tracking_number] |= fields
+            result.updated += 1
+
+        # A truck load scanned at one depot shares its new values, so group the
+        # rows by them: one UPDATE ... WHERE id IN (...) per group is far cheaper
+        # than bulk_update's CASE per row, and only the changed columns are written
+        groups = defaultdict(list)
+        for tracking_number, fields in changed.items():
+            shipment = shipments[tracking_number]
+            groups[tuple((field, getattr(shipment, field)) for field in sorted(fields))].append(shipment.pk)
+        now = timezone.now()
+        for values, pks in groups.items():
+            for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+                Shipment.objects.filter(pk__in=pks[start:start + UPDATE_CHUNK_SIZE]).update(
+                    **dict(values), last_updated=now)
+        events = {
+            tracking_number: event
+            for tracking_number in changed
+            if (event := event_for_change(shipments[tracking_number].pk, old_event_states[tracking_number],
+                                          event_state(shipments[tracking_number]), now)) is not None
+        }
+        TrackingEvent.objects.bulk_create(events.values())
+        publish_on_commit((shipments[tracking_number], event) for tracking_number, event in events.items())
+
+        moved = [
+            (old_states[tracking_number], rollup_state(shipments[tracking_number]))
+            for tracking_number, fields in changed.items() if 'status' in fields
+        ]
+        apply_rollups((old for old, new in moved if old != new), -1)
+        apply_rollups((new for old, new in moved if old != new), 1)
+
+    invalidate_result_pages(changed)
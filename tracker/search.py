@@ -0,0 +1,104 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When
+
+# Fields searched when the FTS5 index isn't available (same as the index columns)
+SEARCH_FIELDS = (
+    'tracking_number', 'sender_name', 'receiver_name', 'sender_email', 'receiver_email',
+    'sender_phone', 'receiver_phone', 'origin', 'destination', 'current_location',
+)
+
+# Keep tracker_shipment_search in step with tracker_shipment (created by migration 0005).
+# SQLite drops them whenever a migration rebuilds the shipments table, e.g. for an
+# AlterField; the tracker.E001 check reports that and rebuild_search_index restores them.
+_COLUMNS = ', '.join(SEARCH_FIELDS)
+_OLD_ROW = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+_NEW_ROW = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+SEARCH_TRIGGERS = {
+    'tracker_shipment_search_insert': f"""AFTER INSERT ON tracker_shipment BEGIN
+        INSERT INTO tracker_shipment_search(rowid, {_COLUMNS}) VALUES (new.id, {_NEW_ROW});
+    END""",
+    'tracker_shipment_search_delete': f"""AFTER DELETE ON tracker_shipment BEGIN
+        INSERT INTO tracker_shipment_search(tracker_shipment_search, rowid, {_COLUMNS}) VALUES ('delete', old.id, {_OLD_ROW});
+    END""",
+    'tracker_shipment_search_update': f"""AFTER UPDATE OF {_COLUMNS} ON tracker_shipment BEGIN
+        INSERT INTO tracker_shipment_search(tracker_shipment_search, rowid, {_COLUMNS}) VALUES ('delete', old.id, {_OLD_ROW});
+        INSERT INTO tracker_shipment_search(rowid, {_COLUMNS}) VALUES (new.id, {_NEW_ROW});
+    END""",
+}
+
+# Same split as the index tokenizer: '-' stays inside terms (tracking numbers)
+TERM_RE = re.compile(r'[\w-]+')
+
+
+def search_terms(query):
+    terms = (term.strip('-') for term in TERM_RE.findall(query or ''))
+    return [term for term in terms if term]
+
+
+def match_expression(terms):
+    """FTS5 query matching every term as a prefix, e.g. 'TRK-12 bob' -> '"TRK-12"* "bob"*'"""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def missing_search_triggers(using=connection):
+    """Names of the index triggers missing from a SQLite database that has the index"""
+    if using.vendor != 'sqlite':
+        return []
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name = 'tracker_shipment_search' "
+            "OR (type = 'trigger' AND tbl_name = 'tracker_shipment')"
+        )
+        found = cursor.fetchall()
+    if ('table', 'tracker_shipment_search') not in found:
+        return []  # Not migrated yet
+    return [name for name in SEARCH_TRIGGERS if ('trigger', name) not in found]
+
+
+def create_search_triggers(using=connection):
+    """Create the missing index triggers; returns their names. Rebuild the index afterwards."""
+    missing = missing_search_triggers(using)
+    with using.cursor() as cursor:
+        for name in missing:
+            cursor.execute(f'CREATE TRIGGER {name} {SEARCH_TRIGGERS[name]}')
+    return missing
+
+
+def search_shipments(queryset, query):
+    """Filter a Shipment queryset to those matching every word of query as a prefix, best match first.
+    
+    On SQLite this reads the tracker_shipment_search FTS5 index ranked by
+    bm25 (tracking numbers weigh most, then names, contacts and places).
+    bm25 scores every row it sorts, so a broad query only ranks the
+    SEARCH_RANK_WINDOW newest rows of the filtered queryset that match; the
+    older matches follow them, newest first. Other backends fall back to
+    AND-ed icontains filters, newest first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    
+    if connection.vendor == 'sqlite':
+        window = settings.SEARCH_RANK_WINDOW
+        queryset = queryset.filter(search_entry__document__match=match_expression(terms))
+        # Walking the newest matches backwards is cheap, unlike scoring all of them
+        cutoff = list(queryset.order_by('-id').values_list('id', flat=True)[window - 1:window])
+        if not cutoff:
+            return queryset.order_by('search_entry__rank', '-date_created', '-id')
+        # CASE only evaluates rank (bm25) for rows inside the window
+        in_window = Q(id__gte=cutoff[0])
+        return queryset.order_by(
+            Case(When(in_window, then=Value(0)), default=Value(1)),
+            Case(When(in_window, then=F('search_entry__rank'))),
+            '-date_created', '-id',
+        )
+    
+    for term in terms:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+    return queryset.order_by('-date_created', '-id')
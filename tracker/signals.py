@@ -0,0 +1,265 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .blobs import BLOB_FIELDS, add_refs, blob_names, release
+from .counters import invalidate_counters
+from .events import EVENT_FIELDS, event_for_change, event_state
+from .images import prepare_pdf_image
+from .live import publish_on_commit
+from .lookups import forget_unknown, get_known_numbers
+from .models import PaymentProof, Shipment, PDFStamp, SiteSettings
+from .page_cache import invalidate_result_page
+from .payments import RejectedProofs
+from .rollups import ROLLUP_FIELDS, apply_rollup, move_rollup, rollup_state
+from .uploads import RENDITION_FIELDS, schedule_renditions
+
+
+def _saved(field_name, update_fields):
+    return update_fields is None or field_name in update_fields
+
+
+@receiver(post_save, sender=Shipment)
+def prepare_parcel_image(sender, instance, update_fields=None, **kwargs):
+    if _saved('parcel_image', update_fields):
+        prepare_pdf_image(instance.parcel_image, 'parcel')
+
+
+@receiver(post_save, sender=PDFStamp)
+def prepare_stamp_images(sender, instance, update_fields=None, **kwargs):
+    if _saved('stamp_image', update_fields):
+        prepare_pdf_image(instance.stamp_image, 'stamp')
+    if _saved('signature_image', update_fields):
+        prepare_pdf_image(instance.signature_image, 'signature')
+
+
+@receiver(post_save, sender=SiteSettings)
+def prepare_company_logo(sender, instance, update_fields=None, **kwargs):
+    if _saved('company_logo', update_fields):
+        prepare_pdf_image(instance.company_logo, 'logo')
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def invalidate_site_settings(sender, **kwargs):
+    # Not before the commit: a request reloading in between would memoize the old row again
+    transaction.on_commit(SiteSettings.invalidate_cache)
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_delete, sender=Shipment)
+def invalidate_shipment_counters(sender, created=True, **kwargs):
+    # Edits don't change the total; only creation and deletion (no "created" flag) do
+    if created:
+        invalidate_counters('total_shipments')
+
+
+@receiver(post_save, sender=Shipment)
+def add_known_tracking_number(sender, instance, **kwargs):
+    get_known_numbers().add(instance.tracking_number)
+    forget_unknown(instance.tracking_number)
+
+
+@receiver(post_delete, sender=Shipment)
+def discard_known_tracking_number(sender, instance, **kwargs):
+    get_known_numbers().discard(instance.tracking_number)
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_delete, sender=Shipment)
+def invalidate_shipment_page(sender, instance, **kwargs):
+    invalidate_result_page(instance.tracking_number)
+
+
+@receiver(post_save, sender=PaymentProof)
+@receiver(post_delete, sender=PaymentProof)
+def invalidate_proof_page(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, RejectedProofs):
+        return  # reject_proofs invalidates the whole batch's pages
+    tracking_number = (
+        Shipment.objects.filter(pk=instance.shipment_id).values_list('tracking_number', flat=True).first()
+    )
+    if tracking_number:
+        invalidate_result_page(tracking_number)
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def invalidate_all_pages(sender, **kwargs):
+    invalidate_result_page()
+
+
+@receiver(post_save, sender=PaymentProof)
+@receiver(post_delete, sender=PaymentProof)
+def invalidate_payment_counters(sender, origin=None, **kwargs):
+    if not isinstance(origin, RejectedProofs):
+        invalidate_counters('pending_payments_count')
+
+
+@receiver(post_save, sender=PDFStamp)
+@receiver(post_delete, sender=PDFStamp)
+def invalidate_stamp_counters(sender, **kwargs):
+    invalidate_counters('active_stamps_count')
+
+
+@receiver(post_init, sender=Shipment)
+def remember_rollup_state(sender, instance, **kwargs):
+    instance._rollup_state = rollup_state(instance)
+
+
+@receiver(pre_save, sender=Shipment)
+def load_rollup_state(sender, instance, update_fields=None, **kwargs):
+    # Instances loaded with deferred fields don't know what they contributed yet
+    if instance._state.adding or instance._rollup_state is not None:
+        return
+    if update_fields is not None and not set(update_fields) & set(ROLLUP_FIELDS):
+        return
+    instance._rollup_state = (
+        Shipment.objects.filter(pk=instance.pk).values_list(*ROLLUP_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Shipment)
+def update_daily_stats(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(ROLLUP_FIELDS):
+        return
+    old_state = None if created else instance._rollup_state
+    new_state = rollup_state(instance, old_state)
+    move_rollup(old_state, new_state)
+    instance._rollup_state = new_state
+
+
+@receiver(post_delete, sender=Shipment)
+def remove_from_daily_stats(sender, instance, **kwargs):
+    apply_rollup(instance._rollup_state or rollup_state(instance), -1)
+
+
+@receiver(post_init, sender=Shipment)
+def remember_event_state(sender, instance, **kwargs):
+    instance._event_state = event_state(instance)
+
+
+@receiver(pre_save, sender=Shipment)
+def load_event_state(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or instance._event_state is not None:
+        return
+    if update_fields is not None and not set(update_fields) & set(EVENT_FIELDS[:2]):
+        return
+    instance._event_state = (
+        Shipment.objects.filter(pk=instance.pk).values_list(*EVENT_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Shipment)
+def record_tracking_event(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(EVENT_FIELDS[:2]):
+        return
+    old_state = None if created else instance._event_state
+    new_state = event_state(instance, old_state)
+    if created or old_state is not None:
+        # auto_now only ran if last_updated was among the saved fields
+        timestamp = instance.last_updated if _saved('last_updated', update_fields) else timezone.now()
+        event = event_for_change(instance.pk, old_state, new_state, timestamp)
+        if event is not None:
+            event.save()
+            publish_on_commit([(instance, event)])
+    instance._event_state = new_state
+
+
+def _image_name(instance):
+    """Stored name of the instance's upload ('' if none), or None if the field was deferred"""
+    field = RENDITION_FIELDS[type(instance)][0]
+    if field not in instance.__dict__:
+        return None
+    value = instance.__dict__[field]
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Shipment)
+@receiver(post_init, sender=PaymentProof)
+def remember_image_name(sender, instance, **kwargs):
+    instance._image_name = _image_name(instance)
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_save, sender=PaymentProof)
+def build_image_renditions(sender, instance, created, update_fields=None, **kwargs):
+    """Replace a new or changed image's thumbnail and WebP rendition once the save commits"""
+    image_field, thumbnail_field, webp_field, width_field, height_field = RENDITION_FIELDS[sender]
+    name = _image_name(instance)
+    if name is None or not _saved(image_field, update_fields):
+        return
+    old_name, instance._image_name = instance._image_name, name
+    if name == old_name and not created:
+        return
+    if not created:
+        # The old renditions are stale from now on; pages fall back to the original until the new ones exist
+        stale = {thumbnail_field: '', webp_field: '', width_field: None, height_field: None}
+        row = sender.objects.filter(pk=instance.pk)
+        # From the row, not the instance: the renditions may have been written since it was loaded
+        release(row.values_list(thumbnail_field, webp_field).first() or ())
+        row.update(**stale)
+        for field, value in stale.items():
+            setattr(instance, field, value)
+        instance._blob_names.update({thumbnail_field: '', webp_field: ''})
+    if name:
+        transaction.on_commit(partial(schedule_renditions, sender, instance.pk))
+
+
+@receiver(post_init, sender=Shipment)
+@receiver(post_init, sender=PaymentProof)
+@receiver(post_init, sender=PDFStamp)
+@receiver(post_init, sender=SiteSettings)
+def remember_blob_names(sender, instance, **kwargs):
+    instance._blob_names = blob_names(instance)
+
+
+@receiver(pre_save, sender=Shipment)
+@receiver(pre_save, sender=PaymentProof)
+@receiver(pre_save, sender=PDFStamp)
+@receiver(pre_save, sender=SiteSettings)
+def load_blob_names(sender, instance, update_fields=None, **kwargs):
+    # Fields loaded deferred and assigned since: find out what they referred to before
+    if instance._state.adding:
+        return
+    missing = [
+        field for field in BLOB_FIELDS[sender]
+        if field not in instance._blob_names and field in instance.__dict__ and _saved(field, update_fields)
+    ]
+    if missing:
+        row = sender.objects.filter(pk=instance.pk).values_list(*missing).first()
+        if row is not None:
+            instance._blob_names.update((field, name or '') for field, name in zip(missing, row))
+
+
+@receiver(post_save, sender=Shipment)
+@receiver(post_save, sender=PaymentProof)
+@receiver(post_save, sender=PDFStamp)
+@receiver(post_save, sender=SiteSettings)
+def count_blob_refs(sender, instance, created, update_fields=None, **kwargs):
+    """Move the row's file references from the names it had to the ones it was saved with"""
+    old_names = {} if created else instance._blob_names
+    changed = {
+        field: name for field, name in blob_names(instance).items()
+        if _saved(field, update_fields) and name != old_names.get(field, '')
+    }
+    if changed:
+        add_refs(changed.values())
+        release(old_names.get(field, '') for field in changed)
+        instance._blob_names = {**instance._blob_names, **changed}
+
+
+@receiver(pre_delete, sender=Shipment)
+@receiver(pre_delete, sender=PaymentProof)
+@receiver(pre_delete, sender=PDFStamp)
+@receiver(pre_delete, sender=SiteSettings)
+def release_blobs(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, RejectedProofs):
+        return  # reject_proofs releases the whole batch's files
+    # Read from the row: renditions may have been written since the instance was loaded
+    names = sender.objects.filter(pk=instance.pk).values_list(*BLOB_FIELDS[sender]).first()
+    if names is not None:
+        release(names)
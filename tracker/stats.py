@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import DailyShipmentStats, PaymentProof, Shipment
+
+STATS_CACHE_KEY = 'tracker:shipment_stats'
+
+
+def compute_shipment_stats():
+    """Figures for the admin dashboard and statistics pages in two aggregate queries.
+    
+    Shipment figures are summed from the DailyShipmentStats rollup, so the cost
+    grows with the number of days rather than the number of shipments.
+    """
+    today = timezone.localdate()
+    week_start = today - timedelta(days=7)
+    month_start = today - timedelta(days=30)
+    
+    aggregates = {
+        'total_shipments': Sum('shipments'),
+        'today_shipments': Sum('shipments', filter=Q(date=today)),
+        'weekly_shipments': Sum('shipments', filter=Q(date__gte=week_start)),
+        'monthly_shipments': Sum('shipments', filter=Q(date__gte=month_start)),
+        'total_revenue': Sum('paid_revenue'),
+        'weekly_revenue': Sum('paid_revenue', filter=Q(date__gte=week_start)),
+        'monthly_revenue': Sum('paid_revenue', filter=Q(date__gte=month_start)),
+    }
+    for status, _ in Shipment.STATUS_CHOICES:
+        aggregates[f'status__{status}'] = Sum(f'status_{status}')
+    for payment_status, _ in Shipment.PAYMENT_STATUS:
+        aggregates[f'payment__{payment_status}'] = Sum(f'payment_{payment_status}')
+    
+    row = {
+        key: value if value is not None else 0
+        for key, value in DailyShipmentStats.objects.aggregate(**aggregates).items()
+    }
+    
+    # Same shape as the values('status').annotate(count=...) querysets the templates expect
+    status_distribution = [
+        {'status': status, 'count': row.pop(f'status__{status}')}
+        for status, _ in sorted(Shipment.STATUS_CHOICES)
+    ]
+    payment_distribution = [
+        {'payment_status': payment_status, 'count': row.pop(f'payment__{payment_status}')}
+        for payment_status, _ in sorted(Shipment.PAYMENT_STATUS)
+    ]
+    counts = {stat['status']: stat['count'] for stat in status_distribution}
+    
+    stats = dict(row)
+    stats.update({
+        'pending_shipments': counts['pending'],
+        'delivered_shipments': counts['delivered'],
+        'status_distribution': [stat for stat in status_distribution if stat['count']],
+        'payment_distribution': [stat for stat in payment_distribution if stat['count']],
+        'pending_payments': PaymentProof.objects.filter(is_verified=False).count(),
+    })
+    return stats
+
+
+def shipment_stats():
+    """Cached result of compute_shipment_stats, shared by every admin view"""
+    return cache.get_or_set(STATS_CACHE_KEY, compute_shipment_stats, getattr(settings, 'STATS_CACHE_TIMEOUT', 60))
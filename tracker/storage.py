@@ -0,0 +1,74 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Where content-addressed files live under MEDIA_ROOT
+BLOB_DIR = 'blobs'
+BLOB_NAME = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/([0-9a-f]{{64}})\.[a-z0-9]+$')
+
+
+def content_hash(content):
+    """SHA-256 of a File's contents, read in chunks and rewound afterwards"""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_digest(name):
+    """The content hash a stored name carries, or None for files stored before hashing"""
+    match = BLOB_NAME.match(name or '')
+    return match.group(1) if match else None
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    """Media storage naming each file after the SHA-256 of its contents.
+
+    Uploads with the same bytes, whatever their name or field, share one file
+    under MEDIA_ROOT/blobs; only the extension of the uploaded name is kept.
+    Files are never overwritten, so a name always means the same content.
+    Which files are still in use is counted by tracker.blobs, which deletes
+    them once nothing refers to them.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name  # The name is chosen in _save() from the content; duplicates are wanted
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower() or '.bin'
+        digest = content_hash(content)
+        name = f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+        path = self.path(name)
+        if os.path.exists(path):
+            # Touch it so garbage collection leaves it alone while the new reference is written
+            os.utime(path)
+            return name
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            # Concurrent uploads of the same bytes race harmlessly: both write identical files
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+
+media_storage = HashedStorage()
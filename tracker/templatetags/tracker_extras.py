@@ -34,6 +34,12 @@ def get_status_percentage(status):
             return 25
         return 0
 
+@register.filter
+def rendition_url(rendition, original):
+    """URL of an image's thumbnail or WebP rendition, or of the original until it has been built"""
+    image = rendition or original
+    return image.url if image else ''
+
 @register.filter
 def days_since(date):
     """Calculate days since given date"""
@@ -63,8 +69,12 @@ def truncate_words(value, num_words):
     return value
 
 @register.simple_tag
-def get_timeline_data(shipment):
-    """Generate timeline data for shipment with all status options"""
+def get_timeline_data(shipment, events=()):
+    """Generate timeline data for shipment with all status options.
+    
+    With the shipment's recent tracking events (newest first), each step
+    also gets the time it was last reached.
+    """
     timeline_steps = [
         {
             'key': 'pending',
@@ -108,63 +118,13 @@ def get_timeline_data(shipment):
                 step['completed'] = True
                 break
     
-    return timeline_steps
-
-@register.simple_tag
-def get_simulated_updates(shipment):
-    """Generate simulated real-time updates"""
-    updates = []
-    
-    # Base updates for all statuses
-    updates.append({
-        'time': 'Just now',
-        'location': shipment.current_location,
-        'message': 'Package scanned at current facility',
-        'icon': 'map-marker-alt'
-    })
+    reached = {}
+    for event in events:
+        reached.setdefault(event.status, event.timestamp)
+    for step in timeline_steps:
+        step['reached_at'] = reached.get(step['key'])
     
-    # Status-specific updates
-    if shipment.status in ['picked', 'on_hold', 'on_way', 'custom_hold', 'delivered']:
-        updates.append({
-            'time': '2 hours ago',
-            'location': 'Distribution Center',
-            'message': 'Departed from sorting facility',
-            'icon': 'truck'
-        })
-    
-    if shipment.status in ['on_way', 'custom_hold', 'delivered']:
-        updates.append({
-            'time': '5 hours ago',
-            'location': 'Main Hub',
-            'message': 'Arrived at regional hub',
-            'icon': 'warehouse'
-        })
-    
-    if shipment.status == 'on_hold':
-        updates.append({
-            'time': '1 hour ago',
-            'location': 'Processing Center',
-            'message': 'Shipment placed on hold for review',
-            'icon': 'pause-circle'
-        })
-    
-    if shipment.status == 'custom_hold':
-        updates.append({
-            'time': '1 hour ago',
-            'location': 'Customs Office',
-            'message': 'Custom clearance in progress',
-            'icon': 'file-alt'
-        })
-    
-    if shipment.status == 'delivered':
-        updates.append({
-            'time': '30 minutes ago',
-            'location': 'Final Destination',
-            'message': 'Successfully delivered to recipient',
-            'icon': 'check-circle'
-        })
-    
-    return updates
+    return timeline_steps
 
 @register.filter
 def status_badge_class(status):
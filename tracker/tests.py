@@ -1,3 +1,1336 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches
+from django.utils import timezone
+
+from PIL import ExifTags, Image as PILImage
+from pypdf import PdfReader
+
+from . import urls as tracker_urls
+from .checks import check_search_triggers
+from .counters import lazy_counters
+from .imports import import_shipments, read_rows
+from .events import compact_events
+from .images import get_image_data, get_image_reader, make_derived_image
+from .live import hub
+from .lookups import BloomFilter, get_known_numbers, reset_known_numbers
+from .metrics import view_metrics
+from .page_cache import invalidate_result_page, result_page_metrics
+from .models import DailyShipmentStats, MediaBlob, PaymentProof, Shipment, SiteSettings, TrackingEvent
+from .payments import reject_proofs
+from .pdf import render_report_pdf
+from .pdf_cache import PDFCache, get_pdf_cache
+from .pdf_export import get_export_pool, shutdown_export_pool
+from .pdf_queue import LocalPDFQueue
+from .report import build_report
+from .rollups import rebuild_daily_stats
+from .scans import apply_scans
+from .search import missing_search_triggers, search_shipments
+from .stats import compute_shipment_stats, shipment_stats
+from .storage import blob_digest
+
+
+def create_shipment(tracking_number='TRK001', **kwargs):
+    fields = {
+        'tracking_number': tracking_number,
+        'sender_name': 'Alice Sender',
+        'sender_address': '1 Origin Street',
+        'sender_email': 'alice@example.com',
+        'sender_phone': '5551234',
+        'receiver_name': 'Bob Receiver',
+        'receiver_address': '2 Destination Road',
+        'receiver_email': 'bob@example.com',
+        'receiver_phone': '5555678',
+        'origin': 'London',
+        'destination': 'New York',
+        'current_location': 'London',
+    }
+    fields.update(kwargs)
+    return Shipment.objects.create(**fields)
+
+
+class TrackerTestCase(TestCase):
+    """Test case that starts from empty process-level caches"""
+
+    def setUp(self):
+        super().setUp()
+        SiteSettings.invalidate_cache()
+        reset_known_numbers()
+        self.addCleanup(SiteSettings.invalidate_cache)
+        cache.clear()
+        invalidate_result_page()
+        result_page_metrics.reset()
+        view_metrics.reset()
+        hub.reset()
+        # Draw-sized report images go to a scratch directory, not the working tree
+        image_cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, image_cache_dir, ignore_errors=True)
+        settings_override = override_settings(PDF_IMAGE_CACHE_DIR=image_cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class PDFCacheTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.shipment = create_shipment()
+
+    def test_repeated_downloads_render_once(self):
+        with mock.patch('tracker.pdf_cache.render_tracking_pdf', return_value=b'%PDF-cached') as render:
+            first = self.client.get('/print/TRK001/')
+            second = self.client.get('/print/TRK001/')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.content, b'%PDF-cached')
+        self.assertEqual(second.content, b'%PDF-cached')
+
+    def test_shipment_and_settings_changes_invalidate(self):
+        with mock.patch('tracker.pdf_cache.render_tracking_pdf', return_value=b'%PDF') as render:
+            self.client.get('/print/TRK001/')
+            self.shipment.status = 'delivered'
+            self.shipment.save()
+            self.client.get('/print/TRK001/')
+            site_settings = SiteSettings.load()
+            site_settings.company_name = 'Renamed Ltd'
+            site_settings.save()
+            self.client.get('/print/TRK001/')
+        self.assertEqual(render.call_count, 3)
+
+    def test_disk_entries_survive_a_fresh_process_cache(self):
+        with mock.patch('tracker.pdf_cache.render_tracking_pdf', return_value=b'%PDF') as render:
+            self.client.get('/print/TRK001/')
+            get_pdf_cache()._memory.clear()
+            self.client.get('/print/TRK001/')
+        self.assertEqual(render.call_count, 1)
+
+    def test_size_bounds_evict_least_recently_used(self):
+        cache = PDFCache(self.cache_dir, max_memory_bytes=10, max_disk_bytes=10)
+        cache.set('aa1', b'12345')
+        cache.set('aa2', b'12345')
+        cache.get('aa1')
+        cache.set('aa3', b'12345')
+        self.assertIn('aa1', cache._memory)
+        self.assertNotIn('aa2', cache._memory)
+        self.assertLessEqual(sum(size for _, size, _ in cache._disk_entries()), 10)
+
+
+@override_settings(PDF_ASYNC_ENABLED=True, PDF_QUEUE_WORKERS=0, PDF_CACHE_DIR=None)
+class PDFQueueTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        create_shipment()
+
+    def test_enqueue_builds_into_cache_and_status_reports_ready(self):
+        response = self.client.get('/print/TRK001/status/')
+        self.assertEqual(response.json()['status'], 'missing')
+
+        with mock.patch('tracker.pdf_cache.render_tracking_pdf', return_value=b'%PDF') as render:
+            response = self.client.get('/print/TRK001/async/')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()['status'], 'ready')
+            self.assertEqual(self.client.get('/print/TRK001/status/').json()['status'], 'ready')
+            self.client.get(response.json()['download_url'])
+        self.assertEqual(render.call_count, 1)
+
+    def test_finished_jobs_are_forgotten_after_the_result_ttl(self):
+        queue = LocalPDFQueue(max_workers=0, result_ttl=60)
+        with mock.patch('tracker.pdf_queue.build_tracking_pdf', side_effect=[None, ValueError('no stamp')]):
+            queue.enqueue('TRK001')
+            with self.assertLogs('tracker.pdf_queue', 'ERROR') as logs:
+                queue.enqueue('TRK002')
+        self.assertIn('TRK002', logs.output[0])
+        self.assertIn('ValueError: no stamp', logs.output[0])
+        self.assertEqual(queue._jobs, {})
+        self.assertEqual((queue.status('TRK001'), queue.status('TRK002')), ('done', 'failed'))
+        queue.result_ttl = 0
+        self.assertIsNone(queue.status('TRK001'))
+        self.assertEqual(len(queue._finished), 0)
+
+    def test_status_reports_done_when_the_built_pdf_is_no_longer_cached(self):
+        with mock.patch('tracker.pdf_cache.render_tracking_pdf', return_value=b'%PDF'):
+            self.client.get('/print/TRK001/async/')
+        get_pdf_cache().clear()
+        # The page then downloads directly instead of queueing the build again
+        self.assertEqual(self.client.get('/print/TRK001/status/').json()['status'], 'done')
+
+    @override_settings(PDF_ASYNC_ENABLED=False)
+    def test_endpoints_are_opt_in(self):
+        self.assertEqual(self.client.get('/print/TRK001/async/').status_code, 404)
+        self.assertEqual(self.client.get('/print/TRK001/status/').status_code, 404)
+
+
+@override_settings(PDF_CACHE_DIR=None, PDF_EXPORT_WORKERS=0)
+class BulkPDFExportTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(3):
+            create_shipment(f'TRK00{number}', status='on_way' if number else 'pending')
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+
+    def test_zip_export_streams_one_pdf_per_filtered_shipment(self):
+        response = self.client.get('/dashboard/shipments/export-pdf/?format=zip&status=on_way')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['tracking_TRK001.pdf', 'tracking_TRK002.pdf'])
+        self.assertTrue(archive.read('tracking_TRK001.pdf').startswith(b'%PDF'))
+
+    @override_settings(PDF_EXPORT_WORKERS=2)
+    def test_exports_share_one_spawned_process_pool(self):
+        self.addCleanup(shutdown_export_pool)
+        response = self.client.get('/dashboard/shipments/export-pdf/?format=zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 3)
+        pool = get_export_pool()
+        self.assertEqual(pool._mp_context.get_start_method(), 'spawn')
+        get_pdf_cache().clear()
+        response = self.client.get('/dashboard/shipments/export-pdf/?format=pdf')
+        self.assertEqual(len(PdfReader(io.BytesIO(b''.join(response.streaming_content))).pages), 3)
+        self.assertIs(get_export_pool(), pool)
+        shutdown_export_pool()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_merged_export_is_a_single_pdf(self):
+        response = self.client.get('/dashboard/shipments/export-pdf/?format=pdf')
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(len(PdfReader(io.BytesIO(content)).pages), 3)
+
+    @override_settings(PDF_EXPORT_MERGE_LIMIT=2)
+    def test_merged_export_is_capped(self):
+        with mock.patch('tracker.pdf_export.render_merged_pdf') as render:
+            response = self.client.get('/dashboard/shipments/export-pdf/?format=pdf', follow=True)
+        render.assert_not_called()
+        self.assertContains(response, 'at most 2 shipments')
+        response = self.client.get('/dashboard/shipments/export-pdf/?format=pdf&status=on_way')
+        self.assertEqual(len(PdfReader(io.BytesIO(b''.join(response.streaming_content))).pages), 2)
+
+
+class ReportTemplateTests(TrackerTestCase):
+    def test_preview_and_pdf_share_the_report_layout(self):
+        shipment = create_shipment(parcel_description='Documents', remarks='Fragile')
+        site_settings = SiteSettings.load()
+        site_settings.pdf_header_title = 'CUSTOM REPORT TITLE'
+        site_settings.save()
+
+        report = build_report(shipment, site_settings)
+        self.assertEqual(report['detail_rows'][-1], [('Description:', 'Documents')])
+        self.assertTrue(render_report_pdf(report).startswith(b'%PDF'))
+
+        response = self.client.get('/print-preview/TRK001/')
+        self.assertContains(response, 'CUSTOM REPORT TITLE')
+        self.assertContains(response, 'Fragile')
+
+
+class DerivedImageTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            PDF_IMAGE_CACHE_DIR=f'{self.media_root}/derived',
+            PDF_IMAGE_DPI=100,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size=(2000, 1500)):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', size, 'navy').save(buffer, 'JPEG')
+        return SimpleUploadedFile('parcel.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_generates_copy_at_draw_size(self):
+        shipment = create_shipment(parcel_image=self.upload())
+        derived = make_derived_image(shipment.parcel_image.path, 'parcel')
+        with PILImage.open(derived) as img:
+            self.assertEqual(img.size, (400, 300))  # 4x3 inches at 100 dpi
+
+    def test_image_data_is_reused_until_the_source_changes(self):
+        # A file stored before content addressing, which can change in place
+        path = os.path.join(self.media_root, 'parcel.jpg')
+        PILImage.new('RGB', (200, 150), 'navy').save(path, 'JPEG')
+        data = get_image_data(path, 'parcel')
+        self.assertIs(get_image_data(path, 'parcel'), data)
+
+        PILImage.new('RGB', (100, 100), 'red').save(path, 'JPEG')
+        os.utime(path, ns=(0, 0))
+        self.assertIsNot(get_image_data(path, 'parcel'), data)
+
+    def test_each_render_gets_its_own_reader(self):
+        # ReportLab seeks and reads a reader's file while drawing, so parallel renders can't share one
+        path = os.path.join(self.media_root, 'parcel.jpg')
+        PILImage.new('RGB', (200, 150), 'navy').save(path, 'JPEG')
+        first, second = get_image_reader(path, 'parcel'), get_image_reader(path, 'parcel')
+        self.assertIsNot(first.fp, second.fp)
+        self.assertEqual(first.fp.read(), second.fp.read())
+
+
+class SiteSettingsCacheTests(TrackerTestCase):
+    def test_load_is_memoized_and_never_writes(self):
+        with self.assertNumQueries(1):
+            first = SiteSettings.load()
+            second = SiteSettings.load()
+        self.assertIs(first, second)
+        self.assertIsNone(first.pk)
+        self.assertFalse(SiteSettings.objects.exists())
+
+    def test_save_and_delete_invalidate(self):
+        SiteSettings.objects.create(company_name='Before Ltd')
+        self.assertEqual(SiteSettings.load().company_name, 'Before Ltd')
+
+        site_settings = SiteSettings.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            site_settings.company_name = 'After Ltd'
+            site_settings.save()
+            # Until the save commits, readers keep the committed settings
+            self.assertEqual(SiteSettings.load().company_name, 'Before Ltd')
+        self.assertEqual(SiteSettings.load().company_name, 'After Ltd')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            site_settings.delete()
+        self.assertIsNone(SiteSettings.load().pk)
+
+    @override_settings(SITE_SETTINGS_CACHE_ALIAS='default')
+    def test_shared_version_invalidates_other_processes(self):
+        SiteSettings.objects.create(company_name='Before Ltd')
+        SiteSettings.load()
+        # Another process saved: only the shared version stamp changes here
+        SiteSettings.objects.update(company_name='After Ltd')
+        SiteSettings._shared_cache().set(SiteSettings.CACHE_VERSION_KEY, 'other-process')
+        self.assertEqual(SiteSettings.load().company_name, 'After Ltd')
+
+
+class AdminCounterTests(TrackerTestCase):
+    def test_counters_query_only_when_read_and_are_cached(self):
+        create_shipment()
+        with self.assertNumQueries(0):
+            counters = lazy_counters()
+        with self.assertNumQueries(1):
+            self.assertEqual(str(counters['total_shipments']), '1')
+            self.assertEqual(int(lazy_counters()['total_shipments']), 1)
+
+    def test_signals_refresh_counters(self):
+        self.assertEqual(int(lazy_counters()['total_shipments']), 0)
+        shipment = create_shipment()
+        self.assertEqual(int(lazy_counters()['total_shipments']), 1)
+        shipment.delete()
+        self.assertEqual(int(lazy_counters()['total_shipments']), 0)
+
+    def test_staff_pages_render_counters(self):
+        create_shipment()
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        response = self.client.get('/dashboard/settings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response.context['total_shipments']), 1)
+
+
+class ShipmentStatsTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        create_shipment('TRK001', status='delivered', payment_status='paid', shipment_cost=100, clearance_cost=20)
+        create_shipment('TRK002', status='pending', payment_status='paid', shipment_cost=50)
+        old = create_shipment('TRK003', status='pending', payment_status='awaiting_payment', shipment_cost=10)
+        Shipment.objects.filter(pk=old.pk).update(date_created=timezone.now() - timedelta(days=20))
+        rebuild_daily_stats()
+
+    def test_all_figures_in_two_queries(self):
+        with self.assertNumQueries(2):
+            stats = compute_shipment_stats()
+        self.assertEqual(stats['total_shipments'], 3)
+        self.assertEqual(stats['weekly_shipments'], 2)
+        self.assertEqual(stats['monthly_shipments'], 3)
+        self.assertEqual(stats['pending_shipments'], 2)
+        self.assertEqual(stats['delivered_shipments'], 1)
+        self.assertEqual(stats['total_revenue'], 170)
+        self.assertEqual(stats['status_distribution'], [
+            {'status': 'delivered', 'count': 1},
+            {'status': 'pending', 'count': 2},
+        ])
+
+    def test_result_is_cached_and_shared_by_views(self):
+        shipment_stats()
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        with mock.patch('tracker.stats.compute_shipment_stats') as compute:
+            self.assertEqual(self.client.get('/dashboard/').status_code, 200)
+            self.assertEqual(self.client.get('/dashboard/stats/').status_code, 200)
+        compute.assert_not_called()
+
+
+class DailyRollupTests(TrackerTestCase):
+    def today(self):
+        return DailyShipmentStats.objects.get(date=timezone.localdate())
+
+    def test_save_and_delete_maintain_todays_row(self):
+        shipment = create_shipment(payment_status='paid', shipment_cost=40)
+        row = self.today()
+        self.assertEqual((row.shipments, row.status_pending, row.payment_paid, row.paid_revenue), (1, 1, 1, 40))
+
+        shipment = Shipment.objects.get(pk=shipment.pk)
+        shipment.status = 'delivered'
+        shipment.payment_status = 'awaiting_payment'
+        shipment.save()
+        row = self.today()
+        self.assertEqual((row.shipments, row.status_pending, row.status_delivered), (1, 0, 1))
+        self.assertEqual((row.payment_paid, row.payment_awaiting_payment, row.paid_revenue), (0, 1, 0))
+
+        shipment.delete()
+        self.assertEqual(self.today().shipments, 0)
+
+    def test_location_only_edits_skip_the_rollup(self):
+        shipment = create_shipment()
+        shipment.current_location = 'Paris'
+        # The UPDATE and its tracking event, nothing for the rollup
+        with self.assertNumQueries(2):
+            shipment.save(update_fields=['current_location', 'last_updated'])
+
+    def test_deferred_instances_and_rebuild_agree(self):
+        create_shipment('TRK001', payment_status='paid', shipment_cost=10)
+        shipment = Shipment.objects.only('id', 'tracking_number').get(tracking_number='TRK001')
+        shipment.status = 'on_way'
+        shipment.save()
+        incremental = list(DailyShipmentStats.objects.values())
+        rebuild_daily_stats()
+        self.assertEqual(
+            [dict(row, id=None) for row in incremental],
+            [dict(row, id=None) for row in DailyShipmentStats.objects.values()],
+        )
+
+
+class ShipmentPaginationTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(30):
+            create_shipment(f'TRK{number:03d}')
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+
+    def tracking_numbers(self, response):
+        return [shipment.tracking_number for shipment in response.context['shipments']]
+
+    def test_first_page_is_bounded(self):
+        response = self.client.get('/dashboard/shipments/')
+        page = response.context['shipments']
+        self.assertEqual(len(page), 25)
+        self.assertEqual(page.paginator.count, 30)
+        self.assertEqual(self.tracking_numbers(response)[0], 'TRK029')
+        self.assertContains(response, 'Showing 1 to 25 of 30 entries')
+
+    @override_settings(ADMIN_PAGE_SIZES=(25, 10))
+    def test_next_and_previous_seek_by_cursor(self):
+        first = self.client.get('/dashboard/shipments/', {'per_page': 10})
+        page = first.context['shipments']
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/dashboard/shipments/', {'per_page': 10, 'page': 2, 'after': page.next_cursor})
+        self.assertFalse(any('OFFSET' in query['sql'] or 'COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(self.tracking_numbers(second), [f'TRK{n:03d}' for n in range(19, 9, -1)])
+        self.assertContains(second, 'Showing 11 to 20 entries')
+
+        back = self.client.get('/dashboard/shipments/', {
+            'per_page': 10, 'page': 1, 'before': second.context['shipments'].previous_cursor,
+        })
+        self.assertEqual(self.tracking_numbers(back), self.tracking_numbers(first))
+        self.assertFalse(back.context['shipments'].has_previous())
+
+    def test_last_keyset_page_has_no_next(self):
+        page = self.client.get('/dashboard/shipments/', {'per_page': 25}).context['shipments']
+        last = self.client.get('/dashboard/shipments/', {'per_page': 25, 'page': 2, 'after': page.next_cursor})
+        self.assertEqual(len(last.context['shipments']), 5)
+        self.assertFalse(last.context['shipments'].has_next())
+
+    def test_unknown_page_size_and_bad_cursor_fall_back(self):
+        response = self.client.get('/dashboard/shipments/', {'per_page': 7, 'after': 'nonsense'})
+        self.assertEqual(response.context['per_page'], 25)
+        self.assertEqual(self.tracking_numbers(response)[0], 'TRK029')
+
+
+@skipUnless(connection.vendor == 'sqlite', "Plans below are SQLite's EXPLAIN QUERY PLAN output")
+class QueryPlanTests(TestCase):
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_staff_shipment_list(self):
+        shipments = Shipment.objects.order_by('-date_created', '-id')
+        self.assertUsesIndex(shipments, 'shipment_created_idx')
+        self.assertUsesIndex(shipments.filter(status='pending'), 'shipment_status_created_idx')
+        self.assertUsesIndex(shipments.filter(payment_status='paid'), 'shipment_payment_created_idx')
+
+    def test_recent_activity(self):
+        self.assertUsesIndex(Shipment.objects.order_by('-last_updated')[:10], 'shipment_updated_idx')
+
+    def test_payment_queues(self):
+        proofs = PaymentProof.objects.order_by('-date_uploaded')
+        self.assertUsesIndex(proofs.filter(is_verified=False), 'proof_pending_idx')
+        self.assertUsesIndex(proofs.filter(is_verified=True), 'proof_verified_idx')
+        self.assertIn('proof_pending_idx', PaymentProof.objects.filter(is_verified=False).explain())
+
+    def test_tracking_history(self):
+        self.assertUsesIndex(TrackingEvent.objects.filter(shipment_id=1)[:20], 'event_shipment_time_idx')
+
+
+class ShipmentSearchTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        create_shipment('TRK100', sender_name='Carol Jones', origin='Lagos')
+        create_shipment('TRK200', receiver_name='Dave Carolson', receiver_email='dave@example.org')
+        create_shipment('CAR300', sender_name='Eve Smith')
+
+    def search(self, query):
+        return [shipment.tracking_number for shipment in search_shipments(Shipment.objects.all(), query)]
+
+    def test_prefix_match_across_fields(self):
+        self.assertEqual(self.search('lag'), ['TRK100'])
+        self.assertEqual(self.search('dave@example'), ['TRK200'])
+        self.assertEqual(set(self.search('trk')), {'TRK100', 'TRK200'})
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('carol jon'), ['TRK100'])
+        self.assertEqual(self.search('carol lagos smith'), [])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_tracking_number_ranks_above_names(self):
+        self.assertEqual(self.search('car')[0], 'CAR300')
+
+    def test_hyphenated_tracking_numbers_are_one_term(self):
+        create_shipment('GT-2024-0001')
+        create_shipment('GT-2025-0002')
+        self.assertEqual(self.search('gt-2024'), ['GT-2024-0001'])
+        self.assertEqual(self.search('GT-2025-0002'), ['GT-2025-0002'])
+
+    @override_settings(SEARCH_RANK_WINDOW=2)
+    def test_broad_queries_are_ranked_within_the_newest_matches(self):
+        # Every shipment has an example.com/.org address; the oldest follows the ranked window
+        results = self.search('example')
+        self.assertEqual(set(results[:2]), {'TRK200', 'CAR300'})
+        self.assertEqual(results[2:], ['TRK100'])
+        self.assertEqual(self.search('lagos'), ['TRK100'])
+
+    @override_settings(SEARCH_RANK_WINDOW=2)
+    def test_window_is_taken_from_the_filtered_queryset(self):
+        Shipment.objects.filter(tracking_number='TRK100').update(status='delivered')
+        create_shipment('TRK400', origin='Lagos')
+        create_shipment('TRK500', origin='Lagos')
+        delivered = search_shipments(Shipment.objects.filter(status='delivered'), 'lagos')
+        self.assertEqual([shipment.tracking_number for shipment in delivered], ['TRK100'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 index is SQLite only')
+    def test_migrations_leave_the_index_triggers_in_place(self):
+        self.assertEqual(missing_search_triggers(), [])
+        self.assertEqual(check_search_triggers(None, databases=['default']), [])
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER tracker_shipment_search_insert')  # What a table rebuild does
+        self.assertEqual([error.id for error in check_search_triggers(None, databases=['default'])],
+                         ['tracker.E001'])
+        create_shipment('TRK400', origin='Nairobi')
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(missing_search_triggers(), [])
+        create_shipment('TRK500', origin='Nairobi')
+        self.assertEqual(self.search('nairobi'), ['TRK500', 'TRK400'])
+
+    def test_index_follows_updates_bulk_writes_and_deletes(self):
+        Shipment.objects.filter(tracking_number='TRK100').update(current_location='Nairobi')
+        self.assertEqual(self.search('nairobi'), ['TRK100'])
+        Shipment.objects.bulk_create([Shipment(**{
+            field.name: getattr(Shipment.objects.get(tracking_number='CAR300'), field.name)
+            for field in Shipment._meta.concrete_fields if not field.primary_key
+        } | {'tracking_number': 'BULK1'})])
+        self.assertEqual(set(self.search('eve')), {'CAR300', 'BULK1'})
+        Shipment.objects.filter(tracking_number='CAR300').delete()
+        self.assertEqual(self.search('eve'), ['BULK1'])
+
+    def test_staff_list_and_admin_use_the_index(self):
+        User.objects.create_superuser('staff', password='secret')
+        self.client.login(username='staff', password='secret')
+        response = self.client.get('/dashboard/shipments/', {'search': 'carol'})
+        self.assertCountEqual([s.tracking_number for s in response.context['shipments']], ['TRK100', 'TRK200'])
+        response = self.client.get('/admin/tracker/shipment/', {'q': 'lagos'})
+        self.assertEqual(list(response.context['cl'].result_list.values_list('tracking_number', flat=True)), ['TRK100'])
+
+
+class ConditionalTrackingTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shipment = create_shipment('TRK001', status='on_way', current_location='Paris')
+
+    def test_json_payload(self):
+        response = self.client.get('/api/track/TRK001/')
+        data = response.json()
+        self.assertEqual(data['status'], 'on_way')
+        self.assertEqual(data['current_location'], 'Paris')
+        self.assertEqual([step['key'] for step in data['timeline']], ['pending', 'picked', 'on_way', 'delivered'])
+        self.assertEqual(data['payment']['proof_uploaded'], False)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.client.get('/api/track/NOPE/').status_code, 404)
+
+    def test_unchanged_shipment_gets_304_from_one_query(self):
+        for url in ('/api/track/TRK001/', '/track/?tracking_number=TRK001'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_the_etag(self):
+        etag = self.client.get('/api/track/TRK001/')['ETag']
+        self.shipment.status = 'delivered'
+        self.shipment.save()
+        response = self.client.get('/api/track/TRK001/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'delivered')
+
+        # Rejecting a proof deletes it without saving the shipment
+        etag = response['ETag']
+        proof = PaymentProof.objects.create(shipment=self.shipment, image='payment_proofs/proof.png')
+        etag_with_proof = self.client.get('/api/track/TRK001/', HTTP_IF_NONE_MATCH=etag)['ETag']
+        self.assertNotEqual(etag_with_proof, etag)
+        proof.delete()
+        self.assertEqual(self.client.get('/api/track/TRK001/', HTTP_IF_NONE_MATCH=etag_with_proof).status_code, 200)
+
+    def test_unknown_tracking_number_renders_normally(self):
+        response = self.client.get('/track/', {'tracking_number': 'NOPE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class UnknownTrackingNumberTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        create_shipment('TRK001')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        numbers = [f'TRK{n:06d}' for n in range(1000)]
+        for number in numbers:
+            bloom.add(number)
+        self.assertTrue(all(number in bloom for number in numbers))
+        false_positives = sum(f'MISS{n:06d}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_unknown_numbers_skip_the_database(self):
+        self.client.get('/track/', {'tracking_number': 'TRK001'})  # builds the filter
+        with self.assertNumQueries(0):
+            response = self.client.get('/track/', {'tracking_number': 'NOPE'})
+        self.assertIsNone(response.context['shipment'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/track/NOPE/').status_code, 404)
+
+    def test_new_shipments_are_found_immediately(self):
+        self.client.get('/track/', {'tracking_number': 'TRK002'})
+        create_shipment('TRK002')
+        response = self.client.get('/track/', {'tracking_number': 'TRK002'})
+        self.assertEqual(response.context['shipment'].tracking_number, 'TRK002')
+
+    @override_settings(TRACKING_FILTER_SYNC_INTERVAL=0)
+    def test_shipments_saved_elsewhere_are_caught_up(self):
+        get_known_numbers().may_exist('TRK001')
+        # bulk_create sends no signals, like a save in another process
+        Shipment.objects.bulk_create([Shipment(**{
+            field.name: getattr(Shipment.objects.get(), field.name)
+            for field in Shipment._meta.concrete_fields if not field.primary_key
+        } | {'tracking_number': 'TRK003'})])
+        self.assertTrue(get_known_numbers().may_exist('TRK003'))
+
+    def test_deleted_numbers_are_remembered_as_unknown(self):
+        Shipment.objects.get(tracking_number='TRK001').delete()
+        self.client.get('/track/', {'tracking_number': 'TRK001'})
+        with self.assertNumQueries(0):
+            self.client.get('/track/', {'tracking_number': 'TRK001'})
+
+
+class ResultPageCacheTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shipment = create_shipment('TRK001', current_location='Paris')
+
+    def track(self):
+        return self.client.get('/track/', {'tracking_number': 'TRK001'})
+
+    def test_second_view_is_served_from_cache(self):
+        first = self.track()
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):  # the version lookup only
+            second = self.track()
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(result_page_metrics.as_dict()['hits'], 1)
+
+    def test_saves_invalidate_the_page(self):
+        self.track()
+        self.shipment.current_location = 'Berlin'
+        self.shipment.save()
+        response = self.track()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Berlin')
+
+        PaymentProof.objects.create(shipment=self.shipment, image='payment_proofs/proof.png')
+        self.assertEqual(self.track()['X-Cache'], 'MISS')
+        SiteSettings.objects.create(company_name='Renamed')
+        self.assertEqual(self.track()['X-Cache'], 'MISS')
+
+    def test_changes_made_elsewhere_are_caught_by_the_version(self):
+        self.track()
+        # queryset update() sends no signals, like a save in another process
+        Shipment.objects.filter(pk=self.shipment.pk).update(
+            current_location='Madrid', last_updated=timezone.now() + timedelta(seconds=1),
+        )
+        response = self.track()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Madrid')
+        self.assertEqual(result_page_metrics.as_dict()['stale'], 1)
+
+    def test_file_based_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with self.settings(CACHES={**settings.CACHES, 'result_pages': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}):
+            self.track()
+            self.assertEqual(self.track()['X-Cache'], 'HIT')
+            self.assertTrue(os.listdir(directory))
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.track()
+        self.assertNotEqual(self.client.get('/dashboard/cache-stats/').status_code, 200)
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        data = self.client.get('/dashboard/cache-stats/').json()
+        self.assertEqual(data['result_pages']['misses'], 1)
+
+
+class QueryCountTests(TrackerTestCase):
+    """Query budgets for the busiest pages; a failure here usually means a new N+1"""
+
+    def setUp(self):
+        super().setUp()
+        for number in range(5):
+            shipment = create_shipment(f'TRK{number:03d}', payment_status='awaiting_payment')
+            PaymentProof.objects.create(shipment=shipment, image='payment_proofs/proof.png', is_verified=number % 2 == 0)
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        # Warm the process-level memos (site settings, tracking number filter, sidebar counters)
+        self.client.get('/track/', {'tracking_number': 'TRK004'})
+        [int(count) for count in lazy_counters().values()]
+
+    def test_track_shipment(self):
+        self.client.logout()
+        # version lookup + shipment joined with its proof + recent events
+        with self.assertNumQueries(3), self.settings(RESULT_CACHE_ALIAS=None):
+            response = self.client.get('/track/', {'tracking_number': 'TRK001'})
+        self.assertEqual(response.context['proof_uploaded'].shipment.tracking_number, 'TRK001')
+        with self.assertNumQueries(3):
+            self.client.get('/api/track/TRK001/')
+
+    def test_staff_pages(self):
+        # session + user, then the page's own queries
+        budgets = {
+            '/dashboard/payments/': 2 + 2,
+            '/dashboard/shipments/': 2 + 2,
+            '/dashboard/shipments/?search=trk': 2 + 3,
+            '/dashboard/': 2 + 3,
+            '/dashboard/stats/': 2 + 1,
+        }
+        for url, queries in budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.client.get(url)
+
+    def test_payments_page_does_not_grow_with_proofs(self):
+        for number in range(5, 15):
+            shipment = create_shipment(f'TRK{number:03d}')
+            PaymentProof.objects.create(shipment=shipment, image='payment_proofs/proof.png')
+        [int(count) for count in lazy_counters().values()]
+        with self.assertNumQueries(4):
+            self.client.get('/dashboard/payments/')
+
+
+class ViewMetricsTests(TrackerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        create_shipment()
+
+    def test_requests_are_recorded_per_url_name(self):
+        response = self.client.get('/track/', {'tracking_number': 'TRK001'})
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.client.get('/track/', {'tracking_number': 'TRK001'})
+        self.client.get('/no-such-page/')
+
+        views = view_metrics.as_dict()['views']
+        self.assertEqual(list(views), ['track_shipment'])
+        track = views['track_shipment']
+        self.assertEqual(track['requests'], 2)
+        self.assertEqual(sum(track['latency_ms']['buckets'].values()), 2)
+        self.assertGreater(track['sql']['queries'], 0)
+
+    def test_pdf_build_time(self):
+        with mock.patch('tracker.pdf_cache.render_tracking_pdf', return_value=b'%PDF'), \
+                self.settings(PDF_CACHE_DIR=None, PDF_CACHE_MAX_MEMORY=0):
+            response = self.client.get('/print/TRK001/')
+        self.assertIn('pdf;dur=', response['Server-Timing'])
+        self.assertEqual(view_metrics.as_dict()['views']['print_pdf']['pdf']['builds'], 1)
+
+    def test_disabled(self):
+        with self.settings(TRACKER_METRICS_ENABLED=False):
+            response = self.client.get('/track/', {'tracking_number': 'TRK001'})
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(view_metrics.as_dict()['views'], {})
+
+    def test_endpoint_is_staff_only(self):
+        self.assertNotEqual(self.client.get('/dashboard/metrics/').status_code, 200)
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        self.client.get('/dashboard/')
+        data = self.client.get('/dashboard/metrics/').json()
+        self.assertEqual(data['views']['admin_dashboard']['requests'], 1)
+
+
+class ShipmentImportTests(TrackerTestCase):
+    HEADER = 'tracking_number,sender_name,sender_address,sender_email,sender_phone,receiver_name,' \
+             'receiver_address,receiver_email,receiver_phone,origin,destination,current_location,' \
+             'payment_status,shipment_cost,clearance_cost\n'
+
+    def csv_row(self, number, email='a@example.com', payment_status='paid'):
+        return (f'{number},Ann,1 Road,{email},555,Ben,2 Road,b@example.com,556,'
+                f'Lagos,Accra,Lagos,{payment_status},10,2.50\n')
+
+    def test_command_validates_and_imports_in_batches(self):
+        create_shipment('IMP-EXISTS')
+        rows = [self.csv_row(f'IMP-{number:03d}') for number in range(7)]
+        rows += [self.csv_row('IMP-BAD', email='not-an-email'), self.csv_row('IMP-000'), self.csv_row('IMP-EXISTS')]
+        path = os.path.join(tempfile.mkdtemp(), 'parcels.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as source:
+            source.write(self.HEADER + ''.join(rows))
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_shipments', path, batch_size=3, stdout=out, stderr=err)
+        self.assertIn('7 of 10 rows imported, 3 rejected', out.getvalue())
+        errors = err.getvalue().splitlines()
+        self.assertTrue(errors[0].startswith('line 9: sender_email:'))
+        self.assertIn('line 10: tracking_number: IMP-000 appears earlier', errors[1])
+        self.assertIn('line 11: tracking_number: A shipment with this tracking number already exists', errors[2])
+
+        shipment = Shipment.objects.get(tracking_number='IMP-003')
+        self.assertEqual((shipment.status, shipment.total_cost, shipment.show_payment_info), ('pending', 12.5, True))
+        # Bulk inserts send no signals, so the importer keeps the derived data in step itself
+        row = DailyShipmentStats.objects.get(date=timezone.localdate())
+        self.assertEqual((row.shipments, row.payment_paid, row.paid_revenue), (8, 7, 87.5))
+        self.assertTrue(get_known_numbers().may_exist('IMP-006'))
+        self.assertEqual(list(search_shipments(Shipment.objects.all(), 'IMP-006')), [Shipment.objects.get(tracking_number='IMP-006')])
+
+    def test_queries_do_not_grow_per_row(self):
+        rows = ((line, {'tracking_number': f'Q-{line}', 'sender_name': 'Ann', 'sender_address': 'x',
+                        'sender_email': 'a@example.com', 'sender_phone': '1', 'receiver_name': 'Ben',
+                        'receiver_address': 'y', 'receiver_email': 'b@example.com', 'receiver_phone': '2',
+                        'origin': 'A', 'destination': 'B', 'current_location': 'A'}) for line in range(1, 51))
+        DailyShipmentStats.objects.create(date=timezone.localdate())
+        # Savepoint, existence check, two INSERTs (SQLite caps the parameters per statement),
+        # first events, rollup, release
+        with self.assertNumQueries(7):
+            result = import_shipments(rows, batch_size=100)
+        self.assertEqual(result.created, 50)
+
+    def test_admin_upload_jsonl(self):
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        lines = [
+            '{"tracking_number": "JS-1", "sender_name": "Ann", "sender_address": "x", "sender_email": "a@example.com",'
+            ' "sender_phone": "1", "receiver_name": "Ben", "receiver_address": "y", "receiver_email": "b@example.com",'
+            ' "receiver_phone": "2", "origin": "A", "destination": "B", "current_location": "A", "require_payment": true}',
+            '{"tracking_number": "JS-2"',
+        ]
+        upload = SimpleUploadedFile('parcels.jsonl', '\n'.join(lines).encode())
+        response = self.client.post('/dashboard/shipments/import/', {'file': upload})
+        self.assertEqual((response.context['result'].created, len(response.context['errors'])), (1, 1))
+        self.assertIn('Invalid JSON', response.context['errors'][0][1])
+        self.assertTrue(Shipment.objects.get(tracking_number='JS-1').require_payment)
+
+
+class ScanUpdateTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(4):
+            create_shipment(f'SCAN-{number}', payment_status='paid', shipment_cost=5)
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+
+    def post(self, scans):
+        return self.client.post('/dashboard/shipments/scans/', scans, content_type='application/json')
+
+    def test_endpoint_applies_scans_and_reports_errors(self):
+        before = Shipment.objects.get(tracking_number='SCAN-0').last_updated
+        data = self.post({'scans': [
+            {'tracking_number': 'SCAN-0', 'status': 'on_way', 'current_location': 'Accra'},
+            {'tracking_number': 'SCAN-1', 'status': 'on_way', 'current_location': 'Accra'},
+            {'tracking_number': 'SCAN-2', 'remarks': 'Left at depot'},
+            {'tracking_number': 'SCAN-3', 'current_location': 'London'},
+            {'tracking_number': 'NOPE', 'status': 'on_way'},
+            {'tracking_number': 'SCAN-3', 'status': 'lost'},
+        ]}).json()
+        self.assertEqual((data['scans'], data['updated'], data['unchanged']), (6, 3, 1))
+        self.assertEqual([error['line'] for error in data['errors']], [5, 6])
+
+        shipment = Shipment.objects.get(tracking_number='SCAN-0')
+        self.assertEqual((shipment.status, shipment.current_location), ('on_way', 'Accra'))
+        self.assertGreater(shipment.last_updated, before)
+        self.assertEqual(Shipment.objects.get(tracking_number='SCAN-2').remarks, 'Left at depot')
+        self.assertEqual(self.post([]).json()['updated'], 0)
+        self.assertEqual(self.post({'scans': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/dashboard/shipments/scans/').status_code, 405)
+
+    def test_rollups_and_pages_follow(self):
+        self.client.logout()
+        self.client.get('/track/', {'tracking_number': 'SCAN-1'})
+        apply_scans(enumerate([{'tracking_number': 'SCAN-1', 'status': 'delivered'}], 1))
+        response = self.client.get('/track/', {'tracking_number': 'SCAN-1'})
+        self.assertEqual((response['X-Cache'], response.context['shipment'].status), ('MISS', 'delivered'))
+
+        row = DailyShipmentStats.objects.get(date=timezone.localdate())
+        self.assertEqual((row.status_pending, row.status_delivered), (3, 1))
+        rebuild_daily_stats()
+        rebuilt = DailyShipmentStats.objects.get(date=timezone.localdate())
+        self.assertEqual((rebuilt.status_pending, rebuilt.status_delivered), (3, 1))
+
+    def test_one_update_per_group_of_equal_values(self):
+        scans = [{'tracking_number': f'SCAN-{number}', 'status': 'picked', 'current_location': 'Lagos Hub'}
+                 for number in range(4)]
+        # savepoint, load, one UPDATE for all four, their events, rollup -1 and +1, release
+        with self.assertNumQueries(7):
+            result = apply_scans(enumerate(scans, 1))
+        self.assertEqual(result.updated, 4)
+
+    def test_command_reads_csv(self):
+        path = os.path.join(tempfile.mkdtemp(), 'scans.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as source:
+            source.write('tracking_number,status,current_location\nSCAN-0,custom_hold,Customs\n')
+        out = io.StringIO()
+        call_command('apply_scans', path, stdout=out)
+        self.assertIn('1 of 1 scans applied', out.getvalue())
+        self.assertEqual(Shipment.objects.get(tracking_number='SCAN-0').status, 'custom_hold')
+
+
+class BulkPaymentTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.proofs = []
+        for number in range(3):
+            shipment = create_shipment(f'PAY-{number}', payment_status='awaiting_payment', shipment_cost=20)
+            self.proofs.append(PaymentProof.objects.create(shipment=shipment, image='payment_proofs/proof.png'))
+        User.objects.create_superuser('staff', password='secret')
+        self.client.login(username='staff', password='secret')
+
+    def test_bulk_verify_is_set_based(self):
+        ids = [proof.pk for proof in self.proofs[:2]]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/dashboard/payments/bulk/', {'action': 'verify', 'proof_ids': ids})
+        self.assertRedirects(response, '/dashboard/payments/', fetch_redirect_response=False)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "tracker_')]
+        self.assertEqual(len([sql for sql in updates if 'dailyshipmentstats' not in sql]), 2)
+
+        self.assertEqual(PaymentProof.objects.filter(is_verified=True).count(), 2)
+        self.assertEqual(set(Shipment.objects.filter(payment_status='paid').values_list('tracking_number', flat=True)),
+                         {'PAY-0', 'PAY-1'})
+        row = DailyShipmentStats.objects.get(date=timezone.localdate())
+        self.assertEqual((row.payment_paid, row.payment_awaiting_payment, row.paid_revenue), (2, 1, 40))
+
+    def test_bulk_reject_and_single_views(self):
+        self.client.post('/dashboard/payments/bulk/', {'action': 'reject', 'proof_ids': [self.proofs[0].pk]})
+        self.assertFalse(PaymentProof.objects.filter(pk=self.proofs[0].pk).exists())
+        self.client.get(f'/dashboard/verify-payment/{self.proofs[1].pk}/')
+        self.assertEqual(Shipment.objects.get(tracking_number='PAY-1').payment_status, 'paid')
+        self.assertEqual(self.client.get(f'/dashboard/reject-payment/{self.proofs[0].pk}/').status_code, 404)
+        self.assertEqual(int(lazy_counters()['pending_payments_count']), 1)
+
+    def create_hashed_proofs(self, prefix, count):
+        for number in range(count):
+            digest = f'{prefix:032x}{number:032x}'
+            shipment = create_shipment(f'REJ-{prefix}-{number}')
+            PaymentProof.objects.create(shipment=shipment, image=f'blobs/{digest[:2]}/{digest}.png')
+        return PaymentProof.objects.filter(shipment__tracking_number__startswith=f'REJ-{prefix}-')
+
+    def test_bulk_reject_costs_the_same_for_any_number_of_proofs(self):
+        self.client.get('/track/', {'tracking_number': 'PAY-2'})
+        for prefix, count in ((1, 2), (2, 20)):
+            proofs = self.create_hashed_proofs(prefix, count)
+            # In a savepoint: read, collect, delete, then one read and one update of the file references
+            with self.assertNumQueries(7):
+                self.assertEqual(len(reject_proofs(proofs)), count)
+        self.assertFalse(MediaBlob.objects.filter(refs__gt=0).exists())
+        self.assertEqual(reject_proofs(PaymentProof.objects.all()), ['PAY-0', 'PAY-1', 'PAY-2'])
+        self.assertEqual(PaymentProof.objects.count(), 0)
+        self.assertEqual(self.client.get('/track/', {'tracking_number': 'PAY-2'})['X-Cache'], 'MISS')
+
+    def test_admin_action(self):
+        self.client.get('/track/', {'tracking_number': 'PAY-2'})
+        self.client.post('/admin/tracker/paymentproof/', {
+            'action': 'mark_as_verified', '_selected_action': [proof.pk for proof in self.proofs],
+        })
+        self.assertEqual(PaymentProof.objects.filter(is_verified=True).count(), 3)
+        # The cached result page was dropped along with the verification
+        self.assertEqual(self.client.get('/track/', {'tracking_number': 'PAY-2'})['X-Cache'], 'MISS')
+
+
+class TrackingEventTests(TrackerTestCase):
+    def test_status_and_location_changes_are_recorded(self):
+        shipment = create_shipment()
+        shipment.remarks = 'Sorted'
+        shipment.save()  # remarks alone don't make an event
+        shipment.status = 'on_way'
+        shipment.current_location = 'Paris'
+        shipment.save()
+        Shipment.objects.only('id').get(pk=shipment.pk).save(update_fields=['last_updated'])
+        apply_scans(enumerate([{'tracking_number': 'TRK001', 'current_location': 'Berlin', 'remarks': 'Hub'}], 1))
+
+        history = list(TrackingEvent.objects.filter(shipment=shipment).values_list('status', 'location', 'remarks'))
+        self.assertEqual(history, [('on_way', 'Berlin', 'Hub'), ('on_way', 'Paris', ''), ('pending', 'London', '')])
+        with self.assertRaises(ValueError):
+            TrackingEvent.objects.first().save()
+
+    def test_result_page_and_api_show_the_history(self):
+        shipment = create_shipment()
+        shipment.status = 'picked'
+        shipment.save()
+        response = self.client.get('/track/', {'tracking_number': 'TRK001'})
+        self.assertEqual([event.status for event in response.context['events']], ['picked', 'pending'])
+        self.assertContains(response, 'Picked by Courier')
+        self.assertNotContains(response, 'Departed from sorting facility')
+        data = self.client.get('/api/track/TRK001/').json()
+        self.assertEqual([event['status'] for event in data['events']], ['picked', 'pending'])
+        with self.settings(TRACKING_EVENTS_SHOWN=1):
+            invalidate_result_page()
+            self.assertEqual(len(self.client.get('/track/', {'tracking_number': 'TRK001'}).context['events']), 1)
+
+    def test_compaction_and_retention(self):
+        shipment = create_shipment()
+        now = timezone.now()
+        TrackingEvent.objects.all().delete()
+        for days, status, location in [(400, 'pending', 'A'), (300, 'picked', 'B'), (200, 'picked', 'C'),
+                                       (100, 'picked', 'D'), (50, 'on_way', 'E'), (5, 'on_way', 'F')]:
+            TrackingEvent.objects.create(shipment=shipment, timestamp=now - timedelta(days=days),
+                                         status=status, location=location)
+        self.assertEqual(compact_events(now), (2, 1))
+        self.assertEqual(list(TrackingEvent.objects.values_list('location', flat=True)), ['F', 'E', 'B'])
+
+        other = create_shipment('TRK002')
+        TrackingEvent.objects.filter(shipment=other).update(timestamp=now - timedelta(days=500))
+        compact_events(now)
+        self.assertTrue(TrackingEvent.objects.filter(shipment=other).exists())
+
+
+class LiveTrackingTests(TrackerTestCase):
+    def test_one_save_wakes_every_stream(self):
+        shipment = create_shipment()
+        with self.captureOnCommitCallbacks() as callbacks:
+            shipment.remarks = 'Relabelled'
+            shipment.save()
+        self.assertEqual(callbacks, [])  # Nothing for pages to show
+        with self.captureOnCommitCallbacks() as callbacks:
+            shipment.status = 'on_way'
+            shipment.current_location = 'Paris'
+            shipment.save()
+
+        async def watch():
+            streams = [hub.subscribe('TRK001') for _ in range(50)]
+            await asyncio.to_thread(callbacks[0])  # Commits happen on request threads
+            return await asyncio.gather(*(stream.next_update(1) for stream in streams))
+
+        with CaptureQueriesContext(connection) as queries:
+            updates = asyncio.run(watch())
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(len(updates), 50)
+        event_id, payload = updates[0]
+        self.assertEqual((payload['status'], payload['current_location']), ('on_way', 'Paris'))
+        self.assertEqual(payload['event']['location'], 'Paris')
+        self.assertEqual(hub.stats()['delivered'], 50)
+        self.assertEqual(hub.stats()['streams'], 50)
+
+    def test_scans_are_pushed(self):
+        create_shipment()
+        create_shipment('TRK002')
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_scans(enumerate([{'tracking_number': 'TRK001', 'status': 'picked'},
+                                   {'tracking_number': 'TRK002', 'remarks': 'Fragile'}], 1))
+        self.assertEqual(hub.missed('TRK001', None)[1]['status'], 'picked')
+        self.assertIsNone(hub.missed('TRK002', None))
+
+    async def test_stream_catches_up_from_last_event_id(self):
+        await sync_to_async(create_shipment)()
+        hub.publish('TRK001', '200.000000', {'status': 'on_way'})
+        with self.settings(LIVE_STREAM_TIMEOUT=0.1, LIVE_KEEPALIVE_INTERVAL=0.05):
+            current = await self.async_client.get('/api/track/TRK001/stream/', headers={'Last-Event-ID': '200.0'})
+            behind = await self.async_client.get('/api/track/TRK001/stream/?last_event_id=100.5')
+            self.assertEqual(behind['Content-Type'], 'text/event-stream')
+            current_body = ''.join([chunk.decode() async for chunk in current.streaming_content])
+            behind_body = ''.join([chunk.decode() async for chunk in behind.streaming_content])
+        self.assertNotIn('event: update', current_body)
+        self.assertIn(': keepalive', current_body)
+        self.assertIn('id: 200.000000\nevent: update\ndata: {"status": "on_way"}', behind_body)
+        self.assertEqual(hub.stats()['streams'], 0)
+
+    async def test_only_asgi_pages_open_a_stream(self):
+        await sync_to_async(create_shipment)()
+        streamed = await self.async_client.get('/track/', {'tracking_number': 'TRK001'})
+        polled = await sync_to_async(self.client.get)('/track/', {'tracking_number': 'TRK001'})
+        self.assertEqual((streamed['X-Cache'], polled['X-Cache']), ('MISS', 'MISS'))
+        self.assertIn(b'new EventSource(', streamed.content)
+        self.assertNotIn(b'new EventSource(', polled.content)
+        self.assertIn(b'setInterval(pollTracking, 30000)', polled.content)
+
+    def test_wsgi_stream_tells_event_source_to_stop(self):
+        create_shipment()
+        hub.publish('TRK001', '200.000000', {'status': 'on_way'})
+        response = self.client.get('/api/track/TRK001/stream/', {'last_event_id': '100'})
+        self.assertEqual((response.status_code, response.content), (204, b''))
+        self.assertEqual(hub.stats()['streams'], 0)
+
+
+class AsyncViewTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.route_public_views(True)
+        self.addCleanup(self.route_public_views, False)
+
+    def route_public_views(self, use_async):
+        with self.settings(ASYNC_PUBLIC_VIEWS=use_async):
+            importlib.reload(tracker_urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    async def test_public_pages_under_asgi(self):
+        await sync_to_async(create_shipment)()
+        await self.async_client.get('/track/', {'tracking_number': 'TRK001'})  # Loads the filter and settings
+        await sync_to_async(invalidate_result_page)()
+        view_metrics.reset()
+        response = await self.async_client.get('/track/', {'tracking_number': 'TRK001'})
+        self.assertContains(response, 'TRK001')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        revalidated = await self.async_client.get('/track/', {'tracking_number': 'TRK001'},
+                                                  headers={'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        # Queries made through sync_to_async are still counted
+        self.assertEqual(view_metrics.as_dict()['views']['track_shipment']['sql']['queries'], 4)
+
+        self.assertEqual((await self.async_client.get('/')).status_code, 200)
+        self.assertContains(await self.async_client.get('/print-preview/TRK001/'), 'TRK001')
+        self.assertEqual((await self.async_client.get('/print-preview/NOPE/')).status_code, 404)
+
+    def test_pdf_renders_in_bounded_pool(self):
+        create_shipment()
+        threads = []
+
+        def render(*args):
+            threads.append(threading.current_thread().name)
+            return b'%PDF-async'
+
+        with self.settings(PDF_CACHE_DIR=None, PDF_CACHE_MAX_MEMORY=0, PDF_RENDER_THREADS=1), \
+                mock.patch('tracker.pdf_cache.render_tracking_pdf', side_effect=render):
+            response = self.client.get('/print/TRK001/')
+        self.assertEqual(response.content, b'%PDF-async')
+        self.assertTrue(threads[0].startswith('pdf-render'))
+
+
+@override_settings(UPLOAD_RENDITION_WORKERS=0, THUMBNAIL_SIZE=(64, 64), WEBP_MAX_DIMENSION=150)
+class UploadPipelineTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root,
+                                              PDF_IMAGE_CACHE_DIR=f'{self.media_root}/derived')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.shipment = create_shipment()
+
+    def photo(self, size=(200, 100), name='proof.jpg', exif_tags=None, color='green'):
+        image = PILImage.new('RGB', size, color)
+        exif = image.getexif()
+        exif.update(exif_tags or {})
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', **({'exif': exif} if exif_tags else {}))
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def upload_proof(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/upload-proof/{self.shipment.tracking_number}/', {'proof': upload})
+
+    def test_proof_is_stored_without_metadata_with_renditions_and_dimensions(self):
+        # Orientation 6: the camera was turned, so the upright photo is 100x200
+        response = self.upload_proof(self.photo(exif_tags={ExifTags.Base.Orientation: 6, ExifTags.Base.Make: 'PhoneCam'}))
+        self.assertEqual(response.status_code, 302)
+
+        proof = PaymentProof.objects.get(shipment=self.shipment)
+        with PILImage.open(proof.image.path) as img:
+            self.assertFalse(img.getexif())
+            self.assertEqual(img.size, (100, 200))
+        self.assertEqual((proof.image_width, proof.image_height), (100, 200))
+        with PILImage.open(proof.thumbnail.path) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (64, 64)))
+        with PILImage.open(proof.webp.path) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (75, 150)))
+
+    def test_invalid_and_oversized_uploads_are_rejected(self):
+        response = self.upload_proof(SimpleUploadedFile('proof.jpg', b'not an image'))
+        self.assertContains(response, 'Upload a valid JPEG, PNG, WebP or GIF image.')
+        with override_settings(UPLOAD_MAX_PIXELS=10_000):
+            response = self.upload_proof(self.photo())
+        self.assertContains(response, 'This image has too many pixels.')
+        self.assertFalse(PaymentProof.objects.exists())
+
+    def test_clean_small_images_are_stored_as_uploaded(self):
+        upload = self.photo()
+        content = upload.read()
+        upload.seek(0)
+        self.upload_proof(upload)
+        with PaymentProof.objects.get().image.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_replaced_image_gets_new_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shipment.parcel_image = self.photo(name='parcel.jpg')
+            self.shipment.save()
+        first = Shipment.objects.get().parcel_thumbnail.name
+        self.assertTrue(first)
+
+        shipment = Shipment.objects.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            shipment.parcel_image = self.photo((300, 300), name='parcel.jpg', color='red')
+            shipment.save()
+        self.assertFalse(Shipment.objects.get().parcel_thumbnail)  # Pages fall back to the original
+        for callback in callbacks:
+            callback()
+        shipment = Shipment.objects.get()
+        self.assertNotIn(shipment.parcel_thumbnail.name, ('', first))
+        self.assertEqual((shipment.parcel_image_width, shipment.parcel_image_height), (300, 300))
+
+        # Saves that don't touch the image leave the renditions alone
+        renditions = shipment.parcel_thumbnail.name, shipment.parcel_webp.name
+        with self.captureOnCommitCallbacks(execute=True):
+            shipment.status = 'picked'
+            shipment.save()
+        shipment = Shipment.objects.get()
+        self.assertEqual((shipment.parcel_thumbnail.name, shipment.parcel_webp.name), renditions)
+
+    def test_payments_page_shows_thumbnails(self):
+        self.upload_proof(self.photo())
+        proof = PaymentProof.objects.get()
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.login(username='staff', password='secret')
+        response = self.client.get('/dashboard/payments/')
+        self.assertContains(response, proof.thumbnail.url)
+        self.assertNotContains(response, f'src="{proof.image.url}"')
+
+
+@override_settings(UPLOAD_RENDITION_WORKERS=0, MEDIA_GC_GRACE_SECONDS=0)
+class MediaBlobTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root,
+                                              PDF_IMAGE_CACHE_DIR=f'{self.media_root}/derived')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name='parcel.jpg', color='navy'):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (120, 90), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def refs(self, name):
+        return MediaBlob.objects.filter(name=name).values_list('refs', flat=True).first()
+
+    def test_duplicates_share_a_file_until_the_last_row_goes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = create_shipment('TRK001', parcel_image=self.upload('banner.jpg'))
+            second = create_shipment('TRK002', parcel_image=self.upload('banner_91aikSj.jpg'))
+        name = first.parcel_image.name
+        self.assertTrue(blob_digest(name))
+        self.assertEqual(second.parcel_image.name, name)
+        self.assertEqual(self.refs(name), 2)
+        # The PDF image cache keys on the hash too, so both share one derived copy
+        self.assertEqual(make_derived_image(first.parcel_image.path, 'parcel'),
+                         make_derived_image(second.parcel_image.path, 'parcel'))
+
+        thumbnail = Shipment.objects.get(pk=first.pk).parcel_thumbnail.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(second.parcel_image.path))
+        self.assertEqual(self.refs(name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, thumbnail)))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_replacing_and_rejecting_release_old_files(self):
+        shipment = create_shipment()
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentProof.objects.create(shipment=shipment, image=self.upload('proof.jpg'))
+        proof = PaymentProof.objects.get()
+        old_files = [proof.image.name, proof.thumbnail.name, proof.webp.name]
+        self.assertTrue(all(old_files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            proof.image = self.upload('proof.jpg', color='red')
+            proof.save()
+        proof = PaymentProof.objects.get()
+        for name in old_files:
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertEqual(self.refs(proof.image.name), 1)
+
+        new_files = [proof.image.name, proof.thumbnail.name, proof.webp.name]
+        with self.captureOnCommitCallbacks(execute=True):
+            reject_proofs(PaymentProof.objects.all())
+        for name in new_files:
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+
+    def test_collect_media_hashes_existing_files_and_merges_duplicates(self):
+        upload = self.upload()
+        os.makedirs(os.path.join(self.media_root, 'parcel_images'))
+        for name in ('banner.jpg', 'banner_91aikSj.jpg'):
+            with open(os.path.join(self.media_root, 'parcel_images', name), 'wb') as legacy:
+                legacy.write(upload.read())
+            upload.seek(0)
+        create_shipment('TRK001')
+        create_shipment('TRK002')
+        Shipment.objects.filter(tracking_number='TRK001').update(parcel_image='parcel_images/banner.jpg')
+        Shipment.objects.filter(tracking_number='TRK002').update(parcel_image='parcel_images/banner_91aikSj.jpg')
+
+        call_command('collect_media', hash_existing=True, stdout=io.StringIO())
+        names = set(Shipment.objects.values_list('parcel_image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(blob_digest(name))
+        self.assertEqual(self.refs(name), 2)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'parcel_images')), [])
 
-# Create your tests here.
@@ -0,0 +1,167 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .lookups import tracking_number_may_exist
+from .models import Shipment
+from .templatetags.tracker_extras import get_status_percentage, get_timeline_data
+
+
+def _version_query(tracking_number):
+    return Shipment.objects.filter(tracking_number=tracking_number).values_list(
+        'pk', 'last_updated', 'paymentproof__pk', 'paymentproof__is_verified', 'paymentproof__date_uploaded',
+    )
+
+
+def _version(row):
+    if row is None:
+        return None, None
+    pk, last_updated, proof_pk, proof_verified, proof_uploaded = row
+    etag = f'{pk}-{last_updated.timestamp():.6f}-{proof_pk or 0}-{int(bool(proof_verified))}'
+    return etag, max(filter(None, [last_updated, proof_uploaded]))
+
+
+def tracking_version(request, tracking_number):
+    """(etag, last_modified) for a tracking number, or (None, None) if it is unknown.
+
+    Both come from one query and are remembered on the request, since
+    condition() asks for them separately. The proof columns are part of the
+    ETag because rejecting a proof deletes it without touching the shipment.
+    """
+    versions = request.__dict__.setdefault('_tracking_versions', {})
+    if tracking_number not in versions:
+        row = (
+            _version_query(tracking_number).first()
+            if tracking_number and tracking_number_may_exist(tracking_number) else None
+        )
+        versions[tracking_number] = _version(row)
+    return versions[tracking_number]
+
+
+async def atracking_version(request, tracking_number):
+    """tracking_version for async views, with the query made through the async ORM"""
+    versions = request.__dict__.setdefault('_tracking_versions', {})
+    if tracking_number not in versions:
+        row = (
+            await _version_query(tracking_number).afirst()
+            if tracking_number and await sync_to_async(tracking_number_may_exist)(tracking_number) else None
+        )
+        versions[tracking_number] = _version(row)
+    return versions[tracking_number]
+
+
+def tracking_condition(get_tracking_number):
+    """Answer If-None-Match / If-Modified-Since for a tracking view with a 304 when nothing changed.
+
+    get_tracking_number(request, *args, **kwargs) picks the number out of the
+    request. Responses must be revalidated but browsers may keep them, so
+    polling clients get a bodiless 304 after one cheap query. Async views
+    are supported: their version is looked up before condition() asks for it,
+    since condition() can't await.
+    """
+    def decorator(view):
+        conditional = condition(
+            etag_func=lambda request, *args, **kwargs: tracking_version(
+                request, get_tracking_number(request, *args, **kwargs))[0],
+            last_modified_func=lambda request, *args, **kwargs: tracking_version(
+                request, get_tracking_number(request, *args, **kwargs))[1],
+        )
+
+        if iscoroutinefunction(view):
+            @conditional
+            @wraps(view)
+            async def checked(request, *args, **kwargs):
+                response = await view(request, *args, **kwargs)
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                await atracking_version(request, get_tracking_number(request, *args, **kwargs))
+                return await checked(request, *args, **kwargs)
+            return async_wrapper
+
+        @conditional
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _with_proof(shipment):
+    if shipment is None:
+        return None, None
+    try:
+        return shipment, shipment.paymentproof
+    except Shipment.paymentproof.RelatedObjectDoesNotExist:
+        return shipment, None
+
+
+def get_shipment_with_proof(tracking_number):
+    """(shipment, payment proof or None) in one query via the reverse one-to-one join"""
+    return _with_proof(Shipment.objects.select_related('paymentproof').filter(tracking_number=tracking_number).first())
+
+
+async def aget_shipment_with_proof(tracking_number):
+    return _with_proof(
+        await Shipment.objects.select_related('paymentproof').filter(tracking_number=tracking_number).afirst()
+    )
+
+
+def event_payload(event):
+    return {
+        'timestamp': event.timestamp.isoformat(),
+        'status': event.status,
+        'status_display': event.get_status_display(),
+        'location': event.location,
+        'remarks': event.remarks,
+    }
+
+
+def live_payload(shipment, event):
+    """What the live stream pushes when a shipment moves: its new status and location and the event.
+
+    Only status and location (which the caller has loaded) are read from the
+    shipment, so bulk writers can pass rows loaded with only().
+    """
+    return {
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'progress': get_status_percentage(shipment.status),
+        'current_location': shipment.current_location,
+        'event': event_payload(event),
+    }
+
+
+def tracking_payload(shipment, proof, events=()):
+    """Public tracking data for the JSON API, the same facts result.html shows"""
+    return {
+        'tracking_number': shipment.tracking_number,
+        'status': shipment.status,
+        'status_display': shipment.get_status_display(),
+        'progress': get_status_percentage(shipment.status),
+        'origin': shipment.origin,
+        'destination': shipment.destination,
+        'current_location': shipment.current_location,
+        'estimated_delivery': shipment.estimated_delivery.isoformat() if shipment.estimated_delivery else None,
+        'date_created': shipment.date_created.isoformat(),
+        'last_updated': shipment.last_updated.isoformat(),
+        'timeline': [
+            {key: step[key] for key in ('key', 'name', 'description', 'active', 'completed')}
+            for step in get_timeline_data(shipment)
+        ],
+        'events': [event_payload(event) for event in events],
+        'payment': {
+            'required': shipment.require_payment,
+            'status': shipment.payment_status,
+            'status_display': shipment.get_payment_status_display(),
+            'proof_uploaded': proof is not None,
+            'proof_verified': bool(proof and proof.is_verified),
+        },
+    }
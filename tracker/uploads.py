@@ -0,0 +1,201 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from PIL import Image as PILImage, ImageOps
+
+from .blobs import add_refs, collect_blobs
+from .models import PaymentProof, Shipment
+from .page_cache import invalidate_result_page
+
+# Formats accepted for proofs and parcel photos, as Pillow names them
+UPLOAD_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+# info keys carrying camera, location or editing metadata
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'Comment')
+
+# Model -> its (image, thumbnail, WebP rendition, width, height) fields
+RENDITION_FIELDS = {
+    PaymentProof: ('image', 'thumbnail', 'webp', 'image_width', 'image_height'),
+    Shipment: ('parcel_image', 'parcel_thumbnail', 'parcel_webp', 'parcel_image_width', 'parcel_image_height'),
+}
+
+
+def read_image_header(uploaded_file):
+    """(format, width, height, has metadata) from the file's header, without decoding pixels.
+
+    Raises ValidationError for files that aren't an accepted image or are
+    too large in bytes or pixels (decompression bombs).
+    """
+    max_bytes = getattr(settings, 'UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+    if uploaded_file.size is not None and uploaded_file.size > max_bytes:
+        raise ValidationError(f'Images must be under {max_bytes // (1024 * 1024)} MB.', code='file_too_large')
+    uploaded_file.seek(0)
+    try:
+        with PILImage.open(uploaded_file) as img:
+            image_format, (width, height) = img.format, img.size
+            has_metadata = bool(img.getexif()) or any(key in img.info for key in METADATA_KEYS)
+    except (OSError, ValueError, PILImage.DecompressionBombError):
+        raise ValidationError('Upload a valid JPEG, PNG, WebP or GIF image.', code='invalid_image')
+    finally:
+        uploaded_file.seek(0)
+    if image_format not in UPLOAD_FORMATS:
+        raise ValidationError('Upload a valid JPEG, PNG, WebP or GIF image.', code='invalid_image')
+    if width * height > getattr(settings, 'UPLOAD_MAX_PIXELS', 40_000_000):
+        raise ValidationError('This image has too many pixels.', code='image_too_large')
+    return image_format, width, height, has_metadata
+
+
+def clean_image_upload(uploaded_file):
+    """Validate an uploaded image and return it ready to store: no metadata, at most UPLOAD_MAX_DIMENSION.
+
+    Files that are already clean and small enough are stored untouched;
+    others are decoded once, turned upright, shrunk and re-encoded in their
+    own format without EXIF, GPS or comments.
+    """
+    image_format, width, height, has_metadata = read_image_header(uploaded_file)
+    max_dimension = getattr(settings, 'UPLOAD_MAX_DIMENSION', 2560)
+    if not has_metadata and max(width, height) <= max_dimension:
+        return uploaded_file
+
+    with PILImage.open(uploaded_file) as img:
+        if getattr(img, 'n_frames', 1) > 1:
+            return uploaded_file  # Animated GIFs carry no EXIF; re-encoding would drop frames
+        icc_profile = img.info.get('icc_profile')
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), PILImage.LANCZOS)
+        options = {'icc_profile': icc_profile} if icc_profile else {}
+        if image_format == 'JPEG':
+            img = img.convert('RGB')
+            options.update(quality=getattr(settings, 'UPLOAD_JPEG_QUALITY', 85), optimize=True)
+        elif image_format == 'PNG':
+            options.update(optimize=True)
+        buffer = io.BytesIO()
+        img.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue(), name=os.path.basename(uploaded_file.name))
+
+
+def rendition_images(path):
+    """(thumbnail, WebP rendition, (width, height)) of the upright image at path, renditions as WebP bytes"""
+    with PILImage.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        size = img.size
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        quality = getattr(settings, 'WEBP_QUALITY', 80)
+
+        thumbnail = ImageOps.fit(img, getattr(settings, 'THUMBNAIL_SIZE', (320, 320)), PILImage.LANCZOS)
+        max_dimension = getattr(settings, 'WEBP_MAX_DIMENSION', 1600)
+        img.thumbnail((max_dimension, max_dimension), PILImage.LANCZOS)
+
+        encoded = []
+        for image in (thumbnail, img):
+            buffer = io.BytesIO()
+            image.save(buffer, 'WEBP', quality=quality, method=4)
+            encoded.append(buffer.getvalue())
+    return encoded[0], encoded[1], size
+
+
+def build_renditions(model, pk):
+    """Write a row's thumbnail and WebP rendition and record them with its dimensions.
+
+    Nothing is recorded if the image was replaced in the meantime.
+    """
+    image_field, thumbnail_field, webp_field, width_field, height_field = RENDITION_FIELDS[model]
+    tracking_number_field = 'tracking_number' if model is Shipment else 'shipment__tracking_number'
+    row = model.objects.filter(pk=pk).values_list(image_field, thumbnail_field, tracking_number_field).first()
+    if row is None or not row[0] or row[1]:
+        return
+    name, _, tracking_number = row
+    storage = model._meta.get_field(image_field).storage
+    try:
+        thumbnail, webp, (width, height) = rendition_images(storage.path(name))
+    except (OSError, ValueError):
+        return  # Missing or not something Pillow can read; pages keep showing the original
+
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    thumbnail_name = storage.save(f'{directory}/thumbs/{stem}.webp', ContentFile(thumbnail))
+    webp_name = storage.save(f'{directory}/webp/{stem}.webp', ContentFile(webp))
+    with transaction.atomic():
+        updated = model.objects.filter(pk=pk, **{image_field: name}).update(
+            **{thumbnail_field: thumbnail_name, webp_field: webp_name, width_field: width, height_field: height}
+        )
+        if updated:  # Queryset updates send no signals, so count the references here
+            add_refs([thumbnail_name, webp_name])
+    if not updated:  # Replaced while we worked; its own job builds the new ones
+        collect_blobs([thumbnail_name, webp_name])
+        return
+    invalidate_result_page(tracking_number)
+
+
+def _build_in_worker(model, pk):
+    try:
+        build_renditions(model, pk)
+    finally:
+        # Worker threads get their own connection; don't leave it open between jobs
+        connection.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_rendition_pool():
+    """Threads building renditions, or None to build them in the caller (UPLOAD_RENDITION_WORKERS=0)"""
+    global _pool
+    workers = getattr(settings, 'UPLOAD_RENDITION_WORKERS', 2)
+    if not workers:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-renditions')
+    return _pool
+
+
+def schedule_renditions(model, pk):
+    """Build a row's renditions in the worker pool; Pillow releases the GIL while it resizes and encodes"""
+    pool = get_rendition_pool()
+    if pool is None:
+        build_renditions(model, pk)
+    else:
+        pool.submit(_build_in_worker, model, pk)
+
+
+def build_missing_renditions(workers=None):
+    """Build renditions for every stored image that has none, e.g. uploads from before they existed.
+
+    Returns how many images were looked at; ones whose file is missing or
+    unreadable are left without renditions.
+    """
+    if workers is None:
+        workers = getattr(settings, 'UPLOAD_RENDITION_WORKERS', 2)
+    jobs = [
+        (model, pk)
+        for model, (image_field, thumbnail_field, *_) in RENDITION_FIELDS.items()
+        for pk in model.objects.exclude(**{f'{image_field}__isnull': True}).exclude(**{image_field: ''})
+        .filter(Q(**{thumbnail_field: ''}) | Q(**{f'{thumbnail_field}__isnull': True})).values_list('pk', flat=True)
+    ]
+    if not workers:
+        for job in jobs:
+            build_renditions(*job)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-renditions') as pool:
+            list(pool.map(lambda job: _build_in_worker(*job), jobs))
+    return len(jobs)
+
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _pool
+    if setting == 'UPLOAD_RENDITION_WORKERS' and _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
@@ -1,14 +1,27 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
+# ASGI deployments get the async versions of the busiest public pages
+if getattr(settings, 'ASYNC_PUBLIC_VIEWS', False):
+    home, track_shipment, print_preview, print_tracking_pdf = (
+        views.ahome, views.atrack_shipment, views.aprint_preview, views.aprint_tracking_pdf)
+else:
+    home, track_shipment, print_preview, print_tracking_pdf = (
+        views.home, views.track_shipment, views.print_preview, views.print_tracking_pdf)
+
 urlpatterns = [
     # Public routes
-    path('', views.home, name='home'),
-    path('track/', views.track_shipment, name='track_shipment'),
+    path('', home, name='home'),
+    path('track/', track_shipment, name='track_shipment'),
+    path('api/track/<str:tracking_number>/', views.track_api, name='track_api'),
+    path('api/track/<str:tracking_number>/stream/', views.track_stream, name='track_stream'),
     path('upload-proof/<str:tracking_number>/', views.upload_payment_proof, name='upload_proof'),
-    path('print-preview/<str:tracking_number>/', views.print_preview, name='print_preview'),
-    path('print/<str:tracking_number>/', views.print_tracking_pdf, name='print_pdf'),
+    path('print-preview/<str:tracking_number>/', print_preview, name='print_preview'),
+    path('print/<str:tracking_number>/', print_tracking_pdf, name='print_pdf'),
+    path('print/<str:tracking_number>/async/', views.print_pdf_async, name='print_pdf_async'),
+    path('print/<str:tracking_number>/status/', views.print_pdf_status, name='print_pdf_status'),
     
     # Admin Authentication routes - CHANGED FROM 'admin/login/' TO 'auth/login/'
     path('auth/login/', auth_views.LoginView.as_view(template_name='tracker/admin/login.html'), name='admin_login'),
@@ -17,12 +30,18 @@ urlpatterns = [
     # Admin dashboard routes - PROTECTED
     path('dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('dashboard/shipments/', views.admin_shipments, name='admin_shipments'),
+    path('dashboard/shipments/export-pdf/', views.admin_export_shipments_pdf, name='admin_export_shipments_pdf'),
+    path('dashboard/shipments/import/', views.admin_import_shipments, name='admin_import_shipments'),
+    path('dashboard/shipments/scans/', views.admin_scan_updates, name='admin_scan_updates'),
     path('dashboard/shipments/create/', views.admin_create_shipment, name='admin_create_shipment'),
     path('dashboard/shipments/edit/<int:shipment_id>/', views.admin_edit_shipment, name='admin_edit_shipment'),
     path('dashboard/shipments/delete/<int:shipment_id>/', views.admin_delete_shipment, name='admin_delete_shipment'),
     path('dashboard/payments/', views.admin_payments, name='admin_payments'),
+    path('dashboard/payments/bulk/', views.bulk_payment_action, name='bulk_payment_action'),
     path('dashboard/verify-payment/<int:proof_id>/', views.verify_payment, name='verify_payment'),
     path('dashboard/reject-payment/<int:proof_id>/', views.reject_payment, name='reject_payment'),
     path('dashboard/stats/', views.admin_stats, name='admin_stats'),
     path('dashboard/settings/', views.admin_settings, name='admin_settings'),
+    path('dashboard/cache-stats/', views.admin_cache_stats, name='admin_cache_stats'),
+    path('dashboard/metrics/', views.admin_view_metrics, name='admin_view_metrics'),
 ]
\ No newline at end of file
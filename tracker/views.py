@@ -1,16 +1,20 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.urls import reverse
 from .models import Shipment, PaymentProof, PDFStamp, SiteSettings
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch, cm
-from reportlab.lib.utils import ImageReader
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib import colors
-from io import BytesIO
-import os
+from .forms import PaymentProofForm
+from .events import arecent_events, recent_events
+from .live import serves_live_stream, stream_updates
+from .lookups import remember_unknown, tracking_number_may_exist
+from .metrics import view_metrics
+from .page_cache import cache_result_page, result_page_metrics
+from .pdf_cache import aget_tracking_pdf, get_pdf_cache, get_tracking_pdf, pdf_cache_key
+from .pdf_queue import get_pdf_queue
+from .report import build_report
+from .tracking import aget_shipment_with_proof, get_shipment_with_proof, tracking_condition, tracking_payload
 
 def home(request):
     site_settings = SiteSettings.load()
@@ -19,31 +23,71 @@ def home(request):
     }
     return render(request, 'tracker/home.html', context)
 
+@tracking_condition(lambda request: request.GET.get('tracking_number'))
+@cache_result_page(lambda request: request.GET.get('tracking_number'))
 def track_shipment(request):
     tracking_number = request.GET.get('tracking_number')
     shipment = None
     proof_uploaded = None
+    events = []
     
-    if tracking_number:
-        shipment = Shipment.objects.filter(tracking_number=tracking_number).first()
-        if shipment:
-            proof_uploaded = PaymentProof.objects.filter(shipment=shipment).first()
+    # Unknown numbers (typos, scrapers) are turned away without a query
+    if tracking_number and tracking_number_may_exist(tracking_number):
+        shipment, proof_uploaded = get_shipment_with_proof(tracking_number)
+        if shipment is None:
+            remember_unknown(tracking_number)
+        else:
+            events = recent_events(shipment)
     
     context = {
         'shipment': shipment,
         'proof_uploaded': proof_uploaded,
-        'tracking_number': tracking_number
+        'events': events,
+        'tracking_number': tracking_number,
+        'live_stream': serves_live_stream(request),
     }
     return render(request, 'tracker/result.html', context)
 
+@tracking_condition(lambda request, tracking_number: tracking_number)
+def track_api(request, tracking_number):
+    """Tracking data as JSON; pollers revalidate with If-None-Match and usually get a 304"""
+    shipment = proof = None
+    if tracking_number_may_exist(tracking_number):
+        shipment, proof = get_shipment_with_proof(tracking_number)
+    if shipment is None:
+        remember_unknown(tracking_number)
+        return JsonResponse({'error': 'Shipment not found'}, status=404)
+    return JsonResponse(tracking_payload(shipment, proof, recent_events(shipment)))
+
+async def track_stream(request, tracking_number):
+    """Server-Sent Events pushing a shipment's status and location changes as they are saved.
+
+    Open streams wait on the in-process hub and cost no queries. A stream
+    stays open for LIVE_STREAM_TIMEOUT seconds and EventSource then
+    reconnects with Last-Event-ID. Under WSGI an open stream would hold a
+    worker thread, so the answer is 204, which tells EventSource to stop
+    reconnecting; result pages served there poll track_api instead.
+    """
+    if not serves_live_stream(request):
+        return HttpResponse(status=204)
+    if not await sync_to_async(tracking_number_may_exist)(tracking_number):
+        return JsonResponse({'error': 'Shipment not found'}, status=404)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    stream = stream_updates(tracking_number, last_event_id, getattr(settings, 'LIVE_STREAM_TIMEOUT', 300))
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from holding the events back
+    return response
+
 def upload_payment_proof(request, tracking_number):
     shipment = get_object_or_404(Shipment, tracking_number=tracking_number)
     
-    if request.method == 'POST' and request.FILES.get('proof'):
+    form = PaymentProofForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
         PaymentProof.objects.update_or_create(
             shipment=shipment,
             defaults={
-                'image': request.FILES['proof'],
+                'image': form.cleaned_data['proof'],
                 'is_verified': False
             }
         )
@@ -51,276 +95,133 @@ def upload_payment_proof(request, tracking_number):
         shipment.save()
         return redirect(f'/track/?tracking_number={tracking_number}')
     
-    return render(request, 'tracker/upload_payment.html', {'shipment': shipment})
+    return render(request, 'tracker/upload_payment.html', {'shipment': shipment, 'form': form})
 
 def print_preview(request, tracking_number):
     """PDF Preview Page"""
     shipment = get_object_or_404(Shipment, tracking_number=tracking_number)
-    return render(request, 'tracker/print_preview.html', {'shipment': shipment})
+    site_settings = SiteSettings.load()
+    active_stamp = PDFStamp.objects.filter(is_active=True).first()
+    context = {
+        'shipment': shipment,
+        'report': build_report(shipment, site_settings, active_stamp),
+        'pdf_async': getattr(settings, 'PDF_ASYNC_ENABLED', False),
+    }
+    return render(request, 'tracker/print_preview.html', context)
 
 def print_tracking_pdf(request, tracking_number):
     """Generate PDF for shipment tracking details with stamps and signatures"""
     shipment = get_object_or_404(Shipment, tracking_number=tracking_number)
     site_settings = SiteSettings.load()  # Get the site settings
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch, bottomMargin=1*inch)
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1,  # Center aligned
-        textColor=colors.HexColor('#1E40AF')
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceAfter=12,
-        textColor=colors.HexColor('#1E40AF')
-    )
-    
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6
-    )
-    
-    bold_style = ParagraphStyle(
-        'CustomBold',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6,
-        fontName='Helvetica-Bold'
-    )
-    
-    story = []
-    
-    # Add Company Logo and Header - NOW USING DYNAMIC SETTINGS
-    try:
-        if site_settings.company_logo:
-            logo = Image(site_settings.company_logo.path, width=2*inch, height=1*inch)
-            story.append(logo)
-            story.append(Spacer(1, 10))
-    except:
-        pass
-    
-    # Use dynamic company name instead of hardcoded "GLOBALTRACK PRO"
-    header_style = ParagraphStyle(
-        'Header',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#2563EB'),
-        alignment=1,
-        spaceAfter=10
-    )
-    story.append(Paragraph(site_settings.company_name.upper(), header_style))
-    story.append(Paragraph("Professional Shipping & Logistics", normal_style))
-    story.append(Spacer(1, 20))
-    
-    # Title - USING DYNAMIC PDF HEADER TITLE
-    story.append(Paragraph(site_settings.pdf_header_title, title_style))
-    story.append(Spacer(1, 20))
-    
-    # Tracking Info Table - Fixed to remove HTML tags
-    tracking_data = [
-        ['Tracking Number:', shipment.tracking_number, 'Status:', shipment.get_status_display()],
-        ['Date Created:', shipment.date_created.strftime('%Y-%m-%d %H:%M'), 'Last Updated:', shipment.last_updated.strftime('%Y-%m-%d %H:%M')],
-    ]
-    
-    if shipment.estimated_delivery:
-        tracking_data.append(['Estimated Delivery:', shipment.estimated_delivery.strftime('%Y-%m-%d'), '', ''])
-    
-    tracking_table = Table(tracking_data, colWidths=[2*inch, 2.5*inch, 1.5*inch, 2*inch])
-    tracking_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E5E7EB')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(tracking_table)
-    story.append(Spacer(1, 20))
-    
-    # Sender and Receiver Information - Fixed to remove HTML tags
-    story.append(Paragraph("SENDER & RECEIVER INFORMATION", heading_style))
-    
-    contact_data = [
-        ['SENDER INFORMATION', 'RECEIVER INFORMATION'],
-        [f"Name: {shipment.sender_name}", f"Name: {shipment.receiver_name}"],
-        [f"Address: {shipment.sender_address}", f"Address: {shipment.receiver_address}"],
-        [f"Email: {shipment.sender_email}", f"Email: {shipment.receiver_email}"],
-        [f"Phone: {shipment.sender_phone}", f"Phone: {shipment.receiver_phone}"],
-    ]
-    
-    contact_table = Table(contact_data, colWidths=[3.5*inch, 3.5*inch])
-    contact_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#1E40AF')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.white),
-        ('ALIGN', (0, 0), (1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (1, 0), 11),
-        ('BACKGROUND', (0, 1), (1, -1), colors.white),
-        ('FONTNAME', (0, 1), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (1, -1), 9),
-        ('GRID', (0, 0), (1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (1, -1), 'TOP'),
-    ]))
-    story.append(contact_table)
-    story.append(Spacer(1, 20))
-    
-    # Shipment Details
-    story.append(Paragraph("SHIPMENT DETAILS", heading_style))
-    
-    shipment_data = [
-        ['Origin:', shipment.origin, 'Destination:', shipment.destination],
-        ['Current Location:', shipment.current_location, 'Parcel Weight:', f"{shipment.parcel_weight} kg"],
-    ]
-    
-    if shipment.parcel_description:
-        shipment_data.append(['Description:', shipment.parcel_description, '', ''])
-    
-    shipment_table = Table(shipment_data, colWidths=[1.5*inch, 2.5*inch, 1.5*inch, 2*inch])
-    shipment_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E5E7EB')),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-    ]))
-    story.append(shipment_table)
-    story.append(Spacer(1, 15))
-    
-    # Payment Information (if required and shown)
-    if shipment.require_payment and shipment.show_payment_info:
-        story.append(Paragraph("PAYMENT INFORMATION", heading_style))
-        
-        payment_data = [
-            ['Payment Method:', shipment.get_payment_method_display().upper(), 'Payment Status:', shipment.get_payment_status_display()],
-            ['Shipment Cost:', f"${shipment.shipment_cost}", 'Clearance Cost:', f"${shipment.clearance_cost}"],
-            ['Total Amount:', f"${shipment.total_cost}", 'Wallet Address:', shipment.crypto_wallet],
-        ]
-        
-        payment_table = Table(payment_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2.5*inch])
-        payment_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E5E7EB')),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('FONTNAME', (2, 2), (2, 2), 'Helvetica-Bold'),  # Make Total Amount bold
-        ]))
-        story.append(payment_table)
-        story.append(Spacer(1, 15))
-    
-    # Remarks - Fixed to remove HTML tags
-    if shipment.remarks:
-        story.append(Paragraph("REMARKS", heading_style))
-        # Clean the remarks text by removing any HTML tags
-        clean_remarks = shipment.remarks.replace('<b>', '').replace('</b>', '')
-        story.append(Paragraph(clean_remarks, normal_style))
-        story.append(Spacer(1, 20))
-    
-    # Add parcel image if exists
-    if shipment.parcel_image:
-        story.append(Paragraph("PARCEL IMAGE", heading_style))
-        try:
-            parcel_img = Image(shipment.parcel_image.path, width=4*inch, height=3*inch)
-            story.append(parcel_img)
-            story.append(Spacer(1, 15))
-        except:
-            pass
-    
-    # Add stamps and signatures
     active_stamp = PDFStamp.objects.filter(is_active=True).first()
-    if active_stamp:
-        story.append(Spacer(1, 30))
-        
-        # Create stamp table
-        stamp_elements = []
-        
-        # Add stamp image if exists
-        if active_stamp.stamp_image:
-            try:
-                stamp_img = Image(active_stamp.stamp_image.path, width=1.5*inch, height=1.5*inch)
-                stamp_elements.append(stamp_img)
-            except:
-                stamp_elements.append(Paragraph("OFFICIAL STAMP", bold_style))
-        else:
-            stamp_elements.append(Paragraph("OFFICIAL STAMP", bold_style))
-        
-        # Add signature image if exists
-        if active_stamp.signature_image:
-            try:
-                signature_img = Image(active_stamp.signature_image.path, width=2*inch, height=0.5*inch)
-                stamp_elements.append(signature_img)
-            except:
-                stamp_elements.append(Paragraph("AUTHORIZED SIGNATURE", bold_style))
-        else:
-            stamp_elements.append(Paragraph("AUTHORIZED SIGNATURE", bold_style))
-        
-        # Create a table for stamps and signatures
-        stamp_data = [
-            ['', ''],
-            stamp_elements,
-            ['Official Stamp', 'Authorized Signature']
-        ]
-        
-        stamp_table = Table(stamp_data, colWidths=[3*inch, 3*inch])
-        stamp_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 2), (-1, 2), 10),
-            ('VALIGN', (0, 1), (-1, 1), 'MIDDLE'),
-        ]))
-        story.append(stamp_table)
-    
-    # Footer with DYNAMIC company information
-    story.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.gray,
-        alignment=1
-    )
     
-    company_info_style = ParagraphStyle(
-        'CompanyInfo',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.black,
-        alignment=1,
-        spaceAfter=3
-    )
+    pdf = get_tracking_pdf(shipment, site_settings, active_stamp)
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="tracking_{tracking_number}.pdf"'
+    return response
+
+def _pdf_is_cached(shipment):
+    site_settings = SiteSettings.load()
+    active_stamp = PDFStamp.objects.filter(is_active=True).first()
+    return get_pdf_cache().contains(pdf_cache_key(shipment, site_settings, active_stamp))
+
+def _pdf_status_response(shipment, status=200):
+    tracking_number = shipment.tracking_number
+    if _pdf_is_cached(shipment):
+        state = 'ready'
+    else:
+        # 'done' without a cached PDF: built for a version that has since changed, or evicted
+        state = get_pdf_queue().status(tracking_number) or 'missing'
+    
+    return JsonResponse({
+        'tracking_number': tracking_number,
+        'status': state,
+        'status_url': reverse('print_pdf_status', args=[tracking_number]),
+        'download_url': reverse('print_pdf', args=[tracking_number]),
+    }, status=status)
+
+def print_pdf_async(request, tracking_number):
+    """Queue a background PDF build and report where to poll for it"""
+    if not getattr(settings, 'PDF_ASYNC_ENABLED', False):
+        raise Http404("Asynchronous PDF generation is disabled")
+    shipment = get_object_or_404(Shipment, tracking_number=tracking_number)
     
-    # USING DYNAMIC SITE SETTINGS FOR FOOTER
-    story.append(Paragraph(site_settings.company_name, company_info_style))
-    story.append(Paragraph(f"Email: {site_settings.contact_email} | Phone: {site_settings.contact_phone}", footer_style))
-    story.append(Paragraph(site_settings.website_url, footer_style))
-    story.append(Spacer(1, 10))
-    story.append(Paragraph(site_settings.pdf_footer_text, footer_style))
-    story.append(Paragraph("Thank you for using our services!", footer_style))
+    if not _pdf_is_cached(shipment):
+        get_pdf_queue().enqueue(tracking_number)
+    return _pdf_status_response(shipment, status=202)
+
+def print_pdf_status(request, tracking_number):
+    """Report whether the background PDF for a shipment is ready to download"""
+    if not getattr(settings, 'PDF_ASYNC_ENABLED', False):
+        raise Http404("Asynchronous PDF generation is disabled")
+    shipment = get_object_or_404(Shipment, tracking_number=tracking_number)
+    return _pdf_status_response(shipment)
+
+# Async versions of the public pages, routed instead of the ones above when
+# ASYNC_PUBLIC_VIEWS is set for an ASGI deployment: a burst of /track/ traffic then
+# waits on the event loop rather than on a capped pool of threads. Helpers that may
+# query (the tracking number filter, SiteSettings.load) are called through
+# sync_to_async, and so is rendering, since the site_settings context processor may
+# query too. Under WSGI each would pay for an event loop, hence the setting.
+arender = sync_to_async(render)
+
+async def ahome(request):
+    site_settings = await sync_to_async(SiteSettings.load)()
+    context = {
+        'site_settings': site_settings
+    }
+    return await arender(request, 'tracker/home.html', context)
+
+@tracking_condition(lambda request: request.GET.get('tracking_number'))
+@cache_result_page(lambda request: request.GET.get('tracking_number'))
+async def atrack_shipment(request):
+    tracking_number = request.GET.get('tracking_number')
+    shipment = None
+    proof_uploaded = None
+    events = []
     
-    doc.build(story)
+    # Unknown numbers (typos, scrapers) are turned away without a query
+    if tracking_number and await sync_to_async(tracking_number_may_exist)(tracking_number):
+        shipment, proof_uploaded = await aget_shipment_with_proof(tracking_number)
+        if shipment is None:
+            await sync_to_async(remember_unknown)(tracking_number)
+        else:
+            events = await arecent_events(shipment)
     
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
+    context = {
+        'shipment': shipment,
+        'proof_uploaded': proof_uploaded,
+        'events': events,
+        'tracking_number': tracking_number,
+        'live_stream': serves_live_stream(request),
+    }
+    return await arender(request, 'tracker/result.html', context)
+
+async def aprint_preview(request, tracking_number):
+    shipment = await aget_object_or_404(Shipment, tracking_number=tracking_number)
+    site_settings = await sync_to_async(SiteSettings.load)()
+    active_stamp = await PDFStamp.objects.filter(is_active=True).afirst()
+    context = {
+        'shipment': shipment,
+        'report': build_report(shipment, site_settings, active_stamp),
+        'pdf_async': getattr(settings, 'PDF_ASYNC_ENABLED', False),
+    }
+    return await arender(request, 'tracker/print_preview.html', context)
+
+async def aprint_tracking_pdf(request, tracking_number):
+    """print_tracking_pdf, rendering in the bounded PDF thread pool"""
+    shipment = await aget_object_or_404(Shipment, tracking_number=tracking_number)
+    site_settings = await sync_to_async(SiteSettings.load)()
+    active_stamp = await PDFStamp.objects.filter(is_active=True).afirst()
+    
+    pdf = await aget_tracking_pdf(shipment, site_settings, active_stamp)
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="tracking_{tracking_number}.pdf"'
     return response
 
 @login_required
 def admin_dashboard(request):
-    shipments = Shipment.objects.all().order_by('-date_created')
+    shipments = Shipment.objects.all().order_by('-date_created', '-id')
     pending_proofs = PaymentProof.objects.filter(is_verified=False)
     
     context = {
@@ -343,15 +244,33 @@ def verify_payment(request, proof_id):
 
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
-from django.utils import timezone
-from datetime import timedelta
 import json
 from .models import Shipment, PaymentProof, PDFStamp
-from .forms import ShipmentForm, PDFStampForm, SiteSettingsForm
+from .forms import ShipmentForm, ShipmentImportForm, ShipmentImportRowForm, PDFStampForm, SiteSettingsForm
+from .imports import detect_format, import_shipments, read_rows
+from .pdf_export import export_response
+from .payments import reject_proofs, verify_proofs
+from .pagination import get_per_page, paginate_by_offset, paginate_newest_first
+from .scans import apply_scans
+from .search import search_shipments
+from .stats import shipment_stats
+
+# Columns the staff list templates read; everything else stays deferred
+SHIPMENT_LIST_FIELDS = (
+    'id', 'tracking_number', 'sender_name', 'receiver_name', 'origin', 'destination',
+    'current_location', 'status', 'payment_status', 'require_payment', 'total_cost',
+    'parcel_image', 'date_created', 'last_updated',
+)
+PROOF_LIST_FIELDS = (
+    'id', 'image', 'thumbnail', 'webp', 'date_uploaded', 'is_verified', 'shipment__tracking_number',
+    'shipment__sender_name', 'shipment__receiver_name', 'shipment__total_cost',
+    'shipment__payment_method',
+)
+# Rejected rows listed on the import page; the rest are only counted
+IMPORT_ERRORS_SHOWN = 200
 
 def admin_required(function=None):
     """Decorator for views that require admin access"""
@@ -367,51 +286,17 @@ def admin_required(function=None):
 @admin_required
 def admin_dashboard(request):
     """Admin dashboard with overview statistics"""
-    # Calculate statistics
-    total_shipments = Shipment.objects.count()
-    pending_shipments = Shipment.objects.filter(status='pending').count()
-    delivered_shipments = Shipment.objects.filter(status='delivered').count()
-    pending_payments = PaymentProof.objects.filter(is_verified=False).count()
-    
-    # Revenue calculations
-    total_revenue = Shipment.objects.filter(payment_status='paid').aggregate(
-        total=Sum('total_cost')
-    )['total'] or 0
+    context = dict(shipment_stats())
+    context['status_stats'] = context['status_distribution']
     
     # Recent shipments
-    recent_shipments = Shipment.objects.all().order_by('-date_created')[:5]
-    
-    # Shipments by status
-    status_stats = Shipment.objects.values('status').annotate(
-        count=Count('id')
-    ).order_by('status')
+    context['recent_shipments'] = Shipment.objects.only(*SHIPMENT_LIST_FIELDS).order_by('-date_created')[:5]
     
-    # Weekly stats
-    week_ago = timezone.now() - timedelta(days=7)
-    weekly_shipments = Shipment.objects.filter(date_created__gte=week_ago).count()
-    weekly_revenue = Shipment.objects.filter(
-        date_created__gte=week_ago, 
-        payment_status='paid'
-    ).aggregate(total=Sum('total_cost'))['total'] or 0
-    
-    context = {
-        'total_shipments': total_shipments,
-        'pending_shipments': pending_shipments,
-        'delivered_shipments': delivered_shipments,
-        'pending_payments': pending_payments,
-        'total_revenue': total_revenue,
-        'weekly_shipments': weekly_shipments,
-        'weekly_revenue': weekly_revenue,
-        'recent_shipments': recent_shipments,
-        'status_stats': status_stats,
-    }
     return render(request, 'tracker/admin/dashboard.html', context)
 
-@login_required
-@admin_required
-def admin_shipments(request):
-    """Manage all shipments"""
-    shipments = Shipment.objects.all().order_by('-date_created')
+def _filter_shipments(request):
+    """Apply the shipment list's status, payment and search filters from the query string"""
+    shipments = Shipment.objects.all().order_by('-date_created', '-id')
     
     # Filtering
     status_filter = request.GET.get('status', '')
@@ -425,20 +310,44 @@ def admin_shipments(request):
     # Search
     search_query = request.GET.get('search', '')
     if search_query:
-        shipments = shipments.filter(
-            Q(tracking_number__icontains=search_query) |
-            Q(sender_name__icontains=search_query) |
-            Q(receiver_name__icontains=search_query)
-        )
+        shipments = search_shipments(shipments, search_query)
+    
+    return shipments, status_filter, payment_filter, search_query
+
+@login_required
+@admin_required
+def admin_shipments(request):
+    """Manage all shipments"""
+    shipments, status_filter, payment_filter, search_query = _filter_shipments(request)
+    shipments = shipments.only(*SHIPMENT_LIST_FIELDS)
+    per_page = get_per_page(request)
     
     context = {
-        'shipments': shipments,
+        # Search results come best match first, so they page by number
+        'shipments': (
+            paginate_by_offset(request, shipments, per_page) if search_query
+            else paginate_newest_first(request, shipments, per_page)
+        ),
         'status_filter': status_filter,
         'payment_filter': payment_filter,
         'search_query': search_query,
+        'per_page': per_page,
+        'page_sizes': settings.ADMIN_PAGE_SIZES,
     }
     return render(request, 'tracker/admin/shipments.html', context)
 
+@login_required
+@admin_required
+def admin_export_shipments_pdf(request):
+    """Download tracking reports for the filtered shipments as a ZIP or one merged PDF"""
+    shipments = _filter_shipments(request)[0]
+    export_format = 'pdf' if request.GET.get('format') == 'pdf' else 'zip'
+    try:
+        return export_response(shipments, export_format)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('admin_shipments')
+
 @login_required
 @admin_required
 def admin_create_shipment(request):
@@ -455,6 +364,48 @@ def admin_create_shipment(request):
     context = {'form': form}
     return render(request, 'tracker/admin/shipment_form.html', context)
 
+@login_required
+@admin_required
+def admin_import_shipments(request):
+    """Create shipments in bulk from an uploaded CSV or JSON Lines file"""
+    result = None
+    if request.method == 'POST':
+        form = ShipmentImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            result = import_shipments(read_rows(upload.file, detect_format(upload.name)))
+            if result.created:
+                messages.success(request, f'Imported {result.created} shipments.')
+            if result.errors:
+                messages.error(request, f'{len(result.errors)} rows were rejected, see below.')
+    else:
+        form = ShipmentImportForm()
+    
+    context = {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+        'fields': ShipmentImportRowForm.Meta.fields,
+    }
+    return render(request, 'tracker/admin/import_shipments.html', context)
+
+@login_required
+@admin_required
+def admin_scan_updates(request):
+    """Apply courier scans posted as JSON: a list of {tracking_number, status, current_location, remarks}"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        scans = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    if isinstance(scans, dict):
+        scans = scans.get('scans')
+    if not isinstance(scans, list):
+        return JsonResponse({'error': 'Expected a list of scans or {"scans": [...]}'}, status=400)
+    result = apply_scans(enumerate(scans, 1))
+    return JsonResponse(result.as_dict())
+
 @login_required
 @admin_required
 def admin_edit_shipment(request, shipment_id):
@@ -492,8 +443,9 @@ def admin_delete_shipment(request, shipment_id):
 @admin_required
 def admin_payments(request):
     """Manage payment proofs"""
-    pending_proofs = PaymentProof.objects.filter(is_verified=False).order_by('-date_uploaded')
-    verified_proofs = PaymentProof.objects.filter(is_verified=True).order_by('-date_uploaded')[:10]
+    proofs = PaymentProof.objects.select_related('shipment').only(*PROOF_LIST_FIELDS)
+    pending_proofs = proofs.filter(is_verified=False).order_by('-date_uploaded')
+    verified_proofs = proofs.filter(is_verified=True).order_by('-date_uploaded')[:10]
     
     context = {
         'pending_proofs': pending_proofs,
@@ -505,85 +457,69 @@ def admin_payments(request):
 @admin_required
 def verify_payment(request, proof_id):
     """Verify payment proof"""
-    proof = get_object_or_404(PaymentProof, id=proof_id)
-    proof.is_verified = True
-    proof.save()
-    
-    shipment = proof.shipment
-    shipment.payment_status = 'paid'
-    shipment.save()
+    tracking_numbers = verify_proofs(PaymentProof.objects.filter(id=proof_id))
+    if not tracking_numbers:
+        raise Http404('No payment proof found')
     
-    messages.success(request, f'Payment for {shipment.tracking_number} verified successfully!')
+    messages.success(request, f'Payment for {tracking_numbers[0]} verified successfully!')
     return redirect('admin_payments')
 
 @login_required
 @admin_required
 def reject_payment(request, proof_id):
     """Reject payment proof"""
-    proof = get_object_or_404(PaymentProof, id=proof_id)
-    tracking_number = proof.shipment.tracking_number
-    proof.delete()
+    tracking_numbers = reject_proofs(PaymentProof.objects.filter(id=proof_id))
+    if not tracking_numbers:
+        raise Http404('No payment proof found')
+    tracking_number = tracking_numbers[0]
     
     messages.success(request, f'Payment proof for {tracking_number} rejected and removed!')
     return redirect('admin_payments')
 
+@login_required
+@admin_required
+def bulk_payment_action(request):
+    """Verify or reject the payment proofs ticked on the payments page"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    proof_ids = [value for value in request.POST.getlist('proof_ids') if value.isdigit()]
+    action = request.POST.get('action')
+    if action not in ('verify', 'reject') or not proof_ids:
+        messages.error(request, 'Select at least one payment proof and an action.')
+        return redirect('admin_payments')
+    
+    proofs = PaymentProof.objects.filter(id__in=proof_ids)
+    if action == 'verify':
+        count = len(verify_proofs(proofs))
+        messages.success(request, f'{count} payment(s) verified successfully!')
+    else:
+        count = len(reject_proofs(proofs))
+        messages.success(request, f'{count} payment proof(s) rejected and removed!')
+    return redirect('admin_payments')
+
 @login_required
 @admin_required
 def admin_stats(request):
     """Detailed statistics and analytics"""
-    # Time-based statistics
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    # Shipment statistics
-    total_shipments = Shipment.objects.count()
-    today_shipments = Shipment.objects.filter(date_created__date=today).count()
-    weekly_shipments = Shipment.objects.filter(date_created__date__gte=week_ago).count()
-    monthly_shipments = Shipment.objects.filter(date_created__date__gte=month_ago).count()
-    
-    # Revenue statistics
-    total_revenue = Shipment.objects.filter(payment_status='paid').aggregate(
-        total=Sum('total_cost')
-    )['total'] or 0
-    
-    weekly_revenue = Shipment.objects.filter(
-        date_created__date__gte=week_ago,
-        payment_status='paid'
-    ).aggregate(total=Sum('total_cost'))['total'] or 0
-    
-    monthly_revenue = Shipment.objects.filter(
-        date_created__date__gte=month_ago,
-        payment_status='paid'
-    ).aggregate(total=Sum('total_cost'))['total'] or 0
-    
-    # Status distribution
-    status_distribution = Shipment.objects.values('status').annotate(
-        count=Count('id')
-    ).order_by('status')
-    
-    # Payment status distribution
-    payment_distribution = Shipment.objects.values('payment_status').annotate(
-        count=Count('id')
-    ).order_by('payment_status')
+    context = dict(shipment_stats())
     
     # Recent activity
-    recent_activity = Shipment.objects.all().order_by('-last_updated')[:10]
+    context['recent_activity'] = Shipment.objects.only(*SHIPMENT_LIST_FIELDS).order_by('-last_updated')[:10]
     
-    context = {
-        'total_shipments': total_shipments,
-        'today_shipments': today_shipments,
-        'weekly_shipments': weekly_shipments,
-        'monthly_shipments': monthly_shipments,
-        'total_revenue': total_revenue,
-        'weekly_revenue': weekly_revenue,
-        'monthly_revenue': monthly_revenue,
-        'status_distribution': status_distribution,
-        'payment_distribution': payment_distribution,
-        'recent_activity': recent_activity,
-    }
     return render(request, 'tracker/admin/stats.html', context)
 
+@login_required
+@admin_required
+def admin_cache_stats(request):
+    """Hit/miss counters of this worker process's public result page cache"""
+    return JsonResponse({'result_pages': result_page_metrics.as_dict()})
+
+@login_required
+@admin_required
+def admin_view_metrics(request):
+    """Latency, query and PDF build statistics of this worker process, per tracker URL name"""
+    return JsonResponse(view_metrics.as_dict())
+
 @login_required
 @admin_required
 def admin_settings(request):
@@ -591,8 +527,8 @@ def admin_settings(request):
     stamps = PDFStamp.objects.all()
     editing_stamp = None
     
-    # Get or create site settings
-    site_settings = SiteSettings.load()
+    # Edit a fresh copy; the form mutates its instance, which must not be the cached one
+    site_settings = SiteSettings.objects.first() or SiteSettings()
     site_settings_form = SiteSettingsForm(instance=site_settings)
     
     if request.method == 'POST':
@@ -655,19 +591,12 @@ def admin_settings(request):
     
     form = PDFStampForm()
     
-    # Get stats for the sidebar
-    total_shipments = Shipment.objects.count()
-    pending_payments_count = PaymentProof.objects.filter(is_verified=False).count()
-    active_stamps_count = PDFStamp.objects.filter(is_active=True).count()
-    
+    # Sidebar stats come from tracker.context_processors.admin_context
     context = {
         'stamps': stamps,
         'form': form,
         'editing_stamp': editing_stamp,
         'site_settings_form': site_settings_form,
         'site_settings': site_settings,
-        'total_shipments': total_shipments,
-        'pending_payments_count': pending_payments_count,
-        'active_stamps_count': active_stamps_count,
     }
     return render(request, 'tracker/admin/settings.html', context)
\ No newline at end of file